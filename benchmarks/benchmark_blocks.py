@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Benchmark of the API v3 block encoder and decoder with an increasing number of blocks. The time
+per block stays constant when both scale linearly with the block count. Run it from the root
+directory of the repository.
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# pylint: disable=wrong-import-position
+from benchmark_suite import create_eeprom_data
+from phytec_eeprom_flashtool.src.io import load_yml_config
+from phytec_eeprom_flashtool.src.encoding import EEPROM_V2_SIZE
+from phytec_eeprom_flashtool.src.encoding import EEPROM_V3_DATA_HEADER_SIZE
+from phytec_eeprom_flashtool.src.encoding import eeprom_data_to_image
+from phytec_eeprom_flashtool.src.encoding import struct_to_eeprom_data
+from phytec_eeprom_flashtool.src.encoding import blocks_to_eeprom_data
+
+# The data header stores the block count in one byte
+BLOCK_COUNTS = [1, 10, 50, 100, 200, 255]
+
+
+def decode(image: bytes, yml_parser):
+    """Decodes the header and all blocks of an image."""
+    eeprom_data = struct_to_eeprom_data(image, yml_parser)
+    return blocks_to_eeprom_data(eeprom_data,
+                                 image[EEPROM_V2_SIZE + EEPROM_V3_DATA_HEADER_SIZE:])
+
+
+def main():
+    """Runs the benchmark and prints the results as table."""
+    yml_parser = load_yml_config('PCM-071')
+    print(f"{'Blocks':>8} {'Bytes':>8} {'encode [us]':>12} {'per block [us]':>15} "
+          f"{'decode [us]':>12} {'per block [us]':>15}")
+    for block_count in BLOCK_COUNTS:
+        eeprom_data = create_eeprom_data('v3', block_count)
+        image = eeprom_data_to_image(eeprom_data)
+        assert len(decode(image, yml_parser).blocks) == block_count
+        number = max(5, 2000 // block_count)
+        encode_duration = min(timeit.repeat(
+            lambda eeprom_data=eeprom_data: eeprom_data_to_image(eeprom_data),
+            number=number, repeat=5)) / number * 1e6
+        decode_duration = min(timeit.repeat(lambda image=image: decode(image, yml_parser),
+                                            number=number, repeat=5)) / number * 1e6
+        print(f"{block_count:>8} {len(image):>8} {encode_duration:>12.1f} "
+              f"{encode_duration / block_count:>15.2f} {decode_duration:>12.1f} "
+              f"{decode_duration / block_count:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Benchmark of the table-driven CRC8 implementation against the crc8 module, which was used by
+previous versions of the tool. Run it from the root directory of the repository.
+"""
+
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# pylint: disable=wrong-import-position
+from phytec_eeprom_flashtool.src.common import crc8_checksum_calc
+from phytec_eeprom_flashtool.src.common import crc8_checksum_calc_many
+
+# Buffer sizes of a block header, a MAC block payload, the API v2 header and a full image
+SIZES = [3, 8, 31, 4096]
+BULK_COUNT = 1000
+
+
+def crc8_module_calc(eeprom_struct: bytes) -> int:
+    """CRC8 calculation of previous versions of the tool."""
+    # pylint: disable=import-outside-toplevel
+    import crc8  # type: ignore
+    hash_ = crc8.crc8()
+    hash_.update(eeprom_struct)
+    return int(hash_.hexdigest(), 16)
+
+
+def measure(func, number: int) -> float:
+    """Returns the best time per call in microseconds."""
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    """Runs the benchmark and prints the results as table."""
+    try:
+        import crc8  # type: ignore # pylint: disable=import-outside-toplevel,unused-import
+        compare = True
+    except ImportError:
+        print("crc8 module is not installed. Skipping the comparison.")
+        compare = False
+
+    print(f"{'Bytes':>8} {'table [us]':>12} {'crc8 [us]':>12} {'speedup':>8}")
+    for size in SIZES:
+        data = os.urandom(size)
+        number = max(10, 20000 // size)
+        table = measure(lambda data=data: crc8_checksum_calc(data), number)
+        if compare:
+            assert crc8_module_calc(data) == crc8_checksum_calc(data)
+            module = measure(lambda data=data: crc8_module_calc(data), number)
+            print(f"{size:>8} {table:>12.2f} {module:>12.2f} {module / table:>7.1f}x")
+        else:
+            print(f"{size:>8} {table:>12.2f}")
+
+    buffers = [os.urandom(8) for _ in range(BULK_COUNT)]
+    single = measure(lambda: [crc8_checksum_calc(buffer) for buffer in buffers], 10)
+    bulk = measure(lambda: crc8_checksum_calc_many(buffers), 10)
+    print(f"\n{BULK_COUNT} buffers of 8 bytes: {single:.0f} us single calls, {bulk:.0f} us bulk")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Benchmark suite of the encoding, decoding, block, checksum, config and end-to-end CLI paths.
+All benchmarks run offline against the shipped configs and generated images. The results are
+compared with a baseline and every benchmark which got slower than the threshold is reported as
+regression. Absolute timings are machine specific, so no baseline is shipped: record one on the
+machine under test with --save before the change and compare after it. The local baseline is
+ignored by git. Run it from the root directory of the repository.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+from typing import Callable, Iterator
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# pylint: disable=wrong-import-position
+from phytec_eeprom_flashtool.src.config import get_product_names
+from phytec_eeprom_flashtool.src.io import load_yml_config
+from phytec_eeprom_flashtool.src.io import get_yml_parser
+from phytec_eeprom_flashtool.src.common import crc8_checksum_calc
+from phytec_eeprom_flashtool.src.encoding import EEPROM_V2_SIZE
+from phytec_eeprom_flashtool.src.encoding import EEPROM_V3_DATA_HEADER_SIZE
+from phytec_eeprom_flashtool.src.encoding import get_eeprom_data
+from phytec_eeprom_flashtool.src.encoding import eeprom_data_to_struct
+from phytec_eeprom_flashtool.src.encoding import eeprom_data_to_blocks
+from phytec_eeprom_flashtool.src.encoding import eeprom_data_to_image
+from phytec_eeprom_flashtool.src.encoding import struct_to_eeprom_data
+from phytec_eeprom_flashtool.src.encoding import blocks_to_eeprom_data
+from phytec_eeprom_flashtool.src.blocks import add_mac_block
+from phytec_eeprom_flashtool.src.blocks import add_key_value_block
+
+# Baseline recorded on this machine, see .gitignore
+BASELINE_FILE = Path(__file__).resolve().parent / 'baseline.json'
+# A benchmark is a regression if it is slower than the baseline times this factor
+DEFAULT_THRESHOLD = 1.5
+# Products of all API versions with all arguments to create their images
+PRODUCTS = {
+    'v1': {'som': 'PCM-057', 'kit': '40201111I', 'pcb': '50', 'bom': 'A1'},
+    'v2': {'som': 'PCL-066', 'kit': '3022210I-0', 'pcb': '1a', 'bom': 'A0'},
+    'v3': {'som': 'PCM-071', 'kit': '5432DE11I-00', 'pcb': '5d', 'bom': 'S9'},
+}
+# The data header stores the block count in one byte
+BLOCK_COUNTS = [1, 10, 100, 255]
+CRC8_SIZES = [8, 32, 4096]
+
+Benchmark = tuple[str, Callable[[], object], int]
+
+
+def create_eeprom_data(version: str, block_count: int = 0):
+    """Returns EEPROM data of a product with alternating MAC and key value blocks."""
+    args = argparse.Namespace(ksx=None, id=None, **PRODUCTS[version])
+    eeprom_data = get_eeprom_data(args, load_yml_config(PRODUCTS[version]['som']))
+    for index in range(block_count):
+        if index % 2:
+            add_key_value_block(eeprom_data, f"key{index}", f"value{index}")
+        else:
+            add_mac_block(eeprom_data, index // 2, f"00:11:22:33:44:{index:02x}")
+    return eeprom_data
+
+
+def encoding_benchmarks() -> Iterator[Benchmark]:
+    """Packing and unpacking of the EEPROM header of every API version."""
+    for version in PRODUCTS:
+        eeprom_data = create_eeprom_data(version)
+        eeprom_struct = eeprom_data_to_struct(eeprom_data)
+        yield (f"eeprom_data_to_struct[{version}]",
+               lambda eeprom_data=eeprom_data: eeprom_data_to_struct(eeprom_data), 2000)
+        yield (f"struct_to_eeprom_data[{version}]",
+               lambda eeprom_struct=eeprom_struct, yml_parser=eeprom_data.yml_parser:
+               struct_to_eeprom_data(eeprom_struct, yml_parser), 2000)
+
+
+def block_benchmarks() -> Iterator[Benchmark]:
+    """Packing and unpacking of an increasing number of API v3 blocks."""
+    payload_start = EEPROM_V2_SIZE + EEPROM_V3_DATA_HEADER_SIZE
+    for block_count in BLOCK_COUNTS:
+        eeprom_data = create_eeprom_data('v3', block_count)
+        image = eeprom_data_to_image(eeprom_data)
+        number = max(5, 2000 // block_count)
+        yield (f"eeprom_data_to_blocks[{block_count}]",
+               lambda eeprom_data=eeprom_data: eeprom_data_to_blocks(eeprom_data), number)
+        yield (f"eeprom_data_to_image[{block_count}]",
+               lambda eeprom_data=eeprom_data: eeprom_data_to_image(eeprom_data), number)
+
+        def decode(image=image, yml_parser=eeprom_data.yml_parser):
+            eeprom_data = struct_to_eeprom_data(image, yml_parser)
+            return blocks_to_eeprom_data(eeprom_data, image[payload_start:])
+
+        yield f"blocks_to_eeprom_data[{block_count}]", decode, number
+
+
+def crc8_benchmarks() -> Iterator[Benchmark]:
+    """CRC8 calculation of typical buffer sizes."""
+    for size in CRC8_SIZES:
+        data = os.urandom(size)
+        yield (f"crc8_checksum_calc[{size}]", lambda data=data: crc8_checksum_calc(data),
+               max(10, 20000 // size))
+
+
+def config_benchmarks() -> Iterator[Benchmark]:
+    """Loading the config of every shipped product."""
+    products = get_product_names()
+
+    def load_all():
+        for product in products:
+            get_yml_parser(argparse.Namespace(som=product, ksx=None, file=""))
+
+    yield f"get_yml_parser[{len(products)} configs]", load_all, 100
+
+
+def cli_benchmarks(tmp_dir: str) -> Iterator[Benchmark]:
+    """End-to-end runs of the tool including the interpreter startup."""
+    binary = os.path.join(tmp_dir, 'image.bin')
+    product = PRODUCTS['v3']
+    create = [sys.executable, '-m', 'phytec_eeprom_flashtool', 'create', '-som', product['som'],
+              '-kit', product['kit'], '-pcb', product['pcb'], '-bom', product['bom'], '-file',
+              binary]
+    read = [sys.executable, '-m', 'phytec_eeprom_flashtool', 'read', '-file', binary]
+    for name, command in [('cli create', create), ('cli read -file', read)]:
+        yield (name, lambda command=command: subprocess.run(command, check=True,
+                                                            stdout=subprocess.DEVNULL), 1)
+
+
+def measure(func: Callable[[], object], number: int) -> float:
+    """Returns the best time per call in microseconds."""
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def load_baseline(baseline_file: Path) -> dict:
+    """Returns the stored results or an empty dictionary if there is no baseline yet."""
+    try:
+        with open(baseline_file, encoding='UTF-8') as baseline:
+            return json.load(baseline)['results']
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def save_baseline(baseline_file: Path, results: dict):
+    """Stores the results together with a description of the machine."""
+    with open(baseline_file, 'w', encoding='UTF-8') as baseline:
+        json.dump({
+            'machine': platform.machine(),
+            'python': platform.python_version(),
+            'results': results,
+        }, baseline, indent=2)
+        baseline.write('\n')
+
+
+def main():
+    """Runs all benchmarks, prints the results as table and compares them with the baseline.
+    Exits with an error if any benchmark regressed."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n', maxsplit=1)[0])
+    parser.add_argument('--baseline', type=Path, default=BASELINE_FILE,
+                        help='Baseline file to compare with and to save to')
+    parser.add_argument('--save', action='store_true', help='Save the results as new baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Slowdown factor reported as regression ' \
+                        f'(default: {DEFAULT_THRESHOLD})')
+    parser.add_argument('--filter', default='', help='Only run benchmarks containing this text')
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline)
+    if not baseline and not args.save:
+        print(f"No baseline in {args.baseline}, record one on this machine with --save.\n")
+    results = {}
+    regressions = []
+    print(f"{'Benchmark':<36} {'time [us]':>12} {'baseline [us]':>14} {'ratio':>7}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        benchmarks = [encoding_benchmarks(), block_benchmarks(), crc8_benchmarks(),
+                      config_benchmarks(), cli_benchmarks(tmp_dir)]
+        for group in benchmarks:
+            for name, func, number in group:
+                if args.filter not in name:
+                    continue
+                results[name] = round(measure(func, number), 2)
+                line = f"{name:<36} {results[name]:>12.2f}"
+                if name in baseline:
+                    ratio = results[name] / baseline[name]
+                    line += f" {baseline[name]:>14.2f} {ratio:>6.2f}x"
+                    if ratio > args.threshold:
+                        regressions.append(name)
+                        line += "  REGRESSION"
+                print(line, flush=True)
+
+    if args.save:
+        save_baseline(args.baseline, {**baseline, **results})
+        print(f"\nSaved baseline to {args.baseline}")
+    if regressions:
+        sys.exit(f"\n{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
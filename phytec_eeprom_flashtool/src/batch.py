@@ -0,0 +1,289 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Module to create or flash many boards from one manifest file in a single process."""
+import argparse
+import csv
+import json
+import sys
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from itertools import islice
+from typing import Callable, Iterable, Iterator, TextIO
+
+from .io import get_yml_parser
+from .io import get_eeprom_lock
+from .io import override_eeprom_bus
+from .io import eeprom_write
+from .io import eeprom_read
+from .io import binary_read
+from .io import binary_write
+from .io import get_binary_path
+from .io import get_binary_name
+from .encoding import EepromData
+from .encoding import get_eeprom_data
+from .encoding import eeprom_data_to_image
+from .encoding import verify_image
+from .blocks import add_mac_block
+from .blocks import add_key_value_block
+from .multi import imap_ordered
+from .serialpool import SerialReservation
+from .container import ContainerWriter
+from .container import get_image_keys
+
+# Errors of a single unit which must not abort the whole batch
+UNIT_ERRORS = (SystemExit, ValueError, AssertionError, KeyError, OSError)
+# Number of units whose MAC addresses are allocated from the pool with a single file lock
+MAC_POOL_CHUNK_SIZE = 64
+
+
+def read_manifest(manifest_file: TextIO, file_format: str) -> Iterator[dict]:
+    """Streams all rows of a CSV or JSONL manifest as dictionaries. Empty lines and lines
+    starting with '#' are skipped.
+    """
+    lines = (line for line in manifest_file if line.strip() and not line.startswith('#'))
+    if file_format == 'csv':
+        yield from csv.DictReader(lines)
+        return
+    for line in lines:
+        row = json.loads(line)
+        if not isinstance(row, dict):
+            raise ValueError(f"Manifest row is not an object: {line.strip()}")
+        yield row
+
+
+def get_manifest_format(manifest: str) -> str:
+    """Returns the manifest format derived from the file extension."""
+    if Path(manifest).suffix.lower() in ('.jsonl', '.json', '.ndjson'):
+        return 'jsonl'
+    return 'csv'
+
+
+def parse_macs(macs) -> list[tuple[int, str]]:
+    """Returns all (interface, MAC) pairs of a manifest row. In CSV manifests the MACs are
+    separated by ';' and the position is used as interface number unless the 'interface=MAC'
+    notation is used. JSONL manifests can use a list or an object.
+    """
+    if not macs:
+        return []
+    if isinstance(macs, dict):
+        return [(int(interface), mac) for interface, mac in macs.items()]
+    if isinstance(macs, str):
+        macs = [mac.strip() for mac in macs.split(';') if mac.strip()]
+    pairs = []
+    for interface, mac in enumerate(macs):
+        if '=' in mac:
+            interface_str, mac = mac.split('=', 1)
+            interface = int(interface_str)
+        pairs.append((interface, mac.strip()))
+    return pairs
+
+
+def parse_key_values(key_values) -> list[tuple[str, str]]:
+    """Returns all (key, value) pairs of a manifest row. CSV manifests use 'key=value' pairs
+    separated by ';'. JSONL manifests use an object.
+    """
+    if not key_values:
+        return []
+    if isinstance(key_values, dict):
+        return [(str(key), str(value)) for key, value in key_values.items()]
+    pairs = []
+    for key_value in key_values.split(';'):
+        if not key_value.strip():
+            continue
+        if '=' not in key_value:
+            raise ValueError(f"Key value pair '{key_value}' is not in key=value format.")
+        key, value = key_value.split('=', 1)
+        pairs.append((key.strip(), value.strip()))
+    return pairs
+
+
+def parse_int(value) -> int | None:
+    """Converts a manifest value into an integer. Hexadecimal values need the 0x prefix."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, int):
+        return value
+    return int(str(value), 0)
+
+
+def row_to_args(row: dict) -> argparse.Namespace:
+    """Converts a manifest row into the same arguments the 'create' and 'write' commands use."""
+    row = {key.strip().lower().replace('-', '_'): value for key, value in row.items() if key}
+    args = argparse.Namespace(
+        som=row.get('som') or None,
+        ksx=row.get('ksx') or None,
+        kit=row.get('kit') or None,
+        pcb=str(row['pcb']) if row.get('pcb') not in (None, "") else None,
+        bom=row.get('bom') or None,
+        id=row.get('option_id') or None,
+        file=row.get('file') or "",
+        i2c_bus=parse_int(row.get('i2c_bus')),
+        i2c_dev=parse_int(row.get('i2c_dev')),
+        serial=str(row['serial']) if row.get('serial') not in (None, "") else None,
+        macs=parse_macs(row.get('macs')),
+        key_values=parse_key_values(row.get('key_values')),
+    )
+    if not (args.som or args.ksx):
+        raise ValueError("Set som and/or ksx.")
+    for (arg, arg_str) in [(args.kit, 'kit'), (args.pcb, 'pcb'), (args.bom, 'bom')]:
+        if arg is None:
+            raise ValueError(f"{arg_str} is missing and mandatory for every unit")
+    if args.som and args.som.startswith('PFL-') and args.id is None:
+        raise ValueError("option_id is required for phyFLEX products")
+    if args.file and args.i2c_bus is not None:
+        raise ValueError("Set either file or i2c_bus, not both.")
+    return args
+
+
+def build_unit(args: argparse.Namespace,
+               serials: SerialReservation | None = None) -> tuple[EepromData, bytearray]:
+    """Generates the EEPROM data of a unit including all blocks and packs the whole image. Units
+    without a serial get the next serial of the reservation."""
+    yml_parser = get_yml_parser(args)
+    eeprom_data = get_eeprom_data(args, yml_parser)
+    if (args.macs or args.serial or args.key_values or serials) and not eeprom_data.is_v3():
+        raise ValueError("Blocks are only supported with API v3")
+    if serials is not None and not args.serial:
+        args.serial = serials.next_serial(eeprom_data)
+    for interface, mac in args.macs:
+        add_mac_block(eeprom_data, interface, mac)
+    if args.serial:
+        add_key_value_block(eeprom_data, "serial", args.serial)
+    for key, value in args.key_values:
+        if key.lower() == "serial":
+            raise ValueError("Please use the serial column.")
+        add_key_value_block(eeprom_data, key, value)
+    return eeprom_data, eeprom_data_to_image(eeprom_data)
+
+
+def process_unit(args: argparse.Namespace, clearance: Callable[[], bool],
+                 verify: bool = False, serials: SerialReservation | None = None,
+                 container: ContainerWriter | None = None) -> dict:
+    """Creates or flashes a single unit and returns its result record. With verify the written
+    image is read back and checked right after writing it. Units without a file or bus are
+    added to the container if one is given, keyed by their serial and MAC addresses."""
+    generated = serials is not None and not args.serial
+    eeprom_data, eeprom_struct = build_unit(args, serials)
+    result: dict = {"product": eeprom_data.full_name(), "size": len(eeprom_struct)}
+    if generated:
+        result["serial"] = args.serial
+    readback: bytes | memoryview = b""
+    if args.i2c_bus is not None or args.i2c_dev is not None:
+        if not clearance():
+            result.update(status="skipped")
+            return result
+        yml_parser = override_eeprom_bus(eeprom_data.yml_parser, args.i2c_bus, args.i2c_dev)
+        with get_eeprom_lock(yml_parser):
+            result["write"] = eeprom_write(yml_parser, eeprom_struct).to_dict()
+            if verify:
+                readback = eeprom_read(yml_parser, len(eeprom_struct))
+        result["target"] = f"i2c-{yml_parser['PHYTEC']['i2c_bus']}:" \
+            f"0x{int(yml_parser['PHYTEC']['i2c_dev']):02x}"
+    elif container is not None and not args.file:
+        keys = get_image_keys(eeprom_data) or [get_binary_name(args, eeprom_data)]
+        container.add(keys, eeprom_struct)
+        result["target"] = f"{container.path}#{keys[0]}"
+    else:
+        binary_write(args, eeprom_data, eeprom_struct)
+        result["target"] = str(get_binary_path(args, eeprom_data))
+        if verify:
+            readback = binary_read(result["target"], len(eeprom_struct))
+    result.update(status="ok")
+    if verify:
+        result.update(verify_image(eeprom_struct, readback, eeprom_data.yml_parser))
+        if result["verify"] != "pass":
+            result.update(status="error")
+    return result
+
+
+def get_mac_count(row: dict, default: int) -> int:
+    """Returns the number of MAC addresses to allocate for a manifest row. Rows with MACs of
+    their own get none, the mac_count column overrides the default."""
+    row = {key.strip().lower().replace('-', '_'): value for key, value in row.items() if key}
+    if row.get('macs'):
+        return 0
+    count = parse_int(row.get('mac_count'))
+    return default if count is None else count
+
+
+def allocate_unit_macs(rows: Iterable[tuple[int, dict]], mac_pool: str,
+                       macs_per_unit: int) -> Iterator[tuple[int, dict, list[str]]]:
+    """Adds the MAC addresses allocated from the pool to every manifest row. The addresses of
+    up to MAC_POOL_CHUNK_SIZE units are allocated at once, so the pool file is not locked for
+    every single unit."""
+    # pylint: disable=import-outside-toplevel
+    from .macpool import allocate_macs
+    rows = iter(rows)
+    while chunk := list(islice(rows, MAC_POOL_CHUNK_SIZE)):
+        counts = [get_mac_count(row, macs_per_unit) for _, row in chunk]
+        if any(count < 0 for count in counts):
+            raise ValueError("mac_count must not be negative")
+        macs = allocate_macs(mac_pool, sum(counts)) if sum(counts) else []
+        for (unit, row), count in zip(chunk, counts):
+            unit_macs, macs = macs[:count], macs[count:]
+            yield unit, {**row, 'macs': unit_macs} if unit_macs else row, unit_macs
+
+
+def read_units(manifest_file: TextIO, args) -> Iterator[tuple[int, dict, list[str]]]:
+    """Streams all units of a manifest with their number and the MAC addresses allocated for
+    them."""
+    manifest_format = args.format or get_manifest_format(args.manifest)
+    rows = enumerate(read_manifest(manifest_file, manifest_format), start=1)
+    if args.mac_pool:
+        return allocate_unit_macs(rows, args.mac_pool, args.macs_per_unit)
+    return ((unit, row, []) for unit, row in rows)
+
+
+def run_batch(args, clearance: Callable[[], bool]) -> int:
+    """Processes every unit of a manifest and emits one JSON result record per unit. Returns the
+    number of units which failed. With more than one job, units are processed in parallel while
+    the result records keep the manifest order.
+    """
+    approved: list[bool] = []
+    approved_lock = threading.Lock()
+    # A prompt would consume the manifest from stdin and end up between the result records
+    prompt_denied = args.manifest == '-' and not args.always_write
+
+    def batch_clearance() -> bool:
+        # Ask only once for the whole batch
+        with approved_lock:
+            if not approved:
+                approved.append(bool(args.always_write) or (not prompt_denied and clearance()))
+            return approved[0]
+
+    def process_row(item: tuple[int, dict, list[str]]) -> dict:
+        unit, row, macs = item
+        result: dict = {"unit": unit, "macs": macs} if macs else {"unit": unit}
+        try:
+            return {**result, **process_unit(row_to_args(row), batch_clearance, args.verify,
+                                             serials, container)}
+        except UNIT_ERRORS as err:
+            return {**result, "status": "error", "error": str(err)}
+
+    failed = 0
+    try:
+        # pylint: disable=consider-using-with
+        manifest_file = sys.stdin if args.manifest == '-' else \
+            open(args.manifest, encoding='UTF-8', newline='')
+    except OSError as err:
+        sys.exit(str(err))
+    jobs = max(1, args.jobs)
+    serials = SerialReservation(args.serial_pool, args.serial_block) if args.serial_pool else None
+    container = ContainerWriter(args.container) if args.container else None
+    # Serials which were reserved but not used are released and the last images are appended to
+    # the container once all workers are done
+    with manifest_file, serials or nullcontext(), container or nullcontext(), \
+            ThreadPoolExecutor(max_workers=jobs) as executor:
+        for future in imap_ordered(executor, process_row, read_units(manifest_file, args),
+                                   2 * jobs):
+            result = future.result()
+            if result['status'] == 'error':
+                failed += 1
+            print(json.dumps(result), flush=True)
+            if prompt_denied and approved:
+                sys.exit("Writing EEPROM devices with a manifest from stdin requires -y.")
+    return failed
@@ -4,9 +4,9 @@
 
 """Module to handle all blocks."""
 #pylint: disable=import-error
-from dataclasses import dataclass
 import struct
 import re
+from collections.abc import Callable, Iterable, Iterator
 
 from .common import crc8_checksum_calc
 
@@ -16,9 +16,10 @@ API_V3_SUB_VERSION = 0
 # 1 uchar, 1 ushort, 1 uchar
 API_V3_BLOCK_HEADER_ENCODING = "<1B1H1B"
 API_V3_BLOCK_HEADER_SIZE = 4
+# Reads a number of bytes at an offset relative to the start of the block payload
+BlockReader = Callable[[int, int], bytes | memoryview]
 
 
-@dataclass
 class EepromV3BlockInterface:
     """Block interface to define the block header and the API to print and pack each block."""
 
@@ -30,20 +31,24 @@ class EepromV3BlockInterface:
     crc8_header: int = 0
     crc8_payload: int = 0
 
-    def pack_crc(self, eeprom_struct) -> bytes:
-        """Generates CRC8 checksums for the block header and payload and includes them in the
-        packed EEPROM data."""
-        self.crc8_header = crc8_checksum_calc(eeprom_struct[:API_V3_BLOCK_HEADER_SIZE - 1])
-        self.crc8_payload = crc8_checksum_calc(eeprom_struct[API_V3_BLOCK_HEADER_SIZE:-1])
-        return eeprom_struct[:3] + struct.pack('B', self.crc8_header) + eeprom_struct[4:-1] + \
-            struct.pack('B', self.crc8_payload)
+    def pack_crc_into(self, buffer: bytearray, offset: int):
+        """Generates CRC8 checksums for the block header and payload of a block which is packed
+        into the buffer at the offset and patches them in place."""
+        header_crc_offset = offset + API_V3_BLOCK_HEADER_SIZE - 1
+        payload_crc_offset = offset + self.length - 1
+        view = memoryview(buffer)
+        self.crc8_header = crc8_checksum_calc(view[offset:header_crc_offset])
+        self.crc8_payload = crc8_checksum_calc(view[header_crc_offset + 1:payload_crc_offset])
+        view.release()
+        buffer[header_crc_offset] = self.crc8_header
+        buffer[payload_crc_offset] = self.crc8_payload
 
     @staticmethod
-    def unpack(eeprom_struct: bytes):
-        """Static method to unpack the block header and generate a EepromV3BlockInterface obj."""
-        unpacked = struct.unpack(API_V3_BLOCK_HEADER_ENCODING,
-                                 eeprom_struct[:API_V3_BLOCK_HEADER_SIZE])
-        if crc8_checksum_calc(eeprom_struct[:API_V3_BLOCK_HEADER_SIZE]):
+    def unpack(eeprom_struct: bytes | memoryview, offset: int = 0):
+        """Static method to unpack the block header at the offset and generate a
+        EepromV3BlockInterface obj."""
+        unpacked = struct.unpack_from(API_V3_BLOCK_HEADER_ENCODING, eeprom_struct, offset)
+        if crc8_checksum_calc(eeprom_struct[offset:offset + API_V3_BLOCK_HEADER_SIZE]):
             raise AssertionError("Block header crc8 mismatch!")
         return EepromV3BlockInterface(0, int(unpacked[0]), "", int(unpacked[1]))
 
@@ -51,7 +56,15 @@ class EepromV3BlockInterface:
 ########## API V3.0 ##########
 
 
-@dataclass
+def normalize_mac(mac: str) -> str:
+    """Returns a MAC address in lower case XX:XX:XX:XX:XX:XX format. The bytes of the MAC can
+    be separated by ':', '-' or nothing."""
+    mac = mac.lower()
+    if not re.match("[0-9a-f]{2}([-:]?)[0-9a-f]{2}(\\1[0-9a-f]{2}){4}$", mac):
+        raise ValueError("MAC is not in XX:XX:XX:XX:XX:XX format.")
+    return bytes.fromhex(mac.replace('-', '').replace(':', '')).hex(':')
+
+
 class EepromDataMACBlock(EepromV3BlockInterface):
     """Block with a MAC adress and the Ethernet interface number it should get assigned to."""
     payload_length: int = 8
@@ -61,10 +74,10 @@ class EepromDataMACBlock(EepromV3BlockInterface):
         super().__init__(self.payload_length, 0, self.payload_encoding)
         if interface < 0:
             raise ValueError("Ethernet interface number must be equal or greater then 0.")
-        if not re.match("[0-9a-f]{2}([-:]?)[0-9a-f]{2}(\\1[0-9a-f]{2}){4}$", mac.lower()):
-            raise ValueError("MAC is not in XX:XX:XX:XX:XX:XX format.")
+        if interface > 255:
+            raise ValueError("Ethernet interface number must be less than 256.")
         self.interface = interface
-        self.mac = mac.lower().split(':')
+        self.mac = normalize_mac(mac).split(':')
 
     def __repr__(self):
         header = "MAC Address block"
@@ -76,8 +89,16 @@ class EepromDataMACBlock(EepromV3BlockInterface):
 
     def pack(self, next_block_address: int) -> bytes:
         """Pack the MAC block and generate both CRC8 checksums."""
-        eeprom_struct = struct.pack(
+        eeprom_struct = bytearray(self.length)
+        self.pack_into(eeprom_struct, 0, next_block_address)
+        return bytes(eeprom_struct)
+
+    def pack_into(self, buffer: bytearray, offset: int, next_block_address: int):
+        """Pack the MAC block into the buffer and generate both CRC8 checksums."""
+        struct.pack_into(
             self.encoding,
+            buffer,
+            offset,
             self.block_type,
             next_block_address,
             0, # skip CRC8
@@ -85,48 +106,69 @@ class EepromDataMACBlock(EepromV3BlockInterface):
             bytes.fromhex(format(int(''.join(self.mac), 16), '012x')),
             0, # skip CRC8
         )
-        return self.pack_crc(eeprom_struct)
+        self.pack_crc_into(buffer, offset)
 
     @staticmethod
-    def unpack(eeprom_struct: bytes):
-        """Static method to unpack the MAC block and generate a EepromDataMACBlock object."""
+    def unpack(eeprom_struct: bytes | memoryview, offset: int = 0):
+        """Static method to unpack the MAC block at the offset and generate a EepromDataMACBlock
+        object."""
         block_encoding = API_V3_BLOCK_HEADER_ENCODING + EepromDataMACBlock.payload_encoding
         block_size = API_V3_BLOCK_HEADER_SIZE + EepromDataMACBlock.payload_length
-        unpacked = struct.unpack(block_encoding, eeprom_struct[:block_size])
-        if crc8_checksum_calc(eeprom_struct[:block_size]):
+        unpacked = struct.unpack_from(block_encoding, eeprom_struct, offset)
+        if crc8_checksum_calc(eeprom_struct[offset:offset + block_size]):
             raise AssertionError("Block payload crc8 mismatch!")
-        mac = unpacked[4].hex()
-        mac = [mac[i:i+2] for i in range(0, len(mac), 2)]
-        mac_block = EepromDataMACBlock(int(unpacked[3]), ':'.join(mac))
-        mac_block.pack(int(unpacked[1]))
+        mac_block = EepromDataMACBlock(int(unpacked[3]), unpacked[4].hex(':'))
+        mac_block.next_block = int(unpacked[1])
+        mac_block.crc8_header = int(unpacked[2])
+        mac_block.crc8_payload = int(unpacked[5])
         return mac_block
 
 
 def add_mac_block(eeprom_data, interface: int, mac: str):
     """Function to create a MAC block object and add it to the EEPROM data."""
     mac_block = EepromDataMACBlock(interface, mac)
-    for block in [elm for elm in eeprom_data.blocks if isinstance(elm, EepromDataMACBlock)]:
-        if block.mac == mac_block.mac:
-            raise ValueError(f"EEPROM image already contains a MAC address with {block.mac}")
-        if block.interface == mac_block.interface:
-            raise ValueError(f"EEPROM image already contains a MAC of interface {block.interface}")
-    mac_block.pack(eeprom_data.v3_next_block_address)
+    block = eeprom_data.find_mac_block(':'.join(mac_block.mac))
+    if block is not None:
+        raise ValueError(f"EEPROM image already contains a MAC address with {mac}")
+    if eeprom_data.get_mac_block(mac_block.interface) is not None:
+        raise ValueError(f"EEPROM image already contains a MAC of interface {interface}")
     eeprom_data.add_block(mac_block)
 
 
-@dataclass
+def set_mac_block(eeprom_data, interface: int, mac: str):
+    """Function to add a MAC block or to replace the MAC of an existing Ethernet interface."""
+    mac_block = EepromDataMACBlock(interface, mac)
+    block = eeprom_data.get_mac_block(interface)
+    other_block = eeprom_data.find_mac_block(':'.join(mac_block.mac))
+    if other_block is not None and other_block is not block:
+        raise ValueError(f"EEPROM image already contains a MAC address with {mac} for "
+                         f"interface {other_block.interface}")
+    if block is None:
+        eeprom_data.add_block(mac_block)
+    else:
+        eeprom_data.replace_block(block, mac_block)
+
+
+def remove_mac_block(eeprom_data, interface: int):
+    """Function to remove the MAC block of an Ethernet interface."""
+    block = eeprom_data.get_mac_block(interface)
+    if block is None:
+        raise ValueError(f"No MAC found for Ethernet interface {interface}")
+    eeprom_data.remove_block(block)
+
+
 class EepromDataKeyValueBlock(EepromV3BlockInterface):
-    """Block with a key value pair with up to 256 characters for both the key and value."""
+    """Block with a key value pair with up to 255 characters for both the key and value."""
     payload_length: int = 3
     payload_encoding: str = "2B{}s{}s1B"
 
     def __init__(self, key: str, value: str):
         encoding = self.payload_encoding.format(len(key), len(value))
         super().__init__(self.payload_length + len(key) + len(value), 1, encoding)
-        if len(key) > 256:
-            raise ValueError(f"Maximum key length is 256 characters. {len(key)} is too long.")
-        if len(value) > 256:
-            raise ValueError(f"Maximum value length is 256 characters. {len(value)} is too long.")
+        if len(key) > 255:
+            raise ValueError(f"Maximum key length is 255 characters. {len(key)} is too long.")
+        if len(value) > 255:
+            raise ValueError(f"Maximum value length is 255 characters. {len(value)} is too long.")
         self.key = key
         self.value = value
 
@@ -140,8 +182,16 @@ class EepromDataKeyValueBlock(EepromV3BlockInterface):
 
     def pack(self, next_block_address: int) -> bytes:
         """Pack the key value block and generate both CRC8 checksums."""
-        eeprom_struct = struct.pack(
+        eeprom_struct = bytearray(self.length)
+        self.pack_into(eeprom_struct, 0, next_block_address)
+        return bytes(eeprom_struct)
+
+    def pack_into(self, buffer: bytearray, offset: int, next_block_address: int):
+        """Pack the key value block into the buffer and generate both CRC8 checksums."""
+        struct.pack_into(
             self.encoding,
+            buffer,
+            offset,
             self.block_type,
             next_block_address,
             0, # skip CRC8
@@ -151,49 +201,140 @@ class EepromDataKeyValueBlock(EepromV3BlockInterface):
             bytes(self.value, 'utf-8'),
             0, # skip CRC8
         )
-        return self.pack_crc(eeprom_struct)
+        self.pack_crc_into(buffer, offset)
 
     @staticmethod
-    def unpack(eeprom_struct: bytes):
-        """Static method to unpack the MAC block and generate a EepromDataMACBlock object."""
-        # Only read first two uchars to get the key and value length
-        block_encoding = API_V3_BLOCK_HEADER_ENCODING + "2Bx"
-        block_size = API_V3_BLOCK_HEADER_SIZE + EepromDataKeyValueBlock.payload_length
-        unpacked = struct.unpack(block_encoding, eeprom_struct[:block_size])
-        # Unpack again with correct encoding format
-        block_encoding = API_V3_BLOCK_HEADER_ENCODING + \
-            EepromDataKeyValueBlock.payload_encoding.format(int(unpacked[3]), int(unpacked[4]))
-        block_size = API_V3_BLOCK_HEADER_SIZE + EepromDataKeyValueBlock.payload_length + \
-            int(unpacked[3]) + int(unpacked[4])
-        unpacked = struct.unpack(block_encoding, eeprom_struct[:block_size])
-        if crc8_checksum_calc(eeprom_struct[:block_size]):
+    def unpack(eeprom_struct: bytes | memoryview, offset: int = 0):
+        """Static method to unpack the key value block at the offset and generate a
+        EepromDataKeyValueBlock object."""
+        # Only read the header and the first two uchars to get the key and value length
+        block_type, next_block, crc8_header, key_length, value_length = struct.unpack_from(
+            API_V3_BLOCK_HEADER_ENCODING + "2B", eeprom_struct, offset)
+        key_start = offset + API_V3_BLOCK_HEADER_SIZE + 2
+        value_start = key_start + key_length
+        block_end = value_start + value_length + 1
+        if block_end > len(eeprom_struct):
+            raise struct.error(f"Key value block of type {block_type} exceeds the buffer")
+        if crc8_checksum_calc(eeprom_struct[offset:block_end]):
             raise AssertionError("Block payload crc8 mismatch!")
-        key_value_block = EepromDataKeyValueBlock(unpacked[5].decode('utf-8'),
-                                                  unpacked[6].decode('utf-8'))
-        key_value_block.pack(int(unpacked[1]))
+        key_value_block = EepromDataKeyValueBlock(
+            str(eeprom_struct[key_start:value_start], 'utf-8'),
+            str(eeprom_struct[value_start:block_end - 1], 'utf-8'))
+        key_value_block.next_block = next_block
+        key_value_block.crc8_header = crc8_header
+        key_value_block.crc8_payload = eeprom_struct[block_end - 1]
         return key_value_block
 
 
+# All blocks which can be packed into an image
+EepromBlock = EepromDataMACBlock | EepromDataKeyValueBlock
+
+
 def add_key_value_block(eeprom_data, key: str, value: str):
     """Function to create a key value block object and add it to the EEPROM data."""
     key_value_block = EepromDataKeyValueBlock(key, value)
-    for block in [elm for elm in eeprom_data.blocks if isinstance(elm, EepromDataKeyValueBlock)]:
-        if block.key == key_value_block.key:
-            raise ValueError(f"EEPROM image already contains a key value pair for key {block.key}")
-    key_value_block.pack(eeprom_data.v3_next_block_address)
+    if eeprom_data.get_key_value_block(key) is not None:
+        raise ValueError(f"EEPROM image already contains a key value pair for key {key}")
     eeprom_data.add_block(key_value_block)
 
 
+def set_key_value_block(eeprom_data, key: str, value: str):
+    """Function to add a key value block or to replace the value of an existing key."""
+    key_value_block = EepromDataKeyValueBlock(key, value)
+    block = eeprom_data.get_key_value_block(key)
+    if block is None:
+        eeprom_data.add_block(key_value_block)
+    else:
+        eeprom_data.replace_block(block, key_value_block)
+
+
+def remove_key_value_block(eeprom_data, key: str):
+    """Function to remove the key value block of a key."""
+    block = eeprom_data.get_key_value_block(key)
+    if block is None:
+        raise ValueError(f"No key found for {key}")
+    eeprom_data.remove_block(block)
+
+
+def edit_blocks(eeprom_data, macs: Iterable[tuple[int, str]] = (),
+                key_values: Iterable[tuple[str, str]] = (), remove_macs: Iterable[int] = (),
+                remove_keys: Iterable[str] = ()):
+    """Function to apply several block changes to the EEPROM data at once. Removals are applied
+    first, followed by the (interface, MAC) and (key, value) pairs, which add new blocks or
+    replace existing ones. Nothing is written, so all changes end up in a single image."""
+    for interface in remove_macs:
+        remove_mac_block(eeprom_data, interface)
+    for key in remove_keys:
+        remove_key_value_block(eeprom_data, key)
+    for interface, mac in macs:
+        set_mac_block(eeprom_data, interface, mac)
+    for key, value in key_values:
+        set_key_value_block(eeprom_data, key, value)
+
+
 API_V3_BLOCK_MAPPING = {
     0: EepromDataMACBlock,
     1: EepromDataKeyValueBlock,
 }
 
 
-def unpack_block(eeprom_data, eeprom_blocks: bytes) -> int:
-    """Function to unpack a block which is placed at the beginning of the bytes array. Returns the
+def unpack_block(eeprom_data, eeprom_blocks: bytes | memoryview, offset: int = 0) -> int:
+    """Function to unpack a block which is placed at the offset of the bytes array. Returns the
     size of the unpacked block to point to the next block in the bytes array."""
-    header = EepromV3BlockInterface.unpack(eeprom_blocks)
-    block = API_V3_BLOCK_MAPPING[header.block_type].unpack(eeprom_blocks)  # type: ignore
+    header = EepromV3BlockInterface.unpack(eeprom_blocks, offset)
+    block = API_V3_BLOCK_MAPPING[header.block_type].unpack(eeprom_blocks, offset)  # type: ignore
     eeprom_data.add_block(block)
     return block.length
+
+
+def iter_block_headers(read: BlockReader, payload_length: int,
+                       block_count: int) -> Iterator[tuple[int, EepromV3BlockInterface, bytes]]:
+    """Follows the next_block addresses of the block chain and yields the offset, the unpacked
+    header and the raw header of every block. Only the block headers are read."""
+    offset = 0
+    for _ in range(block_count):
+        if offset + API_V3_BLOCK_HEADER_SIZE > payload_length:
+            raise AssertionError(f"Block at {offset} exceeds the payload of {payload_length} "
+                                 "bytes!")
+        raw_header = bytes(read(API_V3_BLOCK_HEADER_SIZE, offset))
+        header = EepromV3BlockInterface.unpack(raw_header)
+        if header.block_type not in API_V3_BLOCK_MAPPING:
+            raise AssertionError(f"Unknown block type {header.block_type} at {offset}!")
+        yield offset, header, raw_header
+        # Blocks are stored in ascending order, anything else would loop forever
+        if header.next_block <= offset:
+            raise AssertionError(f"Block at {offset} points back to {header.next_block}!")
+        offset = header.next_block
+
+
+def find_chained_mac_block(read: BlockReader, payload_length: int, block_count: int,
+                           interface: int) -> EepromDataMACBlock | None:
+    """Returns the MAC block of an Ethernet interface. Only the block headers and the payload
+    of MAC blocks are read."""
+    for offset, header, raw_header in iter_block_headers(read, payload_length, block_count):
+        if header.block_type != 0:
+            continue
+        payload = read(EepromDataMACBlock.payload_length, offset + API_V3_BLOCK_HEADER_SIZE)
+        block = EepromDataMACBlock.unpack(raw_header + bytes(payload))
+        if block.interface == interface:
+            return block
+    return None
+
+
+def find_chained_key_value_block(read: BlockReader, payload_length: int, block_count: int,
+                                 key: str) -> EepromDataKeyValueBlock | None:
+    """Returns the key value block of a key. Only the block headers, the lengths and keys of
+    key value blocks and the value of the matching block are read."""
+    key_bytes = key.encode('utf-8')
+    for offset, header, raw_header in iter_block_headers(read, payload_length, block_count):
+        if header.block_type != 1:
+            continue
+        lengths = bytes(read(2, offset + API_V3_BLOCK_HEADER_SIZE))
+        if lengths[0] != len(key_bytes):
+            continue
+        key_start = offset + API_V3_BLOCK_HEADER_SIZE + 2
+        if bytes(read(len(key_bytes), key_start)) != key_bytes:
+            continue
+        value = bytes(read(lengths[1] + 1, key_start + len(key_bytes)))
+        return EepromDataKeyValueBlock.unpack(raw_header + lengths + key_bytes + value)
+    return None
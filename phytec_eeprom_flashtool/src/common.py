@@ -4,11 +4,30 @@
 
 """Module with common functions."""
 import re
-from pathlib import Path
-import crc8  # type: ignore
-import yaml
+from collections.abc import Iterable
+from .config import get_constants
 
 REV_A_OFFSET = ord('a') - 1
+# Default number of worker threads. Each worker mostly waits for the I2C bus.
+DEFAULT_JOBS = 16
+# Environment variable which replaces the EEPROM devices by the emulator
+EMULATOR_ENV = 'PHYTEC_EEPROM_FLASHTOOL_EMULATOR'
+# CRC-8 with polynomial x^8 + x^2 + x + 1, initial value 0, no reflection and no final XOR
+CRC8_POLYNOMIAL = 0x07
+
+
+def crc8_table(polynomial: int) -> tuple[int, ...]:
+    """Returns the lookup table with the CRC8 of every possible byte value."""
+    table = []
+    for index in range(256):
+        crc = index
+        for _ in range(8):
+            crc = ((crc << 1) ^ polynomial if crc & 0x80 else crc << 1) & 0xFF
+        table.append(crc)
+    return tuple(table)
+
+
+CRC8_TABLE = crc8_table(CRC8_POLYNOMIAL)
 
 
 def str_to_revision(revision_str: str) -> tuple[int, str]:
@@ -36,22 +55,40 @@ def sub_revision_to_str(sub_revision: int | str) -> str:
     return str(sub_revision)
 
 
-def crc8_checksum_calc(eeprom_struct: bytes) -> int:
+def crc8_checksum_calc(eeprom_struct: bytes | bytearray | memoryview) -> int:
     """Create a CRC8 checksum from the packed EEPROM data."""
-    hash_ = crc8.crc8()
-    hash_.update(eeprom_struct)
-    crc8_sum = hash_.hexdigest()
-    return int(crc8_sum, 16)
+    crc = 0
+    table = CRC8_TABLE
+    for byte in eeprom_struct:
+        crc = table[crc ^ byte]
+    return crc
 
 
-def hw8_checksum_calc(eeprom_struct: bytes) -> int:
+def crc8_checksum_calc_many(eeprom_structs: Iterable[bytes | bytearray | memoryview]) \
+        -> list[int]:
+    """Create the CRC8 checksums of many packed EEPROM data buffers in one call."""
+    table = CRC8_TABLE
+    checksums = []
+    for eeprom_struct in eeprom_structs:
+        crc = 0
+        for byte in eeprom_struct:
+            crc = table[crc ^ byte]
+        checksums.append(crc)
+    return checksums
+
+
+def hw8_checksum_calc(eeprom_struct: bytes | bytearray | memoryview) -> int:
     """Calculates the total number of bits set to 1 in the given EEPROM data."""
-    return sum(bin(field).count("1") for field in eeprom_struct)
+    return int.from_bytes(eeprom_struct, 'little').bit_count()
+
+
+def hw8_checksum_calc_many(eeprom_structs: Iterable[bytes | bytearray | memoryview]) \
+        -> list[int]:
+    """Calculates the hw8 checksums of many EEPROM data buffers in one call."""
+    from_bytes = int.from_bytes
+    return [from_bytes(eeprom_struct, 'little').bit_count() for eeprom_struct in eeprom_structs]
 
 
 def get_max_option_count() -> int:
     """Returns the maximum allowed number of product options."""
-    config_path = Path(__file__).parent.parent / 'constants.yml'
-    with open(config_path, 'r', encoding='UTF-8') as config_file:
-        config = yaml.safe_load(config_file)
-        return config['MAX_OPTION_COUNT']
+    return get_constants()['MAX_OPTION_COUNT']
@@ -0,0 +1,143 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Module to load the product configs and constants from a compiled cache.
+
+All YML files of the config directory are parsed once and stored together in a single marshal
+file with a product name index. The cache is rebuilt automatically as soon as the modification
+time or size of any YML file changes. Marshal only restores plain data, and a cache file is only
+loaded if it is owned by the current user and not writable by anybody else, because the tool
+usually runs as root.
+"""
+import marshal
+import os
+import stat
+import zlib
+from pathlib import Path
+
+from .timings import timing
+
+TOOL_DIR = Path(__file__).resolve().parent.parent
+CONFIG_DIR = TOOL_DIR / 'configs'
+CONSTANTS_FILE = TOOL_DIR / 'constants.yml'
+# Increase this number when the layout of the cache file changes.
+CACHE_VERSION = 2
+CACHE_DIR_ENV = 'PHYTEC_EEPROM_FLASHTOOL_CACHE_DIR'
+
+# Compiled config store of this process
+STORE: dict = {}
+
+
+def get_cache_file() -> Path:
+    """Returns the path of the compiled config cache. Every installation of the tool uses its
+    own cache file."""
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if not cache_dir:
+        cache_home = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+        cache_dir = str(Path(cache_home) / 'phytec_eeprom_flashtool')
+    install_id = f"{zlib.crc32(str(CONFIG_DIR).encode('utf-8')):08x}"
+    return Path(cache_dir) / f"configs-v{CACHE_VERSION}-{install_id}.marshal"
+
+
+def get_fingerprint() -> tuple:
+    """Returns the name, modification time and size of all source files of the cache."""
+    sources = sorted(CONFIG_DIR.glob('*.yml')) + [CONSTANTS_FILE]
+    fingerprint = []
+    for source in sources:
+        source_stat = source.stat()
+        fingerprint.append((source.name, source_stat.st_mtime_ns, source_stat.st_size))
+    return tuple(fingerprint)
+
+
+def compile_configs(fingerprint: tuple) -> dict:
+    """Parses all YML files and returns the compiled config store."""
+    # pylint: disable=import-outside-toplevel
+    import yaml
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    products = {}
+    for yml_file in sorted(CONFIG_DIR.glob('*.yml')):
+        with open(yml_file, encoding='UTF-8') as config_file:
+            products[yml_file.stem] = yaml.load(config_file, Loader=loader)
+    with open(CONSTANTS_FILE, encoding='UTF-8') as constants_file:
+        constants = yaml.load(constants_file, Loader=loader)
+    return {
+        'fingerprint': fingerprint,
+        'constants': constants,
+        'products': products,
+    }
+
+
+def is_trusted(cache_stat: os.stat_result) -> bool:
+    """Returns whether a cache file is owned by the current user and not writable by its group
+    or others. Platforms without user IDs trust every cache file."""
+    geteuid = getattr(os, 'geteuid', None)
+    if geteuid is None:
+        return True
+    return cache_stat.st_uid == geteuid() and not cache_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def load_cache(cache_file: Path, fingerprint: tuple) -> dict | None:
+    """Returns the compiled config store from the cache file if it is still up to date and
+    trusted."""
+    try:
+        with open(cache_file, 'rb') as cache:
+            if not is_trusted(os.fstat(cache.fileno())):
+                return None
+            store = marshal.load(cache)
+    except (OSError, EOFError, TypeError, ValueError):
+        return None
+    if not isinstance(store, dict) or store.get('fingerprint') != fingerprint:
+        return None
+    return store
+
+
+def save_cache(cache_file: Path, store: dict):
+    """Stores the compiled config store atomically and only writable by the current user. A
+    read-only cache directory is no error, the configs are then parsed again by the next
+    process."""
+    # pylint: disable=import-outside-toplevel
+    import tempfile
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # pylint: disable=consider-using-with
+        cache = tempfile.NamedTemporaryFile('wb', dir=cache_file.parent, delete=False)
+        try:
+            with cache:
+                marshal.dump(store, cache)
+            os.replace(cache.name, cache_file)
+        except BaseException:
+            # Never leave a partial cache file behind
+            os.unlink(cache.name)
+            raise
+    except (OSError, ValueError):
+        pass
+
+
+def get_config_store() -> dict:
+    """Returns the compiled config store and (re)builds the cache file if necessary."""
+    if not STORE:
+        with timing('config'):
+            fingerprint = get_fingerprint()
+            cache_file = get_cache_file()
+            store = load_cache(cache_file, fingerprint)
+            if store is None:
+                store = compile_configs(fingerprint)
+                save_cache(cache_file, store)
+            STORE.update(store)
+    return STORE
+
+
+def get_product_names() -> list[str]:
+    """Returns the names of all products with a config."""
+    return sorted(get_config_store()['products'])
+
+
+def get_product_config(product: str) -> dict | None:
+    """Returns the config of a product or None if there is no config for this product."""
+    return get_config_store()['products'].get(product)
+
+
+def get_constants() -> dict:
+    """Returns all constants of the tool."""
+    return get_config_store()['constants']
@@ -0,0 +1,214 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Module to pack many EEPROM images into a single container file.
+
+Layout of a container (little endian):
+    header  magic, version, number of index entries, offset and key size of the index
+    images  all images back to back
+    index   one fixed size entry per key sorted by key, followed by all keys
+
+Every write appends the new images and a complete new index behind the end of the file and
+switches the header to the new index last. Readers and interrupted writes therefore always see
+a consistent container. Containers are read through mmap, so the images are sliced out of the
+file without copying them.
+"""
+import bisect
+import mmap
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .statefile import locked_file
+
+CONTAINER_MAGIC = b'PHYEECNT'
+CONTAINER_VERSION = 1
+# magic, version, reserved, number of entries, index offset, size of all keys
+CONTAINER_HEADER_ENCODING = "<8sHHIQQ"
+CONTAINER_HEADER_SIZE = struct.calcsize(CONTAINER_HEADER_ENCODING)
+# image offset, image size, key size, key offset relative to the first key
+CONTAINER_ENTRY_ENCODING = "<QIHI"
+CONTAINER_ENTRY_SIZE = struct.calcsize(CONTAINER_ENTRY_ENCODING)
+# Images collected by a ContainerWriter before they are appended at once
+CONTAINER_CHUNK_SIZE = 256
+
+# Containers opened by this process, reopened when the file changes
+CONTAINERS: dict[str, tuple[tuple[int, int], 'Container']] = {}
+
+
+class Container:
+    """Read-only view of a container file mapped into memory."""
+    def __init__(self, path: str | Path):
+        self.path = path
+        with open(path, 'rb') as container_file:
+            if os.fstat(container_file.fileno()).st_size < CONTAINER_HEADER_SIZE:
+                raise ValueError(f"{path} is no EEPROM image container")
+            self.mmap = mmap.mmap(container_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+        magic, version, _, self.count, self.index_offset, keys_size = \
+            struct.unpack_from(CONTAINER_HEADER_ENCODING, self.view)
+        if magic != CONTAINER_MAGIC:
+            raise ValueError(f"{path} is no EEPROM image container")
+        if version != CONTAINER_VERSION:
+            raise ValueError(f"Unsupported container version {version} of {path}")
+        self.keys_offset = self.index_offset + self.count * CONTAINER_ENTRY_SIZE
+        if self.keys_offset + keys_size > len(self.view):
+            raise ValueError(f"Index of container {path} is truncated")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def key(self, index: int) -> bytes:
+        """Returns the key of an index entry."""
+        _, _, key_size, key_offset = struct.unpack_from(
+            CONTAINER_ENTRY_ENCODING, self.view, self.index_offset + index * CONTAINER_ENTRY_SIZE)
+        start = self.keys_offset + key_offset
+        return bytes(self.view[start:start + key_size])
+
+    def entry(self, index: int) -> tuple[str, int, int]:
+        """Returns the key, image offset and image size of an index entry."""
+        offset, size, _, _ = struct.unpack_from(
+            CONTAINER_ENTRY_ENCODING, self.view, self.index_offset + index * CONTAINER_ENTRY_SIZE)
+        return self.key(index).decode('utf-8'), offset, size
+
+    def entries(self) -> Iterator[tuple[str, int, int]]:
+        """Yields the key, image offset and image size of all index entries sorted by key."""
+        for index in range(self.count):
+            yield self.entry(index)
+
+    def find(self, key: str) -> memoryview | None:
+        """Returns the image of a key as slice of the mapped file or None if there is no image
+        with this key. The index is searched binary without loading it."""
+        key_bytes = key.encode('utf-8')
+        index = bisect.bisect_left(range(self.count), key_bytes, key=self.key)
+        if index == self.count or self.key(index) != key_bytes:
+            return None
+        _, offset, size = self.entry(index)
+        return self.view[offset:offset + size]
+
+
+def open_container(path: str | Path) -> Container:
+    """Returns the mapped container of a file. Containers are shared by all reads of a process
+    until the file changes."""
+    path = str(Path(path).resolve())
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = CONTAINERS.get(path)
+    if cached is None or cached[0] != version:
+        CONTAINERS[path] = (version, Container(path))
+    return CONTAINERS[path][1]
+
+
+def read_container_image(path: str | Path, key: str) -> memoryview:
+    """Returns the image of a key without copying it."""
+    if not key:
+        raise ValueError(f"Set the key of the image in {path}#<key>")
+    image = open_container(path).find(key)
+    if image is None:
+        raise ValueError(f"No image with key {key} in {path}")
+    return image
+
+
+def get_image_keys(eeprom_data) -> list[str]:
+    """Returns the serial and all MAC addresses of an image, which are used as keys in addition
+    to the key the image is written with."""
+    keys = [':'.join(block.mac) for block in eeprom_data.mac_blocks.values()]
+    serial = eeprom_data.key_value_blocks.get("serial")
+    return ([serial.value] if serial is not None else []) + keys
+
+
+def read_index(container_file) -> dict[str, tuple[int, int]]:
+    """Reads all index entries of a locked container file into a dictionary."""
+    container_file.seek(0)
+    header = container_file.read(CONTAINER_HEADER_SIZE)
+    if not header:
+        return {}
+    magic, version, _, count, index_offset, keys_size = \
+        struct.unpack(CONTAINER_HEADER_ENCODING, header)
+    if magic != CONTAINER_MAGIC or version != CONTAINER_VERSION:
+        raise ValueError(f"{container_file.name} is no EEPROM image container")
+    container_file.seek(index_offset)
+    index = container_file.read(count * CONTAINER_ENTRY_SIZE + keys_size)
+    keys = memoryview(index)[count * CONTAINER_ENTRY_SIZE:]
+    entries = {}
+    for offset, size, key_size, key_offset in \
+            struct.iter_unpack(CONTAINER_ENTRY_ENCODING, index[:count * CONTAINER_ENTRY_SIZE]):
+        entries[bytes(keys[key_offset:key_offset + key_size]).decode('utf-8')] = (offset, size)
+    return entries
+
+
+def pack_index(entries: dict[str, tuple[int, int]]) -> tuple[bytes, int]:
+    """Packs the index entries sorted by key. Returns the index and the size of all keys."""
+    keys = sorted(entries, key=lambda key: key.encode('utf-8'))
+    table = bytearray(len(keys) * CONTAINER_ENTRY_SIZE)
+    blob = bytearray()
+    for index, key in enumerate(keys):
+        key_bytes = key.encode('utf-8')
+        struct.pack_into(CONTAINER_ENTRY_ENCODING, table, index * CONTAINER_ENTRY_SIZE,
+                         *entries[key], len(key_bytes), len(blob))
+        blob += key_bytes
+    return bytes(table + blob), len(blob)
+
+
+def append_images(path: str | Path, images: Iterable[tuple[list[str], bytes | bytearray]]):
+    """Appends images with their keys to a container, which is created if necessary. Every key
+    of an image points to the new image afterwards. Other keys of a replaced image still point
+    to it, so the serial and MAC addresses of one unit are never moved to another unit which
+    shares its binary name."""
+    with locked_file(path, create=True, binary=True) as container_file:
+        entries = read_index(container_file)
+        if not entries and container_file.seek(0, os.SEEK_END) < CONTAINER_HEADER_SIZE:
+            container_file.truncate(0)
+            container_file.write(bytes(CONTAINER_HEADER_SIZE))
+        end = container_file.seek(0, os.SEEK_END)
+        for keys, content in images:
+            if not keys:
+                raise ValueError("Every image of a container needs at least one key")
+            container_file.write(content)
+            for key in keys:
+                entries[key] = (end, len(content))
+            end += len(content)
+        index, keys_size = pack_index(entries)
+        container_file.write(index)
+        container_file.flush()
+        os.fsync(container_file.fileno())
+        container_file.seek(0)
+        container_file.write(struct.pack(CONTAINER_HEADER_ENCODING, CONTAINER_MAGIC,
+                                         CONTAINER_VERSION, 0, len(entries), end, keys_size))
+
+
+class ContainerWriter:
+    """Collects the images of many threads and appends them to a container in chunks, so the
+    index is rewritten once per chunk instead of once per image."""
+    def __init__(self, path: str | Path, chunk_size: int = CONTAINER_CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.pending: list[tuple[list[str], bytes | bytearray]] = []
+        self.lock = threading.Lock()
+
+    def add(self, keys: list[str], content: bytes | bytearray):
+        """Queues an image and appends all queued images once the chunk is full."""
+        with self.lock:
+            self.pending.append((keys, content))
+            if len(self.pending) >= self.chunk_size:
+                self.write_pending()
+
+    def write_pending(self):
+        """Appends all queued images. The caller holds the lock."""
+        if self.pending:
+            append_images(self.path, self.pending)
+            self.pending = []
+
+    def close(self):
+        """Appends the images of the last chunk."""
+        with self.lock:
+            self.write_pending()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -0,0 +1,147 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Module to emulate I2C EEPROM devices with local files.
+
+The emulator replaces the sysfs EEPROM devices when the environment variable
+PHYTEC_EEPROM_FLASHTOOL_EMULATOR is set to a directory, optionally followed by comma separated
+settings, e.g. '/tmp/eeproms,bus_hz=400000,eio_rate=0.01'. Every device is a file named after
+its bus and address in this directory, which is filled with erased bytes on first use.
+
+Like the at24 driver, reads are split into chunks of at most read_chunk bytes and writes are
+split at page boundaries. Every transfer takes as long as its bytes and the addressing need on
+the bus and every page write additionally waits for the write cycle. Transfers fail with EIO at
+random with the probability eio_rate. The pages written before a failed transfer keep their new
+content.
+"""
+import errno
+import os
+import random
+import threading
+import time
+from io import RawIOBase
+from pathlib import Path
+from typing import NamedTuple
+
+from .common import EMULATOR_ENV
+
+# Start, device address, two address bytes and the repeated start of a transfer
+I2C_OVERHEAD_BYTES = 4
+# Eight data bits and the acknowledge bit of every byte
+I2C_BITS_PER_BYTE = 9
+
+# Random fault generators of this process by seed
+FAULTS: dict[int | None, random.Random] = {}
+FAULTS_LOCK = threading.Lock()
+
+
+class EmulatorSettings(NamedTuple):
+    """Timing and fault model of all emulated EEPROM devices."""
+    directory: Path
+    size: int = 4096
+    bus_hz: int = 100000
+    read_chunk: int = 128
+    page_size: int | None = None
+    write_cycle_ms: float = 5.0
+    eio_rate: float = 0.0
+    seed: int | None = None
+
+
+def parse_emulator_settings(value: str) -> EmulatorSettings:
+    """Converts a DIR[,NAME=VALUE...] string into emulator settings."""
+    directory, *assignments = value.split(',')
+    settings: dict = {'directory': Path(directory)}
+    for assignment in assignments:
+        name, separator, setting = assignment.partition('=')
+        name = name.strip()
+        if not separator or name not in EmulatorSettings._fields or name == 'directory':
+            raise ValueError(f"Invalid emulator setting '{assignment}' in {EMULATOR_ENV}")
+        field_type = float if name in ('write_cycle_ms', 'eio_rate') else int
+        settings[name] = field_type(setting)
+    return EmulatorSettings(**settings)
+
+
+def get_faults(settings: EmulatorSettings) -> random.Random:
+    """Returns the random generator of the faults of all devices with the same seed, so a
+    seeded run fails the same transfers every time."""
+    with FAULTS_LOCK:
+        if settings.seed not in FAULTS:
+            FAULTS[settings.seed] = random.Random(settings.seed)
+        return FAULTS[settings.seed]
+
+
+class EmulatedEeprom(RawIOBase):
+    """EEPROM device emulated by a local file with the interface of the sysfs device file."""
+    def __init__(self, settings: EmulatorSettings, i2c_bus: int, i2c_dev: int, page_size: int):
+        super().__init__()
+        self.settings = settings
+        self.page_size = settings.page_size or page_size
+        self.faults = get_faults(settings)
+        self.position = 0
+        settings.directory.mkdir(parents=True, exist_ok=True)
+        self.path = settings.directory / f"i2c-{i2c_bus}-0x{i2c_dev:02x}.bin"
+        try:
+            self.device = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+            os.write(self.device, b'\xff' * settings.size)
+        except FileExistsError:
+            self.device = os.open(self.path, os.O_RDWR)
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.settings.size
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def transfer(self, size: int, write_cycle: bool = False):
+        """Waits as long as a transfer of size bytes takes on the bus and fails it at random."""
+        duration = (I2C_OVERHEAD_BYTES + size) * I2C_BITS_PER_BYTE / self.settings.bus_hz
+        if write_cycle:
+            duration += self.settings.write_cycle_ms / 1000
+        time.sleep(duration)
+        if self.settings.eio_rate and self.faults.random() < self.settings.eio_rate:
+            raise OSError(errno.EIO, os.strerror(errno.EIO), str(self.path))
+
+    def readinto(self, buffer) -> int:  # type: ignore[override]
+        end = min(self.position + len(buffer), self.settings.size)
+        view = memoryview(buffer)
+        done = 0
+        while self.position < end:
+            size = min(self.settings.read_chunk, end - self.position)
+            self.transfer(size)
+            view[done:done + size] = os.pread(self.device, size, self.position)
+            self.position += size
+            done += size
+        return done
+
+    def write(self, content) -> int:  # type: ignore[override]
+        content = memoryview(content)
+        if self.position + len(content) > self.settings.size:
+            raise OSError(errno.EFBIG, os.strerror(errno.EFBIG), str(self.path))
+        done = 0
+        while done < len(content):
+            size = min(self.page_size - self.position % self.page_size, len(content) - done)
+            self.transfer(size, write_cycle=True)
+            os.pwrite(self.device, content[done:done + size], self.position)
+            self.position += size
+            done += size
+        return done
+
+    def close(self):
+        if not self.closed:
+            os.close(self.device)
+        super().close()
@@ -4,7 +4,6 @@
 
 """Module to handle the en- and decoding of the EEPROM data."""
 #pylint: disable=import-error
-from dataclasses import dataclass
 from enum import Enum
 import struct
 import sys
@@ -13,10 +12,15 @@ from .common import str_to_revision
 from .common import sub_revision_to_str
 from .common import crc8_checksum_calc
 from .common import hw8_checksum_calc
+from .common import hw8_checksum_calc_many
 from .common import get_max_option_count
 from .blocks import API_V3_SUB_VERSION
-from .blocks import EepromV3BlockInterface
+from .blocks import EepromBlock
+from .blocks import EepromDataMACBlock
+from .blocks import EepromDataKeyValueBlock
+from .blocks import normalize_mac
 from .blocks import unpack_block
+from .timings import timing
 
 # 1 uchar for the API version
 ENCODING_API_VERSION = "<1B"
@@ -83,13 +87,17 @@ class ComponentType(Enum):
 
 
 #pylint: disable=too-many-instance-attributes
-@dataclass
 class EepromData:
     """Data class to hold all values of the API v2 EEPROM structure."""
-    def __init__(self, yml_parser: YmlParser):
-        self.yml_parser = yml_parser
+    def __init__(self, yml_parser: YmlParser | None):
+        # Images decoded without config get an empty one
+        self.yml_parser: YmlParser = yml_parser or {}
         # API v3 content
-        self.blocks: list = []
+        self.blocks: list[EepromBlock] = []
+        # Indexes of the API v3 blocks for constant time lookups
+        self.mac_blocks: dict[int, EepromDataMACBlock] = {}
+        self.mac_addresses: dict[str, EepromDataMACBlock] = {}
+        self.key_value_blocks: dict[str, EepromDataKeyValueBlock] = {}
 
     api_version: int
     pcb_revision: int
@@ -139,7 +147,7 @@ class EepromData:
         """Decodes the product full name from ep_data"""
         base_name = self.base_name()
         if self.som_type.is_phycore():
-            extended_opt = int(self.yml_parser['PHYTEC'].get('extended_options', 0))
+            extended_opt = int(self.yml_parser.get('PHYTEC', {}).get('extended_options', 0))
             full_name = f"{base_name}"
             if extended_opt:
                 full_name += f"-{self.kit_opt[:-extended_opt]}"
@@ -157,10 +165,52 @@ class EepromData:
 
         return f"{full_name}.{self.bom_rev}"
 
-    def add_block(self, block: EepromV3BlockInterface):
-        """Adds an EEPROM block to the EEPROM data."""
+    def add_block(self, block: EepromBlock):
+        """Adds an EEPROM block to the EEPROM data. If a decoded image contains duplicates, the
+        first block stays in the indexes."""
         self.v3_next_block_address += block.length
         self.blocks.append(block)
+        self.index_block(block)
+
+    def replace_block(self, block: EepromBlock, new_block: EepromBlock):
+        """Replaces an EEPROM block with a new block at the same position."""
+        self.blocks[self.blocks.index(block)] = new_block
+        self.v3_next_block_address += new_block.length - block.length
+        self.reindex_blocks()
+
+    def remove_block(self, block: EepromBlock):
+        """Removes an EEPROM block. All following blocks move up."""
+        self.blocks.remove(block)
+        self.v3_next_block_address -= block.length
+        self.reindex_blocks()
+
+    def index_block(self, block: EepromBlock):
+        """Adds a block to the lookup indexes unless an earlier block has the same key."""
+        if isinstance(block, EepromDataMACBlock):
+            self.mac_blocks.setdefault(block.interface, block)
+            self.mac_addresses.setdefault(':'.join(block.mac), block)
+        elif isinstance(block, EepromDataKeyValueBlock):
+            self.key_value_blocks.setdefault(block.key, block)
+
+    def reindex_blocks(self):
+        """Rebuilds the lookup indexes of all blocks."""
+        self.mac_blocks.clear()
+        self.mac_addresses.clear()
+        self.key_value_blocks.clear()
+        for block in self.blocks:
+            self.index_block(block)
+
+    def get_mac_block(self, interface: int) -> EepromDataMACBlock | None:
+        """Returns the MAC block of an Ethernet interface or None."""
+        return self.mac_blocks.get(interface)
+
+    def find_mac_block(self, mac: str) -> EepromDataMACBlock | None:
+        """Returns the MAC block with the MAC address or None."""
+        return self.mac_addresses.get(normalize_mac(mac))
+
+    def get_key_value_block(self, key: str) -> EepromDataKeyValueBlock | None:
+        """Returns the key value block of a key or None."""
+        return self.key_value_blocks.get(key)
 
 
 def get_eeprom_data(args, yml_parser: YmlParser) -> EepromData:
@@ -286,17 +336,39 @@ def eeprom_data_to_data_header(eeprom_data: EepromData) -> bytes:
     return eeprom_struct
 
 
-def eeprom_data_to_blocks(eeprom_data: EepromData) -> bytes:
+def eeprom_data_to_blocks(eeprom_data: EepromData) -> bytearray:
     """Pack all EEPROM blocks."""
-    eeprom_blocks = b""
+    eeprom_blocks = bytearray(sum(block.length for block in eeprom_data.blocks))
+    pack_blocks_into(eeprom_data, eeprom_blocks, 0)
+    return eeprom_blocks
+
+
+def pack_blocks_into(eeprom_data: EepromData, buffer: bytearray, offset: int):
+    """Pack all EEPROM blocks into the buffer starting at the offset."""
     next_block_address = EEPROM_V3_DATA_PAYLOAD_START
     for block in eeprom_data.blocks:
+        block_address = next_block_address
         next_block_address += block.length
-        eeprom_blocks += block.pack(next_block_address)
-    return eeprom_blocks
+        block.pack_into(buffer, offset + block_address, next_block_address)
 
 
-def struct_to_eeprom_data(eeprom_struct: bytes, yml_parser: YmlParser) -> EepromData:
+def eeprom_data_to_image(eeprom_data: EepromData) -> bytearray:
+    """Pack the EEPROM data including all blocks into a complete image. The image is allocated
+    once with its final size and every block is packed in place."""
+    with timing('encode') as phase:
+        eeprom_struct = eeprom_data_to_struct(eeprom_data)
+        if not eeprom_data.is_v3():
+            image = bytearray(eeprom_struct)
+        else:
+            image = bytearray(len(eeprom_struct) + eeprom_data.v3_payload_length)
+            image[:len(eeprom_struct)] = eeprom_struct
+            pack_blocks_into(eeprom_data, image, len(eeprom_struct))
+        phase.add_bytes(len(image))
+    return image
+
+
+def struct_to_eeprom_data(eeprom_struct: bytes | memoryview,
+                          yml_parser: YmlParser | None) -> EepromData:
     """Unpack the EEPROM struct."""
     api_version = int(struct.unpack(ENCODING_API_VERSION, eeprom_struct[:1])[0])
     if api_version >= 2:
@@ -304,7 +376,8 @@ def struct_to_eeprom_data(eeprom_struct: bytes, yml_parser: YmlParser) -> Eeprom
     return struct_to_eeprom_data_v1(eeprom_struct, yml_parser)
 
 
-def struct_to_eeprom_data_v1(eeprom_struct: bytes, yml_parser: YmlParser) -> EepromData:
+def struct_to_eeprom_data_v1(eeprom_struct: bytes | memoryview,
+                             yml_parser: YmlParser | None) -> EepromData:
     """Unpack the EEPROM struct with API v1. Only the PCM-057 uses v1."""
     unpacked = struct.unpack(ENCODING_API1, eeprom_struct[:EEPROM_V1_SIZE])
 
@@ -329,13 +402,14 @@ def struct_to_eeprom_data_v1(eeprom_struct: bytes, yml_parser: YmlParser) -> Eep
             raise AssertionError(f"Unknown component type 0x{eeprom_data.som_type:x} "\
                                  "in API v1 data!")
     eeprom_data.ksp_number = unpacked[3]
-    if yml_parser is not None:
-        #This will not be read when yml_parser is not set
-        full_kit_opt = unpacked[4].decode('utf-8')
-        eeprom_data.bom_rev = full_kit_opt[len(yml_parser['Kit']):len(yml_parser['Kit'])+2]
-        eeprom_data.kit_opt = full_kit_opt[:len(yml_parser['Kit'])]
-        eeprom_data.crc8 = crc8_checksum_calc(eeprom_struct[:EEPROM_V2_SIZE - 1])
-        eeprom_data.hw8 = int(unpacked[3])
+    full_kit_opt = unpacked[4].decode('utf-8')
+    # Without config the BoM revision is taken from behind the last option which is set
+    kit_length = len(yml_parser['Kit']) if yml_parser is not None else \
+        len(full_kit_opt.rstrip('\x00')) - 2
+    eeprom_data.bom_rev = full_kit_opt[kit_length:kit_length + 2]
+    eeprom_data.kit_opt = full_kit_opt[:kit_length]
+    eeprom_data.crc8 = crc8_checksum_calc(eeprom_struct[:EEPROM_V2_SIZE - 1])
+    eeprom_data.hw8 = int(unpacked[3])
 
     eeprom_data.pcb_sub_revision = "0"
     eeprom_data.opttree_revision = "0"
@@ -343,7 +417,19 @@ def struct_to_eeprom_data_v1(eeprom_struct: bytes, yml_parser: YmlParser) -> Eep
     return eeprom_data
 
 
-def struct_to_eeprom_data_v2(eeprom_struct: bytes, yml_parser: YmlParser) -> EepromData:
+def check_v1_checksums(eeprom_images: bytes | memoryview) -> list[bool]:
+    """Checks the hw8 checksums of many API v1 images stored back to back, e.g. an archive of
+    EEPROM images. Returns whether the checksum of each image is valid."""
+    eeprom_images = memoryview(eeprom_images)
+    offsets = range(0, len(eeprom_images) - EEPROM_V1_SIZE + 1, EEPROM_V1_SIZE)
+    checksums = hw8_checksum_calc_many(eeprom_images[offset:offset + EEPROM_V1_SIZE - 1]
+                                       for offset in offsets)
+    return [checksum == eeprom_images[offset + EEPROM_V1_SIZE - 1]
+            for checksum, offset in zip(checksums, offsets)]
+
+
+def struct_to_eeprom_data_v2(eeprom_struct: bytes | memoryview,
+                             yml_parser: YmlParser | None) -> EepromData:
     """Unpack the EEPROM struct with API v2 or higher layout."""
     if crc8_checksum_calc(eeprom_struct[:EEPROM_V2_SIZE]):
         raise AssertionError("Checksum mismatch in the first 32 bytes!")
@@ -357,12 +443,14 @@ def struct_to_eeprom_data_v2(eeprom_struct: bytes, yml_parser: YmlParser) -> Eep
     eeprom_data.som_type = ComponentType(unpacked[3])
     eeprom_data.base_article_number = unpacked[4]
     eeprom_data.ksp_number = unpacked[5]
-    if yml_parser is not None:
-        # This will not be read when yml_parser is not set
-        eeprom_data.bom_rev = unpacked[7].decode('utf-8')
-        eeprom_data.crc8 = unpacked[8]
-        eeprom_data.hw8 = 0
-        eeprom_data.kit_opt = unpacked[6].decode('utf-8')[:len(yml_parser['Kit'])]
+    eeprom_data.bom_rev = unpacked[7].decode('utf-8')
+    eeprom_data.crc8 = unpacked[8]
+    eeprom_data.hw8 = 0
+    # Without config the padding behind the last option can not be told apart from options
+    # which are not set
+    kit_opt = unpacked[6].decode('utf-8')
+    eeprom_data.kit_opt = kit_opt[:len(yml_parser['Kit'])] if yml_parser is not None else \
+        kit_opt.rstrip('\x00')
     eeprom_data.sub_revisions = format(eeprom_data.sub_revisions, '08b')
     eeprom_data.pcb_sub_revision = eeprom_data.sub_revisions[4:]
     eeprom_data.opttree_revision = format(int(eeprom_data.sub_revisions[:4], 2), '04b')
@@ -378,12 +466,13 @@ def struct_to_eeprom_data_v2(eeprom_struct: bytes, yml_parser: YmlParser) -> Eep
     return eeprom_data
 
 
-def data_header_to_eeprom_data(eeprom_struct: bytes, eeprom_data: EepromData) -> EepromData:
+def data_header_to_eeprom_data(eeprom_struct: bytes | memoryview,
+                               eeprom_data: EepromData) -> EepromData:
     """Unpack the EEPROM data header."""
-    unpacked = struct.unpack(ENCODING_API3_DATA_HEADER,
-                             eeprom_struct[-EEPROM_V3_DATA_HEADER_SIZE:])
+    data_header = eeprom_struct[EEPROM_V2_SIZE:EEPROM_V2_SIZE + EEPROM_V3_DATA_HEADER_SIZE]
+    unpacked = struct.unpack(ENCODING_API3_DATA_HEADER, data_header)
 
-    if crc8_checksum_calc(eeprom_struct[-EEPROM_V3_DATA_HEADER_SIZE:]):
+    if crc8_checksum_calc(data_header):
         raise AssertionError("Data header crc8 mismatch!")
 
     eeprom_data.v3_payload_length = int(unpacked[0])
@@ -394,14 +483,70 @@ def data_header_to_eeprom_data(eeprom_struct: bytes, eeprom_data: EepromData) ->
     return eeprom_data
 
 
-def blocks_to_eeprom_data(eeprom_data: EepromData, eeprom_blocks: bytes) -> EepromData:
-    """Unpack all EEPROM blocks."""
+def get_image_size(eeprom_header: bytes | memoryview) -> int:
+    """Returns the size of the content of an image from its headers without product config. The
+    data payload of API v3 images follows the headers."""
+    header_size = EEPROM_V2_SIZE + EEPROM_V3_DATA_HEADER_SIZE
+    if len(eeprom_header) < header_size or eeprom_header[0] != 3:
+        return EEPROM_V2_SIZE
+    payload_length = struct.unpack_from(ENCODING_API3_DATA_HEADER, eeprom_header,
+                                        EEPROM_V2_SIZE)[0]
+    return header_size + int(payload_length)
+
+
+def blocks_to_eeprom_data(eeprom_data: EepromData,
+                          eeprom_blocks: bytes | memoryview) -> EepromData:
+    """Unpack all EEPROM blocks. The blocks are decoded in place without copying the payload."""
+    eeprom_blocks = memoryview(eeprom_blocks)
+    offset = EEPROM_V3_DATA_PAYLOAD_START
     for _ in range(eeprom_data.v3_block_count):
-        block_size = unpack_block(eeprom_data, eeprom_blocks)
-        eeprom_blocks = eeprom_blocks[block_size:]
+        offset += unpack_block(eeprom_data, eeprom_blocks, offset)
+    return eeprom_data
+
+
+def image_to_eeprom_data(eeprom_image: bytes | memoryview,
+                         yml_parser: YmlParser | None) -> EepromData:
+    """Unpack a whole EEPROM image including all blocks. The image can be longer than the
+    actual content, e.g. the complete content of an EEPROM device. Pass a memoryview to decode
+    all parts of the image without copying them. Without config the kit options are decoded
+    raw.
+    """
+    eeprom_image = memoryview(eeprom_image)
+    with timing('decode') as phase:
+        eeprom_data = struct_to_eeprom_data(eeprom_image, yml_parser)
+        content_end = EEPROM_V1_SIZE if eeprom_data.is_v1() else EEPROM_V2_SIZE
+        if eeprom_data.is_v3():
+            payload_start = EEPROM_V2_SIZE + EEPROM_V3_DATA_HEADER_SIZE
+            content_end = payload_start + eeprom_data.v3_payload_length
+            if content_end > len(eeprom_image):
+                raise AssertionError(f"Image size ({len(eeprom_image)}) is smaller than the "
+                                     f"size of the content ({content_end})!")
+            eeprom_data = blocks_to_eeprom_data(eeprom_data,
+                                                eeprom_image[payload_start:content_end])
+        phase.add_bytes(content_end)
     return eeprom_data
 
 
+def verify_image(eeprom_image: bytes | bytearray, readback: bytes | memoryview,
+                 yml_parser: YmlParser) -> dict:
+    """Compares a read back image byte by byte with the written image and checks all CRC8
+    checksums of the read back image. Returns a result record with pass or fail.
+    """
+    result: dict = {"verify": "pass", "bytes": len(eeprom_image)}
+    if readback != eeprom_image:
+        offset = next((index for index, (written, read) in
+                       enumerate(zip(eeprom_image, readback)) if written != read),
+                      min(len(eeprom_image), len(readback)))
+        result.update(verify="fail", offset=offset,
+                      error=f"Read back content differs at offset {offset}")
+        return result
+    try:
+        image_to_eeprom_data(memoryview(readback), yml_parser)
+    except (AssertionError, ValueError, struct.error) as err:
+        result.update(verify="fail", error=str(err))
+    return result
+
+
 def print_eeprom_data(eeprom_data: EepromData):
     """ Print out the eeprom data. """
     pcb_rev = str(eeprom_data.pcb_revision)
@@ -411,10 +556,11 @@ def print_eeprom_data(eeprom_data: EepromData):
     newline = '\n'
     kit_options_verbose = []
     kit_opt_length = 17
-    for index, kit_opt in eeprom_data.yml_parser['Kit'].items():
+    # Images decoded without config have no option names
+    for index, kit_opt in eeprom_data.yml_parser.get('Kit', {}).items():
         if (len(kit_opt) + 1) > kit_opt_length:
             kit_opt_length = len(kit_opt) + 1
-    for index, kit_opt in eeprom_data.yml_parser['Kit'].items():
+    for index, kit_opt in eeprom_data.yml_parser.get('Kit', {}).items():
         option = eeprom_data.kit_opt[int(index)]
         if option == '\x00':
             option = "0"
@@ -422,7 +568,7 @@ def print_eeprom_data(eeprom_data: EepromData):
         kit_options_verbose.append(f"{kit_opt.ljust(kit_opt_length)}: {value}")
 
     kit_opt_string = eeprom_data.kit_opt.replace('\x00','#')
-    extended_options = int(eeprom_data.yml_parser['PHYTEC'].get('extended_options', 0))
+    extended_options = int(eeprom_data.yml_parser.get('PHYTEC', {}).get('extended_options', 0))
     opts = kit_opt_string[:-extended_options] if extended_options else kit_opt_string
     ext_opts = kit_opt_string[-extended_options:] if extended_options else "-"
 
@@ -450,7 +596,7 @@ Base Article Number
 
 Verbose Kit Options
 *******************
-{newline.join(kit_options_verbose)}
+{newline.join(kit_options_verbose) or "No product config"}
 
 Extras
 ******
@@ -0,0 +1,229 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Module to index the content of many EEPROM binaries in a SQLite database.
+
+Directory trees are scanned for binaries, which are decoded in a process pool. The product,
+revisions, kit options, MAC addresses and key-value pairs of every binary are stored in the
+database. Binaries whose modification time and size did not change since the last scan are not
+decoded again and binaries which were deleted are removed from the index.
+"""
+import os
+import sqlite3
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .io import binary_read
+from .io import load_yml_config
+from .encoding import decode_base_name_from_raw
+from .encoding import get_som_type_name_by_value
+from .encoding import image_to_eeprom_data
+from .blocks import normalize_mac
+
+# Binaries decoded by a worker process at once
+CHUNK_SIZE = 64
+# Larger files are no EEPROM binaries and are not read at all
+MAX_BINARY_SIZE = 64 * 1024
+# Errors of a single binary which must not abort the scan
+DECODE_ERRORS = (SystemExit, ValueError, AssertionError, KeyError, OSError, struct.error)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    product TEXT,
+    base_name TEXT,
+    som_type TEXT,
+    api_version INTEGER,
+    pcb_revision TEXT,
+    bom_revision TEXT,
+    kit_options TEXT
+);
+CREATE TABLE IF NOT EXISTS macs (
+    image_id INTEGER NOT NULL REFERENCES images(id) ON DELETE CASCADE,
+    interface INTEGER NOT NULL,
+    mac TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS key_values (
+    image_id INTEGER NOT NULL REFERENCES images(id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_product ON images(product);
+CREATE INDEX IF NOT EXISTS images_base_name ON images(base_name);
+CREATE INDEX IF NOT EXISTS macs_mac ON macs(mac);
+CREATE INDEX IF NOT EXISTS macs_image_id ON macs(image_id);
+CREATE INDEX IF NOT EXISTS key_values_key_value ON key_values(key, value);
+CREATE INDEX IF NOT EXISTS key_values_image_id ON key_values(image_id);
+"""
+
+
+def open_index(index_path: str | Path) -> sqlite3.Connection:
+    """Opens the index database and creates all tables if necessary."""
+    connection = sqlite3.connect(index_path)
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def scan_files(directories: Iterable[str | Path]) -> Iterator[tuple[str, int, int]]:
+    """Yields the absolute path, modification time and size of all files of the directory
+    trees in a sorted order."""
+    pending = sorted((str(Path(directory).resolve()) for directory in directories),
+                     reverse=True)
+    while pending:
+        try:
+            entries = sorted(os.scandir(pending.pop()), key=lambda entry: entry.name)
+        except OSError:
+            continue
+        subdirectories = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry.path)
+            elif entry.is_file():
+                stat = entry.stat()
+                yield entry.path, stat.st_mtime_ns, stat.st_size
+        pending.extend(reversed(subdirectories))
+
+
+def decode_binary(path: str) -> dict:
+    """Decodes a binary with the config of the detected product and returns its index record.
+    Binaries which can not be decoded get an error record."""
+    try:
+        if os.path.getsize(path) > MAX_BINARY_SIZE:
+            raise ValueError("File is too large for an EEPROM binary")
+        image = memoryview(binary_read(path, -1))
+        yml_parser = load_yml_config(decode_base_name_from_raw(image))
+        eeprom_data = image_to_eeprom_data(image, yml_parser)
+        pcb_revision = str(eeprom_data.pcb_revision)
+        if eeprom_data.pcb_sub_revision != "0":
+            pcb_revision += eeprom_data.pcb_sub_revision
+        return {
+            "status": "ok",
+            "product": eeprom_data.full_name(),
+            "base_name": eeprom_data.base_name(),
+            "som_type": get_som_type_name_by_value(eeprom_data.som_type),
+            "api_version": eeprom_data.api_version,
+            "pcb_revision": pcb_revision,
+            "bom_revision": eeprom_data.bom_rev,
+            "kit_options": eeprom_data.kit_opt,
+            "macs": [(block.interface, ':'.join(block.mac))
+                     for block in eeprom_data.mac_blocks.values()],
+            "key_values": [(block.key, block.value)
+                           for block in eeprom_data.key_value_blocks.values()],
+        }
+    except DECODE_ERRORS as err:
+        return {"status": "error", "error": str(err) or type(err).__name__}
+
+
+def store_record(connection: sqlite3.Connection, path: str, mtime_ns: int, size: int,
+                 record: dict):
+    """Replaces the index entries of a binary."""
+    connection.execute("DELETE FROM images WHERE path = ?", (path,))
+    cursor = connection.execute(
+        "INSERT INTO images (path, mtime_ns, size, status, error, product, base_name, "
+        "som_type, api_version, pcb_revision, bom_revision, kit_options) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (path, mtime_ns, size, record["status"], record.get("error"), record.get("product"),
+         record.get("base_name"), record.get("som_type"), record.get("api_version"),
+         record.get("pcb_revision"), record.get("bom_revision"), record.get("kit_options")))
+    connection.executemany("INSERT INTO macs (image_id, interface, mac) VALUES (?, ?, ?)",
+                           [(cursor.lastrowid, *mac) for mac in record.get("macs", [])])
+    connection.executemany("INSERT INTO key_values (image_id, key, value) VALUES (?, ?, ?)",
+                           [(cursor.lastrowid, *key_value)
+                            for key_value in record.get("key_values", [])])
+
+
+def index_binaries(connection: sqlite3.Connection, binaries: list[tuple[str, int, int]],
+                   jobs: int | None = None) -> int:
+    """Decodes the binaries in a process pool and stores their records. Returns the number of
+    binaries which could not be decoded."""
+    errors = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        records = executor.map(decode_binary, [path for path, _, _ in binaries],
+                               chunksize=CHUNK_SIZE)
+        for (path, mtime_ns, size), record in zip(binaries, records):
+            errors += record["status"] != "ok"
+            store_record(connection, path, mtime_ns, size, record)
+    return errors
+
+
+def update_index(index_path: str | Path, directories: list[str], jobs: int | None = None) -> dict:
+    """Scans the directory trees and updates the index. Only new and changed binaries are
+    decoded. Returns the number of scanned, updated, removed and undecodable binaries."""
+    start = time.monotonic()
+    roots = [str(Path(directory).resolve()) for directory in directories]
+    for root in roots:
+        if not os.path.isdir(root):
+            raise ValueError(f"{root} is not a directory")
+    with open_index(index_path) as connection:
+        indexed = {path: (mtime_ns, size) for path, mtime_ns, size in
+                   connection.execute("SELECT path, mtime_ns, size FROM images")}
+        files = list(scan_files(roots))
+        changed = [(path, mtime_ns, size) for path, mtime_ns, size in files
+                   if indexed.get(path) != (mtime_ns, size)]
+        found = {path for path, _, _ in files}
+        removed = [path for path in indexed if path not in found and
+                   any(path.startswith(os.path.join(root, '')) for root in roots)]
+        connection.executemany("DELETE FROM images WHERE path = ?",
+                               [(path,) for path in removed])
+        errors = index_binaries(connection, changed, jobs) if changed else 0
+    connection.close()
+    return {
+        "scanned": len(files),
+        "updated": len(changed),
+        "removed": len(removed),
+        "errors": errors,
+        "duration": time.monotonic() - start,
+    }
+
+
+def query_index(index_path: str | Path, mac: str | None = None,
+                key_value: tuple[str, str] | None = None,
+                product: str | None = None) -> list[dict]:
+    """Returns all indexed binaries with the MAC address, the key-value pair and the product
+    name or base name. All given conditions must match."""
+    conditions = ["images.status = 'ok'"]
+    parameters: list = []
+    if mac is not None:
+        conditions.append("images.id IN (SELECT image_id FROM macs WHERE mac = ?)")
+        parameters.append(normalize_mac(mac))
+    if key_value is not None:
+        conditions.append("images.id IN (SELECT image_id FROM key_values WHERE key = ? AND "
+                          "value = ?)")
+        parameters.extend(key_value)
+    if product is not None:
+        conditions.append("(images.product = ? OR images.base_name = ?)")
+        parameters.extend([product, product])
+    if not os.path.exists(index_path):
+        raise ValueError(f"Index {index_path} does not exist.")
+    with open_index(index_path) as connection:
+        rows = connection.execute(
+            "SELECT id, path, product, pcb_revision, bom_revision, kit_options FROM images "
+            f"WHERE {' AND '.join(conditions)} ORDER BY path", parameters).fetchall()
+        results = []
+        for image_id, path, product_name, pcb_revision, bom_revision, kit_options in rows:
+            results.append({
+                "path": path,
+                "product": product_name,
+                "pcb_revision": pcb_revision,
+                "bom_revision": bom_revision,
+                "kit_options": kit_options,
+                "macs": dict(connection.execute(
+                    "SELECT interface, mac FROM macs WHERE image_id = ? ORDER BY interface",
+                    (image_id,))),
+                "key_values": dict(connection.execute(
+                    "SELECT key, value FROM key_values WHERE image_id = ? ORDER BY key",
+                    (image_id,))),
+            })
+    connection.close()
+    return results
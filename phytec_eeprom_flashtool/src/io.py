@@ -4,17 +4,35 @@
 
 """Module to handle all EEPROM or local disk IO operations."""
 from pathlib import Path
+import errno
+import os
 import sys
-import yaml
-from .encoding import decode_base_name_from_raw, YmlParser, EepromData
+import threading
+import time
+from .config import CONFIG_DIR, get_product_config
+from .encoding import decode_base_name_from_raw, get_image_size, YmlParser, EepromData
 from .encoding import EEPROM_V2_SIZE, EEPROM_V3_DATA_HEADER_SIZE
+from .common import EMULATOR_ENV
+from .timings import timing
 
 TOOL_DIR = Path(__file__).resolve().parent
-YML_DIR = TOOL_DIR / Path('../configs')
+YML_DIR = CONFIG_DIR
 OUTPUT_DIR = Path.cwd() / 'output'
 # Files on our targets
 PRODUCT_NAME_FILE = Path("/proc/device-tree/phytec,som-product-name").resolve()
 PART_NUMBER_FILE = Path("/proc/device-tree/phytec,som-part-number").resolve()
+# One lock per EEPROM device to serialize accesses from several threads
+EEPROM_LOCKS: dict[Path, threading.Lock] = {}
+EEPROM_LOCKS_GUARD = threading.Lock()
+# Config of commands which decode images without product config. Only the EEPROM device is
+# taken from it, which is usually selected with -bus.
+RAW_YML_PARSER: dict = {'PHYTEC': {'i2c_bus': 0, 'i2c_dev': 0x50}}
+# Errors of a page write which are worth retrying, e.g. a device busy with its write cycle
+TRANSIENT_ERRNOS = (errno.EIO, errno.EAGAIN, errno.ETIMEDOUT, errno.EREMOTEIO)
+# Retries of a single page and the bounded exponential backoff between them in seconds
+WRITE_RETRIES = 5
+WRITE_BACKOFF = 0.01
+WRITE_BACKOFF_MAX = 0.2
 
 
 def get_eeprom_bus(yml_parser: YmlParser) -> Path:
@@ -24,6 +42,13 @@ def get_eeprom_bus(yml_parser: YmlParser) -> Path:
     return Path(f"/sys/class/i2c-dev/i2c-{i2c_bus}/device/{i2c_bus}-{i2c_dev:04X}/eeprom")
 
 
+def get_eeprom_lock(yml_parser: YmlParser) -> threading.Lock:
+    """Returns the lock of the EEPROM device. Hold it for the whole read-modify-write cycle."""
+    eeprom_bus = get_eeprom_bus(yml_parser)
+    with EEPROM_LOCKS_GUARD:
+        return EEPROM_LOCKS.setdefault(eeprom_bus, threading.Lock())
+
+
 def get_maximum_image_size(yml_parser: YmlParser) -> int:
     """Returns the maximum allowed EEPROM image size in Bytes.
     If 'max_iamge_size' is not defined in the config, this function will default to
@@ -33,7 +58,130 @@ def get_maximum_image_size(yml_parser: YmlParser) -> int:
     return int(yml_parser['PHYTEC'].get('max_image_size', 32 if api <= 2 else 4096))
 
 
-def check_maximum_image_size(yml_parser: YmlParser, content: bytes, offset: int = 0):
+def get_page_size(yml_parser: YmlParser) -> int:
+    """Returns the page size of the EEPROM device in Bytes.
+    If 'page_size' is not defined in the config, this function will default to 16 Bytes which
+    is the smallest page size of all supported EEPROM devices.
+    """
+    return int(yml_parser['PHYTEC'].get('page_size', 16))
+
+
+def get_write_cycle(yml_parser: YmlParser) -> float:
+    """Returns the time in seconds to wait after every page write.
+    If 'write_cycle_ms' is not defined in the config, this function will default to 0 and the
+    EEPROM driver is trusted to wait for the end of the write cycle.
+    """
+    return float(yml_parser['PHYTEC'].get('write_cycle_ms', 0)) / 1000
+
+
+def get_page_chunks(start: int, end: int, page_size: int) -> list[tuple[int, int]]:
+    """Splits the range from start to end into (start, end) chunks which never cross a page
+    boundary."""
+    chunks = []
+    while start < end:
+        chunk_end = min(start - start % page_size + page_size, end)
+        chunks.append((start, chunk_end))
+        start = chunk_end
+    return chunks
+
+
+class WriteStats:
+    """Throughput, retries and latencies of the page writes of an image."""
+    def __init__(self) -> None:
+        self.bytes = 0
+        self.chunks = 0
+        self.retries = 0
+        self.duration = 0.0
+        self.latencies: list[float] = []
+
+    def to_dict(self) -> dict:
+        """Returns the statistics as dictionary. Latencies are given in milliseconds."""
+        latencies = self.latencies or [0.0]
+        return {
+            "bytes": self.bytes,
+            "chunks": self.chunks,
+            "retries": self.retries,
+            "duration": self.duration,
+            "throughput": self.bytes / self.duration if self.duration else 0.0,
+            "latency_avg_ms": sum(latencies) / len(latencies) * 1e3,
+            "latency_max_ms": max(latencies) * 1e3,
+        }
+
+    def summary(self) -> str:
+        """Returns the statistics as a single line."""
+        stats = self.to_dict()
+        return f"Page writes: {self.bytes} bytes in {self.chunks} chunk(s) in " \
+            f"{self.duration:.3f} s ({stats['throughput']:.0f} B/s), {self.retries} retry(s), " \
+            f"chunk latency {stats['latency_avg_ms']:.1f} ms avg / " \
+            f"{stats['latency_max_ms']:.1f} ms max."
+
+
+def write_chunk(eeprom_file, content: bytes | bytearray | memoryview, offset: int,
+                start: int, end: int) -> int:
+    """Writes the chunk from start to end of the EEPROM device from the content which starts at
+    offset. A transient error is retried with backoff from the last confirmed byte. Returns the
+    number of retries."""
+    position = start
+    retries = 0
+    while position < end:
+        try:
+            eeprom_file.seek(position)
+            written = eeprom_file.write(content[position - offset:end - offset])
+            if not written:
+                raise OSError(errno.EIO, "No bytes written")
+            position += written
+        except OSError as err:
+            if err.errno not in TRANSIENT_ERRNOS or retries == WRITE_RETRIES:
+                raise OSError(err.errno, f"{err.strerror} at offset {position} after " \
+                              f"{retries} retry(s)", err.filename) from err
+            time.sleep(min(WRITE_BACKOFF * 2 ** retries, WRITE_BACKOFF_MAX))
+            retries += 1
+    return retries
+
+
+def write_pages(eeprom_file, content: bytes | bytearray | memoryview, offset: int,
+                ranges: list[tuple[int, int]], yml_parser: YmlParser) -> WriteStats:
+    """Writes the ranges of the EEPROM device, given as device offsets, from the content which
+    starts at offset. Every page is written by its own write and the write cycle is waited
+    after it. The device must be opened unbuffered, so every write reaches the driver.
+    """
+    page_size = get_page_size(yml_parser)
+    write_cycle = get_write_cycle(yml_parser)
+    stats = WriteStats()
+    start = time.monotonic()
+    for range_start, range_end in ranges:
+        for chunk_start, chunk_end in get_page_chunks(range_start, range_end, page_size):
+            began = time.monotonic()
+            stats.retries += write_chunk(eeprom_file, content, offset, chunk_start, chunk_end)
+            if write_cycle:
+                time.sleep(write_cycle)
+            stats.latencies.append(time.monotonic() - began)
+            stats.chunks += 1
+            stats.bytes += chunk_end - chunk_start
+    stats.duration = time.monotonic() - start
+    return stats
+
+
+def get_dirty_ranges(current: bytes | memoryview, content: bytes | bytearray | memoryview,
+                     page_size: int) -> list[tuple[int, int]]:
+    """Compares the new content with the current content page by page and returns the
+    (start, end) ranges of all pages which differ. Adjacent pages are merged into one range.
+    Ranges are page-aligned at the start and end at the latest with the new content.
+    """
+    ranges: list[tuple[int, int]] = []
+    for start in range(0, len(content), page_size):
+        end = min(start + page_size, len(content))
+        if content[start:end] == current[start:end]:
+            continue
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def check_maximum_image_size(yml_parser: YmlParser, content: bytes | bytearray,
+                             offset: int = 0):
     """Checks if the image size would exceed the maximum allowed image size.
     This function can throw an SystemExit in case the image size is too big.
     """
@@ -48,6 +196,12 @@ def get_binary_path(args, eeprom_data: EepromData) -> Path:
     """Returns the path to a local binary file."""
     if "file" in args and args.file:
         return Path(args.file).resolve()
+    return OUTPUT_DIR / get_binary_name(args, eeprom_data)
+
+
+def get_binary_name(args, eeprom_data: EepromData) -> str:
+    """Returns the file name of a binary in the output directory, which is derived from the
+    product and its revisions."""
     if eeprom_data.som_type.is_phycore():
         # %s-%s.%s_%s%s_%d
         file_name_beginning = f"{args.som}"
@@ -66,55 +220,228 @@ def get_binary_path(args, eeprom_data: EepromData) -> Path:
     file_name = f"{file_name_beginning}-{args.kit}.{eeprom_data.bom_rev}_" \
         f"{eeprom_data.pcb_revision}{eeprom_data.pcb_sub_revision}_" \
         f"{eeprom_data.opttree_revision}"
-    return OUTPUT_DIR / file_name
+    return file_name
+
+
+def open_eeprom(yml_parser: YmlParser, mode: str, buffering: int = -1):
+    """Opens the EEPROM device of the config. If the emulator is enabled in the environment,
+    the device is emulated by a local file."""
+    if not os.environ.get(EMULATOR_ENV):
+        # pylint: disable=consider-using-with
+        return open(get_eeprom_bus(yml_parser), mode, buffering=buffering)
+    # pylint: disable=import-outside-toplevel
+    from .emulator import EmulatedEeprom, parse_emulator_settings
+    settings = parse_emulator_settings(os.environ[EMULATOR_ENV])
+    return EmulatedEeprom(settings, int(yml_parser['PHYTEC']['i2c_bus']),
+                          int(yml_parser['PHYTEC']['i2c_dev']), get_page_size(yml_parser))
 
 
 def eeprom_read(yml_parser: YmlParser, size: int, offset: int = 0) -> bytes:
     """Read the content from an I2C EEPROM device."""
-    eeprom_bus = get_eeprom_bus(yml_parser)
     try:
-        with open(eeprom_bus, 'rb') as eeprom_file:
+        with timing('eeprom_read') as phase, open_eeprom(yml_parser, 'rb') as eeprom_file:
             eeprom_file.seek(offset)
             eeprom_data = eeprom_file.read(size)
+            phase.add_bytes(len(eeprom_data))
     except OSError as err:
         sys.exit(str(err))
     return bytes(eeprom_data)
 
 
-def eeprom_write(yml_parser: YmlParser, content: bytes, offset: int = 0):
-    """Write a bytes object to an I2C EEPROM device."""
-    eeprom_bus = get_eeprom_bus(yml_parser)
+def eeprom_write(yml_parser: YmlParser, content: bytes | bytearray, offset: int = 0) -> WriteStats:
+    """Write a bytes object page by page to an I2C EEPROM device. Returns the statistics of the
+    page writes."""
     check_maximum_image_size(yml_parser, content, offset)
     try:
-        with open(eeprom_bus, 'wb') as eeprom_file:
-            eeprom_file.seek(offset)
-            eeprom_file.write(content)
-            eeprom_file.flush()
+        with timing('eeprom_write') as phase, \
+                open_eeprom(yml_parser, 'wb', buffering=0) as eeprom_file:
+            stats = write_pages(eeprom_file, content, offset,
+                                [(offset, offset + len(content))], yml_parser)
+            phase.add_bytes(stats.bytes)
+    except OSError as err:
+        sys.exit(str(err))
+    return stats
+
+
+def eeprom_write_diff(yml_parser: YmlParser, content: bytes | bytearray,
+                      current: bytes | memoryview) -> WriteStats:
+    """Write only the pages of an I2C EEPROM device which differ from the current content.
+    Returns the statistics of the page writes.
+    """
+    check_maximum_image_size(yml_parser, content)
+    ranges = get_dirty_ranges(current, content, get_page_size(yml_parser))
+    if not ranges:
+        return WriteStats()
+    try:
+        with timing('eeprom_write') as phase, \
+                open_eeprom(yml_parser, 'r+b', buffering=0) as eeprom_file:
+            stats = write_pages(eeprom_file, content, 0, ranges, yml_parser)
+            phase.add_bytes(stats.bytes)
     except OSError as err:
         sys.exit(str(err))
+    return stats
 
 
-def binary_read(binary_file: str, size: int, offset: int = 0) -> bytes:
-    """Read the content from a local binary file."""
+def is_container(path: str) -> bool:
+    """Returns whether a file is an image container."""
+    # pylint: disable=import-outside-toplevel
+    from .container import CONTAINER_MAGIC
     try:
-        with open(Path(binary_file).resolve(), 'rb') as eeprom_file:
+        with open(path, 'rb') as container_file:
+            return container_file.read(len(CONTAINER_MAGIC)) == CONTAINER_MAGIC
+    except OSError:
+        return False
+
+
+def split_container_path(binary_file: str | Path, create: bool = False) -> \
+        tuple[str, str] | None:
+    """Splits a FILE#KEY path of an image in a container into the container file and the key.
+    Only paths of existing containers are split, or of new containers if create is set. Returns
+    None for paths of plain binary files, which may contain a '#' as well."""
+    container, separator, key = str(binary_file).rpartition('#')
+    if not separator or os.path.exists(binary_file):
+        return None
+    if not create and not is_container(container):
+        return None
+    return container, key
+
+
+def binary_read(binary_file: str, size: int, offset: int = 0) -> bytes | memoryview:
+    """Read the content from a local binary file. Images in a container are returned as slice
+    of the mapped container without copying them."""
+    container_path = split_container_path(binary_file)
+    if container_path is not None:
+        # pylint: disable=import-outside-toplevel
+        from .container import read_container_image
+        with timing('binary_read') as phase:
+            try:
+                image = read_container_image(*container_path)
+            except OSError as err:
+                sys.exit(str(err))
+            image = image[offset:None if size < 0 else offset + size]
+            phase.add_bytes(len(image))
+        return image
+    try:
+        with timing('binary_read') as phase, \
+                open(Path(binary_file).resolve(), 'rb') as eeprom_file:
             eeprom_file.seek(offset)
             eeprom_data = eeprom_file.read(size)
+            phase.add_bytes(len(eeprom_data))
     except OSError as err:
         sys.exit(str(err))
     return bytes(eeprom_data)
 
 
-def binary_write(args, eeprom_fake_data: EepromData, content: bytes, offset: int = 0):
+def eeprom_read_image(yml_parser: YmlParser, max_image_size: int = -1) -> bytes:
+    """Reads the headers of the image from an EEPROM device first and afterwards only the data
+    payload of API v3 images, bounded by the maximum image size if it is given. Both reads use
+    the same unbuffered handle, so the device is opened once and never read ahead."""
+    header_size = EEPROM_V2_SIZE + EEPROM_V3_DATA_HEADER_SIZE
+    if max_image_size >= 0:
+        header_size = min(header_size, max_image_size)
+    try:
+        with timing('eeprom_read') as phase, \
+                open_eeprom(yml_parser, 'rb', buffering=0) as eeprom_file:
+            image = eeprom_file.read(header_size) or b""
+            size = get_image_size(image)
+            if max_image_size >= 0:
+                size = min(size, max_image_size)
+            if size > len(image):
+                eeprom_file.seek(len(image))
+                image += eeprom_file.read(size - len(image)) or b""
+            phase.add_bytes(len(image))
+    except OSError as err:
+        sys.exit(str(err))
+    return bytes(image)
+
+
+def read_image(args, yml_parser: YmlParser) -> memoryview:
+    """Reads the whole image from either a binary file with a single bulk read which is bounded
+    by the maximum image size or from an EEPROM device with a read of the headers and a read of
+    the data payload. The image is kept in the arguments, so all further decoding steps share
+    the same buffer.
+    """
+    max_image_size = get_maximum_image_size(yml_parser)
+    image = getattr(args, 'image', None)
+    if image is None:
+        if "file" in args and args.file:
+            image = memoryview(binary_read(args.file, max_image_size))
+        else:
+            image = memoryview(eeprom_read_image(yml_parser, max_image_size))
+        args.image = image
+    return image[:max_image_size]
+
+
+class ImageReader:
+    """Reads parts of the image from either a binary file or an EEPROM device and counts the
+    transferred bytes."""
+    def __init__(self, args, yml_parser: YmlParser):
+        self.file = args.file if "file" in args else ""
+        self.yml_parser = yml_parser
+        self.bytes = 0
+        self.transfers = 0
+
+    def read(self, size: int, offset: int = 0) -> bytes | memoryview:
+        """Reads size bytes at the offset of the image."""
+        if self.file:
+            data = binary_read(self.file, size, offset)
+        else:
+            data = eeprom_read(self.yml_parser, size, offset)
+        self.bytes += len(data)
+        self.transfers += 1
+        if len(data) < size:
+            raise AssertionError(f"Image ends at {offset + len(data)}, {offset + size} bytes "
+                                 "expected!")
+        return data
+
+    def summary(self, image_size: int) -> str:
+        """Returns how many bytes of the image were transferred."""
+        return f"Read {self.bytes} of {image_size} bytes in {self.transfers} transfer(s)."
+
+
+def read_raw_image(args, yml_parser: YmlParser) -> memoryview:
+    """Reads the image without product config. The size of the content is unknown, so the
+    headers are read first and the data payload of API v3 images is read afterwards. The image
+    is kept in the arguments like by read_image().
+    """
+    image = getattr(args, 'image', None)
+    if image is None:
+        if "file" in args and args.file:
+            image = memoryview(binary_read(args.file, -1))
+        else:
+            image = memoryview(eeprom_read_image(yml_parser))
+        args.image = image
+    return image[:get_image_size(image)]
+
+
+def binary_write(args, eeprom_fake_data: EepromData, content: bytes | bytearray,
+                 offset: int = 0):
     """Write a byte object to a local file on the file-system."""
     if not OUTPUT_DIR.exists():
         OUTPUT_DIR.mkdir()
     binary_file = get_binary_path(args, eeprom_fake_data)
     check_maximum_image_size(eeprom_fake_data.yml_parser, content, offset)
+    container_path = split_container_path(binary_file, getattr(args, 'container', False))
+    if container_path is not None:
+        if offset:
+            raise ValueError("Images in a container can not be written at an offset.")
+        # pylint: disable=import-outside-toplevel
+        from .container import append_images, get_image_keys
+        container, key = container_path
+        keys = [key or get_binary_name(args, eeprom_fake_data)] + \
+            get_image_keys(eeprom_fake_data)
+        try:
+            with timing('binary_write') as phase:
+                append_images(container, [(keys, content)])
+                phase.add_bytes(len(content))
+        except OSError as err:
+            sys.exit(str(err))
+        return
     try:
-        with open(binary_file, 'wb') as eeprom_file:
+        with timing('binary_write') as phase, open(binary_file, 'wb') as eeprom_file:
             eeprom_file.seek(offset)
             eeprom_file.write(content)
+            phase.add_bytes(len(content))
     except OSError as err:
         sys.exit(str(err))
 
@@ -134,26 +461,35 @@ def get_yml_parser(args) -> dict:
     """Open a YML configuration file at the config directory."""
     if not (args.som or args.ksx) and args.file:
         print("Neither -som nor -ksx are given. Trying to detect information automatically!")
-        image = binary_read(args.file, EEPROM_V2_SIZE)
-        try:
-            base_article = decode_base_name_from_raw(image)
-        except AssertionError:
-            image = binary_read(args.file, EEPROM_V2_SIZE + EEPROM_V3_DATA_HEADER_SIZE)
-            base_article = decode_base_name_from_raw(image)
+        # Keep the whole image to decode it later on without reading the file again.
+        args.image = memoryview(binary_read(args.file, -1))
+        base_article = decode_base_name_from_raw(args.image)
         print(f"Detected base article config: {base_article}.yml")
         args.som = base_article
 
-    yml_path = YML_DIR
-    if args.som and not args.ksx:
-        yml_file = YML_DIR / f"{args.som}.yml"
-    elif not args.som and args.ksx:
-        yml_file = YML_DIR / f"{args.ksx}.yml"
-    else:
-        yml_file = YML_DIR / f"{args.som}.yml"
+    if not args.som and args.ksx:
+        return load_yml_config(args.ksx)
+    return load_yml_config(args.som)
 
-    try:
-        with open(yml_file, encoding='UTF-8') as config_file:
-            return yaml.safe_load(config_file)
-    except OSError as err:
-        sys.exit(str(err))
-    raise SystemExit(f"Unable to open {yml_path}")
+
+def load_yml_config(product: str) -> YmlParser:
+    """Returns the YML configuration of a product from the compiled config cache. Every
+    configuration is shared by all calls within a process.
+    """
+    yml_parser = get_product_config(product)
+    if not yml_parser:
+        raise SystemExit(f"Unable to open {YML_DIR / f'{product}.yml'}")
+    return yml_parser
+
+
+def override_eeprom_bus(yml_parser: YmlParser, i2c_bus: int | None = None,
+                        i2c_dev: int | None = None) -> YmlParser:
+    """Returns a copy of the config with a different I2C bus and/or device address. The shared
+    config is not modified, so it can still be used for other EEPROM devices.
+    """
+    phytec = dict(yml_parser['PHYTEC'])
+    if i2c_bus is not None:
+        phytec['i2c_bus'] = i2c_bus  # type: ignore
+    if i2c_dev is not None:
+        phytec['i2c_dev'] = i2c_dev  # type: ignore
+    return {**yml_parser, 'PHYTEC': phytec}
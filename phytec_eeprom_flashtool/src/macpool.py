@@ -0,0 +1,108 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Module to allocate consecutive MAC addresses from a range stored in a local pool file.
+
+The pool file is a small JSON object with the first and last MAC of the range and the number of
+addresses handed out so far. Every allocation holds an exclusive lock on the file, so several
+stations sharing the same pool never get the same addresses. Allocated addresses are never
+handed out again, even if writing them to a board fails afterwards.
+"""
+import json
+from pathlib import Path
+from typing import IO
+
+from .statefile import locked_file
+from .blocks import normalize_mac
+
+# Bit of the first byte which marks multicast addresses
+MAC_MULTICAST_BIT = 1 << 40
+
+
+def mac_to_int(mac: str) -> int:
+    """Converts a MAC address into an integer."""
+    return int(normalize_mac(mac).replace(':', ''), 16)
+
+
+def int_to_mac(value: int) -> str:
+    """Converts an integer into a MAC address in XX:XX:XX:XX:XX:XX format."""
+    return value.to_bytes(6, 'big').hex(':')
+
+
+def read_pool(pool_file: IO[str]) -> dict:
+    """Reads the range and the number of allocated addresses of a locked pool file."""
+    pool_file.seek(0)
+    try:
+        pool = json.load(pool_file)
+        pool = {'first': mac_to_int(pool['first']), 'last': mac_to_int(pool['last']),
+                'allocated': int(pool['allocated'])}
+    except (ValueError, KeyError, TypeError) as err:
+        raise ValueError(f"MAC pool {pool_file.name} is corrupt: {err}") from err
+    if not 0 <= pool['allocated'] <= pool['last'] + 1 - pool['first']:
+        raise ValueError(f"MAC pool {pool_file.name} is corrupt: allocated is out of range")
+    return pool
+
+
+def write_pool(pool_file: IO[str], pool: dict):
+    """Replaces the content of a locked pool file."""
+    pool_file.seek(0)
+    pool_file.truncate()
+    json.dump({
+        'first': int_to_mac(pool['first']),
+        'last': int_to_mac(pool['last']),
+        'allocated': pool['allocated'],
+    }, pool_file)
+    pool_file.write('\n')
+
+
+def pool_status(pool: dict) -> dict:
+    """Returns the range, the next address and the number of remaining addresses of a pool."""
+    cursor = pool['first'] + pool['allocated']
+    return {
+        'first': int_to_mac(pool['first']),
+        'last': int_to_mac(pool['last']),
+        'next': int_to_mac(cursor) if cursor <= pool['last'] else None,
+        'allocated': pool['allocated'],
+        'remaining': pool['last'] + 1 - cursor,
+    }
+
+
+def create_mac_pool(pool_path: str | Path, first: str, last: str) -> dict:
+    """Creates a new pool file for the range from first to last including both. An existing
+    pool is never overwritten."""
+    pool = {'first': mac_to_int(first), 'last': mac_to_int(last), 'allocated': 0}
+    if pool['first'] > pool['last']:
+        raise ValueError("The first MAC of the pool must not be greater than the last one.")
+    # The range must not reach into the next first byte, which would be a multicast one
+    if (pool['first'] | pool['last']) & MAC_MULTICAST_BIT or \
+            pool['first'] >> 41 != pool['last'] >> 41:
+        raise ValueError("The MAC pool must not contain multicast addresses.")
+    with locked_file(pool_path, create=True) as pool_file:
+        if pool_file.read():
+            raise ValueError(f"MAC pool {pool_path} already exists.")
+        write_pool(pool_file, pool)
+    return pool_status(pool)
+
+
+def get_mac_pool_status(pool_path: str | Path) -> dict:
+    """Returns the range, the next address and the number of remaining addresses of a pool file."""
+    with locked_file(pool_path) as pool_file:
+        return pool_status(read_pool(pool_file))
+
+
+def allocate_macs(pool_path: str | Path, count: int) -> list[str]:
+    """Hands out count consecutive MAC addresses of a pool file and advances its cursor. The
+    file is locked only once, so callers allocate the addresses of many boards at once."""
+    if count < 1:
+        raise ValueError("At least one MAC address must be allocated.")
+    with locked_file(pool_path) as pool_file:
+        pool = read_pool(pool_file)
+        first = pool['first'] + pool['allocated']
+        remaining = pool['last'] + 1 - first
+        if count > remaining:
+            raise ValueError(f"MAC pool {pool_path} has only {remaining} address(es) left, " \
+                             f"{count} requested.")
+        pool['allocated'] += count
+        write_pool(pool_file, pool)
+    return [int_to_mac(value) for value in range(first, first + count)]
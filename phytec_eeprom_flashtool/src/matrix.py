@@ -0,0 +1,185 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Module to create the images of many kit option combinations of a product at once.
+
+The combinations are enumerated from the option value maps of the product config and can be
+narrowed down with a kit pattern. Images are encoded in a process pool and written in the
+order of the enumeration to a directory or streamed into a tar or zip archive.
+"""
+import argparse
+import itertools
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, Iterator
+
+from .io import OUTPUT_DIR
+from .io import get_binary_name
+from .io import check_maximum_image_size
+from .encoding import YmlParser
+from .encoding import get_eeprom_data
+from .encoding import eeprom_data_to_image
+
+# Combinations sent to a worker process at once
+CHUNK_SIZE = 64
+# Seconds between two progress reports
+PROGRESS_INTERVAL = 1.0
+
+# Config and arguments of a worker process, set up once by init_worker()
+WORKER: dict = {}
+
+
+def parse_kit_pattern(pattern: str, option_count: int) -> list[str]:
+    """Splits a kit pattern into one token per option. A token is a single option value, '?'
+    for any value or a set of values in brackets, e.g. '[124]'. A single '*' stands for any
+    value of all remaining options. Dashes are ignored."""
+    tokens = []
+    rest = pattern.replace('-', '')
+    while rest:
+        if rest[0] == '[':
+            end = rest.find(']')
+            if end < 2:
+                raise ValueError(f"Invalid value set in kit pattern '{pattern}'")
+            tokens.append(rest[:end + 1])
+            rest = rest[end + 1:]
+        else:
+            tokens.append(rest[0])
+            rest = rest[1:]
+    if tokens.count('*') > 1:
+        raise ValueError(f"Kit pattern '{pattern}' contains more than one '*'")
+    if '*' in tokens:
+        index = tokens.index('*')
+        tokens[index:index + 1] = ['?'] * max(0, option_count - len(tokens) + 1)
+    if len(tokens) != option_count:
+        raise ValueError(f"Kit pattern '{pattern}' has {len(tokens)} options, the product has " \
+                         f"{option_count}")
+    return tokens
+
+
+def get_option_choices(yml_parser: YmlParser, pattern: str) -> list[list[str]]:
+    """Returns the values of every kit option which match the kit pattern in config order."""
+    options = [yml_parser['Kit'][index] for index in sorted(yml_parser['Kit'])]
+    choices = []
+    for option, token in zip(options, parse_kit_pattern(pattern, len(options))):
+        values = [str(value) for value in yml_parser.get(option) or {}]
+        if token != '?':
+            allowed = token.strip('[]')
+            values = [value for value in values if value in allowed]
+        if not values:
+            raise ValueError(f"Kit pattern '{pattern}' matches no value of option '{option}'")
+        choices.append(values)
+    return choices
+
+
+def iter_kits(yml_parser: YmlParser, choices: list[list[str]]) -> Iterator[str]:
+    """Yields all kit option strings of the combinations in a deterministic order. The
+    extended options are separated by a dash like on the product label."""
+    extended = int(yml_parser['PHYTEC'].get('extended_options', 0))
+    for combination in itertools.product(*choices):
+        kit = "".join(combination)
+        yield f"{kit[:-extended]}-{kit[-extended:]}" if extended else kit
+
+
+def init_worker(yml_parser: YmlParser, args: argparse.Namespace):
+    """Keeps the config and the arguments of all images in the worker process."""
+    WORKER.update(yml_parser=yml_parser, args=args)
+
+
+def encode_kit(kit: str) -> tuple[str, bytes]:
+    """Encodes the image of a kit option string and returns its file name and content."""
+    args = argparse.Namespace(**{**vars(WORKER['args']), 'kit': kit, 'file': ""})
+    eeprom_data = get_eeprom_data(args, WORKER['yml_parser'])
+    image = eeprom_data_to_image(eeprom_data)
+    check_maximum_image_size(eeprom_data.yml_parser, image)
+    return get_binary_name(args, eeprom_data), bytes(image)
+
+
+@contextmanager
+def directory_writer(directory: Path) -> Iterator[Callable[[str, bytes], None]]:
+    """Writes every image into its own file of the directory."""
+    directory.mkdir(parents=True, exist_ok=True)
+
+    def write(name: str, content: bytes):
+        with open(directory / name, 'wb') as binary:
+            binary.write(content)
+
+    yield write
+
+
+@contextmanager
+def tar_writer(archive: str) -> Iterator[Callable[[str, bytes], None]]:
+    """Streams all images into a tar archive, compressed with gzip for .tar.gz and .tgz. The
+    archive is written to stdout for '-'."""
+    # Reproducible archives use the time of SOURCE_DATE_EPOCH
+    mtime = int(os.environ.get('SOURCE_DATE_EPOCH', time.time()))
+    if archive == '-':
+        tar = tarfile.open(fileobj=sys.stdout.buffer, mode='w|')
+    else:
+        tar = tarfile.open(archive, 'w|gz' if archive.endswith(('.gz', '.tgz')) else 'w|')
+    with tar:
+
+        def write(name: str, content: bytes):
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mtime = mtime
+            info.mode = 0o644
+            tar.addfile(info, fileobj=BytesIO(content))
+
+        yield write
+
+
+@contextmanager
+def zip_writer(archive: str) -> Iterator[Callable[[str, bytes], None]]:
+    """Writes all images into a deflate compressed zip archive."""
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+
+        def write(name: str, content: bytes):
+            zip_file.writestr(name, content)
+
+        yield write
+
+
+def open_matrix_output(args):
+    """Returns the writer of the output selected by -output or -archive."""
+    if not args.archive:
+        return directory_writer(Path(args.output) if args.output else OUTPUT_DIR)
+    if args.archive.endswith('.zip'):
+        return zip_writer(args.archive)
+    if args.archive == '-' or args.archive.endswith(('.tar', '.tar.gz', '.tgz')):
+        return tar_writer(args.archive)
+    raise ValueError("The archive must be a .tar, .tar.gz, .tgz or .zip file or - for stdout.")
+
+
+def create_matrix(args, yml_parser: YmlParser) -> int:
+    """Creates the images of all kit option combinations which match the kit pattern and returns
+    their number. Progress is reported to stderr."""
+    choices = get_option_choices(yml_parser, args.kit)
+    total = 1
+    for values in choices:
+        total *= len(values)
+    if total > args.limit:
+        sys.exit(f"{total} combinations exceed the limit of {args.limit}. Narrow them down " \
+                 "with -kit or raise -limit.")
+    image_args = argparse.Namespace(som=args.som, ksx=args.ksx, id=args.id, pcb=args.pcb,
+                                    bom=args.bom)
+    start = time.monotonic()
+    reported = start
+    with open_matrix_output(args) as write, \
+            ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker,
+                                initargs=(yml_parser, image_args)) as executor:
+        images = executor.map(encode_kit, iter_kits(yml_parser, choices), chunksize=CHUNK_SIZE)
+        for done, (name, content) in enumerate(images, start=1):
+            write(name, content)
+            if time.monotonic() - reported >= PROGRESS_INTERVAL:
+                reported = time.monotonic()
+                print(f"{done}/{total} images", file=sys.stderr, flush=True)
+    print(f"Created {total} images in {time.monotonic() - start:.1f} s", file=sys.stderr)
+    return total
@@ -0,0 +1,122 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Module to run EEPROM operations on several I2C devices in parallel."""
+import copy
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import StringIO, TextIOBase
+from typing import Callable, Iterable, Iterator, NamedTuple, TypeVar
+
+from .common import DEFAULT_JOBS
+from .io import get_eeprom_lock
+from .io import override_eeprom_bus
+from .encoding import YmlParser
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+class EepromTarget(NamedTuple):
+    """I2C bus and optional device address of an EEPROM device."""
+    i2c_bus: int
+    i2c_dev: int | None = None
+
+    def __str__(self):
+        if self.i2c_dev is None:
+            return f"i2c-{self.i2c_bus}"
+        return f"i2c-{self.i2c_bus}:0x{self.i2c_dev:02x}"
+
+
+def parse_target(target: str) -> EepromTarget:
+    """Converts a BUS[:DEV] string into an EEPROM target. The device address defaults to the
+    address of the product config and hexadecimal values need the 0x prefix.
+    """
+    i2c_bus, _, i2c_dev = target.partition(':')
+    try:
+        return EepromTarget(int(i2c_bus, 0), int(i2c_dev, 0) if i2c_dev else None)
+    except ValueError as err:
+        raise ValueError(f"Invalid EEPROM target '{target}'. Use BUS[:DEV] format.") from err
+
+
+class ThreadOutput(TextIOBase):
+    """Output stream which collects everything printed by a worker thread in a separate buffer.
+    Output of all other threads is passed through to the original stream.
+    """
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+        self.local = threading.local()
+
+    def capture(self) -> StringIO:
+        """Starts collecting the output of the calling thread."""
+        self.local.buffer = StringIO()
+        return self.local.buffer
+
+    def write(self, text: str) -> int:  # type: ignore[override]
+        buffer = getattr(self.local, 'buffer', None)
+        return (buffer if buffer is not None else self.stream).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def imap_ordered(executor: ThreadPoolExecutor, func: Callable[[T], R], items: Iterable[T],
+                 window: int) -> Iterator[Future]:
+    """Submits items to the executor while keeping at most window items in flight and yields
+    the futures in input order. Items are consumed lazily, so long inputs can be streamed.
+    """
+    pending: list[Future] = []
+    for item in items:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= window:
+            yield pending.pop(0)
+    yield from pending
+
+
+def run_on_targets(args, yml_parser: YmlParser, targets: list[EepromTarget],
+                   operation: Callable, jobs: int = DEFAULT_JOBS) -> tuple[list[dict], float]:
+    """Runs a command operation on several EEPROM devices at once. Each operation gets its own
+    copy of the arguments and a config pointing to its target. Returns one result record per
+    target in the order of the targets and the total wall-clock time in seconds.
+    """
+    # Reuse the output of a server which already collects the output of each thread
+    output = sys.stdout if isinstance(sys.stdout, ThreadOutput) else ThreadOutput(sys.stdout)
+
+    def run(target: EepromTarget) -> dict:
+        buffer = output.capture()
+        target_yml_parser = override_eeprom_bus(yml_parser, target.i2c_bus, target.i2c_dev)
+        result: dict = {"target": str(target)}
+        start = time.monotonic()
+        try:
+            with get_eeprom_lock(target_yml_parser):
+                operation(copy.copy(args), target_yml_parser)
+            result["status"] = "ok"
+        except (SystemExit, ValueError, AssertionError, KeyError, OSError) as err:
+            result.update(status="error", error=str(err))
+        result["duration"] = time.monotonic() - start
+        result["output"] = buffer.getvalue()
+        return result
+
+    start = time.monotonic()
+    original_stdout, sys.stdout = sys.stdout, output
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(targets)))) as executor:
+            results = list(executor.map(run, targets))
+    finally:
+        sys.stdout = original_stdout
+    return results, time.monotonic() - start
+
+
+def print_target_results(results: list[dict], duration: float):
+    """Prints the output and result of each target followed by the total wall-clock time."""
+    for result in results:
+        header = f"{result['target']} ({result['status']}, {result['duration']:.3f} s)"
+        print(f"{header}\n{'=' * len(header)}\n{result['output']}")
+        if result['status'] != 'ok':
+            print(f"Error: {result['error']}\n")
+    failed = sum(1 for result in results if result['status'] != 'ok')
+    print(f"Processed {len(results)} target(s) in {duration:.3f} s, {failed} failed.")
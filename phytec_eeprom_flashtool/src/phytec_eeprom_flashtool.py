@@ -14,26 +14,47 @@
 """
 
 import argparse
+import sys
+import time
 
 from . import __version__
 from .io import get_product_name
 from .io import get_yml_parser
+from .io import get_eeprom_lock
 from .io import eeprom_write
+from .io import eeprom_write_diff
 from .io import eeprom_read
-from .io import binary_write
 from .io import binary_read
+from .io import get_page_size
+from .io import binary_write
+from .io import read_image
+from .io import read_raw_image
+from .io import RAW_YML_PARSER
+from .io import ImageReader
 from .encoding import YmlParser
 from .encoding import EepromData
-from .encoding import EEPROM_V2_SIZE
-from .encoding import EEPROM_V3_DATA_HEADER_SIZE
 from .encoding import get_eeprom_data
 from .encoding import eeprom_data_to_struct
-from .encoding import eeprom_data_to_blocks
+from .encoding import eeprom_data_to_image
 from .encoding import struct_to_eeprom_data
-from .encoding import blocks_to_eeprom_data
+from .encoding import image_to_eeprom_data
+from .encoding import verify_image
 from .encoding import print_eeprom_data
-from .blocks import add_mac_block, EepromDataMACBlock
-from .blocks import add_key_value_block, EepromDataKeyValueBlock
+from .encoding import decode_base_name_from_raw
+from .encoding import EEPROM_V2_SIZE
+from .encoding import EEPROM_V3_DATA_HEADER_SIZE
+from .blocks import add_mac_block
+from .blocks import add_key_value_block
+from .blocks import edit_blocks
+from .blocks import find_chained_mac_block
+from .blocks import find_chained_key_value_block
+from .common import DEFAULT_JOBS
+from .timings import enable_timings
+from .timings import get_timings
+
+# Modules which are only required by some commands are imported on first use to keep the
+# startup time of the tool short.
+# pylint: disable=import-outside-toplevel
 
 def write_clearance() -> bool:
     """Notifies the user about potential risks and asks for the write clearance."""
@@ -47,68 +68,102 @@ can lead to boot failure or misbehaving hardware.""")
     return False
 
 
-def read_content(args, eeprom_data: EepromData, eeprom_size: int, offset: int = 0):
-    """Helper to read either from a binary file or an EEPROM chip."""
+def flash_eeprom_content(args, yml_parser: YmlParser, eeprom_struct: bytes | bytearray):
+    """Helper to write an image to an EEPROM chip. With -diff only the pages which differ
+    from the current content are written."""
+    if "diff" in args and args.diff:
+        stats = eeprom_write_diff(yml_parser, eeprom_struct, read_image(args, yml_parser))
+        print(f"Wrote {stats.bytes} of {len(eeprom_struct)} bytes in {stats.chunks} page(s) of " \
+              f"{get_page_size(yml_parser)} bytes.")
+    else:
+        stats = eeprom_write(yml_parser, eeprom_struct)
+    if stats.chunks:
+        print(stats.summary())
+
+
+def verify_content(args, yml_parser: YmlParser, eeprom_struct: bytes | bytearray):
+    """Helper to read back the written image from either a binary file or an EEPROM chip with a
+    single bulk read and verify it. The result is printed as JSON record."""
+    import json
     if "file" in args and args.file:
-        return binary_read(args.file, eeprom_size, offset)
-    return eeprom_read(eeprom_data.yml_parser, eeprom_size, offset)
+        readback = binary_read(args.file, len(eeprom_struct))
+    else:
+        readback = eeprom_read(yml_parser, len(eeprom_struct))
+    result = verify_image(eeprom_struct, readback, yml_parser)
+    print(json.dumps(result))
+    if result['verify'] != 'pass':
+        sys.exit(f"Verification failed: {result['error']}")
 
 
-def write_content(args, eeprom_data: EepromData, eeprom_struct: bytes) -> bool:
+def write_content(args, eeprom_data: EepromData, eeprom_struct: bytes | bytearray) -> bool:
     """Helper to write either to a binary file or an EEPROM chip."""
     if "file" in args and args.file:
         binary_write(args, eeprom_data, eeprom_struct)
     else:
         flash_eeprom = True if "always_write" in args and args.always_write else write_clearance()
         if flash_eeprom:
-            eeprom_write(eeprom_data.yml_parser, eeprom_struct)
+            flash_eeprom_content(args, eeprom_data.yml_parser, eeprom_struct)
             print('EEPROM flash successful!')
         else:
             print("Skipped flashing EEPROM!")
             return False
+    if "verify" in args and args.verify:
+        verify_content(args, eeprom_data.yml_parser, eeprom_struct)
     return True
 
 
 def read_eeprom_data(args, yml_parser: YmlParser, error: str) -> EepromData:
     """Helper to read either from a binary file or EEPROM chip and convert it into the eeprom
        data format."""
+    if "raw" in args and args.raw:
+        eeprom_data = image_to_eeprom_data(read_raw_image(args, yml_parser), None)
+        if not eeprom_data.is_v3():
+            raise ValueError(error)
+        return eeprom_data
     eeprom_data = get_eeprom_data(args, yml_parser)
     if not eeprom_data.is_v3():
         raise ValueError(error)
-    eeprom_size = EEPROM_V2_SIZE + EEPROM_V3_DATA_HEADER_SIZE
-    eeprom_struct = read_content(args, eeprom_data, eeprom_size)
-    eeprom_data = struct_to_eeprom_data(eeprom_struct, yml_parser)
-    if eeprom_data.is_v3():
-        eeprom_blocks = read_content(args, eeprom_data, eeprom_data.v3_payload_length, eeprom_size)
-        eeprom_data = blocks_to_eeprom_data(eeprom_data, eeprom_blocks)
-    return eeprom_data
+    return image_to_eeprom_data(read_image(args, yml_parser), yml_parser)
+
+
+def read_chained_block(args, yml_parser: YmlParser, error: str, find):
+    """Helper to read a single block without reading the whole image. Only the headers are read
+    and the block chain is followed to the block which is passed to find. The number of
+    transferred bytes is printed."""
+    reader = ImageReader(args, yml_parser)
+    header = reader.read(EEPROM_V2_SIZE)
+    if header[0] == 3:
+        header = bytes(header) + bytes(reader.read(EEPROM_V3_DATA_HEADER_SIZE, EEPROM_V2_SIZE))
+    raw = "raw" in args and args.raw
+    eeprom_data = struct_to_eeprom_data(header, None if raw else yml_parser)
+    if not eeprom_data.is_v3():
+        raise ValueError(error)
+    payload_start = EEPROM_V2_SIZE + EEPROM_V3_DATA_HEADER_SIZE
+    block = find(lambda size, offset: reader.read(size, payload_start + offset),
+                 eeprom_data.v3_payload_length, eeprom_data.v3_block_count)
+    print(reader.summary(payload_start + eeprom_data.v3_payload_length))
+    return block
 
 
 def write_eeprom_data(args, eeprom_data: EepromData):
     """Helper to convert eeprom data into a struct with all blocks attached and writes to either
        a binary file or the EEPROM chip."""
-    eeprom_struct = eeprom_data_to_struct(eeprom_data)
-    if eeprom_data.is_v3():
-        eeprom_struct += eeprom_data_to_blocks(eeprom_data)
+    eeprom_struct = eeprom_data_to_image(eeprom_data)
     if write_content(args, eeprom_data, eeprom_struct):
         print_eeprom_data(eeprom_data)
 
 
 def read_som_config(args, yml_parser: YmlParser):
-    """Reads from either a binary or an EEPROM device and prints the content."""
-    eeprom_data = get_eeprom_data(args, yml_parser)
-    eeprom_size = EEPROM_V2_SIZE + (EEPROM_V3_DATA_HEADER_SIZE if eeprom_data.is_v3() else 0)
-    if "file" in args and args.file:
-        eeprom_struct = binary_read(args.file, eeprom_size)
+    """Reads from either a binary or an EEPROM device and prints the content. With -raw the
+    image is decoded without product config and -names looks up the kit option names in the
+    compiled config cache."""
+    if args.raw:
+        from .config import get_product_config
+        image = read_raw_image(args, yml_parser)
+        names = get_product_config(decode_base_name_from_raw(image)) if args.names else None
+        eeprom_data = image_to_eeprom_data(image, names)
     else:
-        eeprom_struct = eeprom_read(yml_parser, eeprom_size)
-    eeprom_data = struct_to_eeprom_data(eeprom_struct, yml_parser)
-    if eeprom_data.is_v3():
-        if "file" in args and args.file:
-            eeprom_blocks = binary_read(args.file, eeprom_data.v3_payload_length, eeprom_size)
-        else:
-            eeprom_blocks = eeprom_read(yml_parser, eeprom_data.v3_payload_length, eeprom_size)
-        eeprom_data = blocks_to_eeprom_data(eeprom_data, eeprom_blocks)
+        eeprom_data = image_to_eeprom_data(read_image(args, yml_parser), yml_parser)
     print_eeprom_data(eeprom_data)
     return eeprom_data
 
@@ -116,12 +171,14 @@ def read_som_config(args, yml_parser: YmlParser):
 def write_som_config(args, yml_parser: YmlParser):
     """Writes the EEPROM data into an EEPROM device."""
     eeprom_data = get_eeprom_data(args, yml_parser)
-    eeprom_struct = eeprom_data_to_struct(eeprom_data)
+    eeprom_struct = eeprom_data_to_image(eeprom_data)
     flash_eeprom = True if "always_write" in args and args.always_write else write_clearance()
     if flash_eeprom:
-        eeprom_write(eeprom_data.yml_parser, eeprom_struct)
+        flash_eeprom_content(args, eeprom_data.yml_parser, eeprom_struct)
         print_eeprom_data(eeprom_data)
         print('EEPROM flash successful!')
+        if args.verify:
+            verify_content(args, eeprom_data.yml_parser, eeprom_struct)
     else:
         print_eeprom_data(eeprom_data)
         print("Skipped flashing EEPROM!")
@@ -131,7 +188,7 @@ def write_som_config(args, yml_parser: YmlParser):
 def create_binary(args, yml_parser: YmlParser):
     """Creates a binary on a local file-system."""
     eeprom_data = get_eeprom_data(args, yml_parser)
-    eeprom_struct = eeprom_data_to_struct(eeprom_data)
+    eeprom_struct = eeprom_data_to_image(eeprom_data)
     binary_write(args, eeprom_data, eeprom_struct)
     print_eeprom_data(eeprom_data)
     return eeprom_data
@@ -157,12 +214,16 @@ def write_mac_block(args, yml_parser: YmlParser):
 
 def read_mac_block(args, yml_parser: YmlParser):
     """Prints a MAC block for a given Ethernet interface number."""
-    eeprom_data = read_eeprom_data(args, yml_parser, "MAC blocks are only supported with API v3")
-    for block in [elm for elm in eeprom_data.blocks if isinstance(elm, EepromDataMACBlock)]:
-        if block.interface == args.interface:
-            print(block)
-            return
-    raise ValueError(f"No MAC found for Ethernet interface {args.interface}")
+    error = "MAC blocks are only supported with API v3"
+    if args.targeted:
+        block = read_chained_block(args, yml_parser, error,
+                                   lambda read, length, count:
+                                   find_chained_mac_block(read, length, count, args.interface))
+    else:
+        block = read_eeprom_data(args, yml_parser, error).get_mac_block(args.interface)
+    if block is None:
+        raise ValueError(f"No MAC found for Ethernet interface {args.interface}")
+    print(block)
 
 
 def write_serial_block(args, yml_parser: YmlParser):
@@ -178,13 +239,16 @@ def write_serial_block(args, yml_parser: YmlParser):
 
 def read_serial_block(args, yml_parser: YmlParser):
     """Print a serial block."""
-    eeprom_data = read_eeprom_data(args, yml_parser,
-                                   "Serial block are only supported with API v3")
-    for block in [elm for elm in eeprom_data.blocks if isinstance(elm, EepromDataKeyValueBlock)]:
-        if block.key == "serial":
-            print(block)
-            return
-    raise ValueError("No serial block found.")
+    error = "Serial block are only supported with API v3"
+    if args.targeted:
+        block = read_chained_block(args, yml_parser, error,
+                                   lambda read, length, count:
+                                   find_chained_key_value_block(read, length, count, "serial"))
+    else:
+        block = read_eeprom_data(args, yml_parser, error).get_key_value_block("serial")
+    if block is None:
+        raise ValueError("No serial block found.")
+    print(block)
 
 
 def write_key_value_block(args, yml_parser: YmlParser):
@@ -202,13 +266,170 @@ def read_key_value_block(args, yml_parser: YmlParser):
     """Prints a key-value block for a given key."""
     if args.key.lower() == "serial":
         raise ValueError("Please use --read-serial sub-command.")
+    error = "Key Value blocks are only supported with API v3"
+    if args.targeted:
+        block = read_chained_block(args, yml_parser, error,
+                                   lambda read, length, count:
+                                   find_chained_key_value_block(read, length, count, args.key))
+    else:
+        block = read_eeprom_data(args, yml_parser, error).get_key_value_block(args.key)
+    if block is None:
+        raise ValueError(f"No key found for {args.key}")
+    print(block)
+
+
+def edit_block_config(args, yml_parser: YmlParser):
+    """Applies all block additions, updates and removals to an existing binary file or EEPROM
+    device with a single read and a single write."""
+    for key, _ in args.key_values:
+        if key.lower() == "serial":
+            raise ValueError("Please use the -serial argument.")
+    key_values = args.key_values + ([("serial", args.serial)] if args.serial else [])
+    if not (args.macs or key_values or args.remove_macs or args.remove_keys):
+        raise ValueError("No block changes given.")
+    eeprom_data = read_eeprom_data(args, yml_parser, "Blocks are only supported with API v3")
+    edit_blocks(eeprom_data, args.macs, key_values, args.remove_macs, args.remove_keys)
+    write_eeprom_data(args, eeprom_data)
+    return eeprom_data
+
+
+def early_write_clearance(args) -> bool:
+    """Asks for the write clearance before anything is allocated for an EEPROM device, so a
+    refused write does not waste addresses or serials."""
+    if "file" in args and args.file or args.always_write:
+        return True
+    if not write_clearance():
+        print("Skipped flashing EEPROM!")
+        return False
+    args.always_write = True
+    return True
+
+
+def assign_mac_blocks(args, yml_parser: YmlParser):
+    """Allocates consecutive MAC addresses from a pool and adds them for consecutive Ethernet
+    interfaces to an existing binary file or an EEPROM device with a single write."""
+    from .macpool import allocate_macs
+    if args.count < 1:
+        raise ValueError("At least one MAC address must be assigned.")
+    interfaces = range(args.interface, args.interface + args.count)
+    if interfaces[0] < 0 or interfaces[-1] > 255:
+        raise ValueError("Ethernet interface numbers must be between 0 and 255.")
+    eeprom_data = read_eeprom_data(args, yml_parser, "MAC blocks are only supported with API v3")
+    for interface in interfaces:
+        if eeprom_data.get_mac_block(interface) is not None:
+            raise ValueError(f"Ethernet interface {interface} already has a MAC address.")
+    # Ask before allocating, as allocated addresses are never handed out again
+    if not early_write_clearance(args):
+        return None
+    edit_blocks(eeprom_data, zip(interfaces, allocate_macs(args.pool, args.count)))
+    write_eeprom_data(args, eeprom_data)
+    return eeprom_data
+
+
+def mac_pool_config(args, _yml_parser=None):
+    """Creates a MAC address pool or prints the state of an existing one as JSON record."""
+    import json
+    from .macpool import create_mac_pool, get_mac_pool_status
+    if args.init:
+        status = create_mac_pool(args.pool, *args.init)
+    else:
+        status = get_mac_pool_status(args.pool)
+    print(json.dumps(status))
+
+
+def assign_serial_block(args, yml_parser: YmlParser):
+    """Generates the next serial of a serial journal and adds it to an existing binary file or
+    an EEPROM device."""
+    from .serialpool import SerialReservation
     eeprom_data = read_eeprom_data(args, yml_parser,
-                                   "Key Value blocks are only supported with API v3")
-    for block in [elm for elm in eeprom_data.blocks if isinstance(elm, EepromDataKeyValueBlock)]:
-        if block.key == args.key:
-            print(block)
-            return
-    raise ValueError(f"No key found for {args.key}")
+                                   "Serial block are only supported with API v3")
+    if eeprom_data.get_key_value_block("serial") is not None:
+        raise ValueError("The EEPROM data already has a serial.")
+    if not early_write_clearance(args):
+        return None
+    with SerialReservation(args.pool, 1) as serials:
+        add_key_value_block(eeprom_data, "serial", serials.next_serial(eeprom_data))
+    write_eeprom_data(args, eeprom_data)
+    return eeprom_data
+
+
+def serial_pool_config(args, _yml_parser=None):
+    """Creates a serial journal, releases unused reservations or prints the state of the
+    journal as JSON record."""
+    import json
+    from .serialpool import create_serial_journal, get_serial_journal_status, recycle_serials
+    if args.init:
+        create_serial_journal(args.pool, args.init, args.start)
+    elif args.recycle:
+        released = recycle_serials(args.pool, None if args.recycle == 'all' else args.recycle)
+        print(f"Released {released} unused serial(s).")
+    print(json.dumps(get_serial_journal_status(args.pool)))
+
+
+def create_binary_matrix(args, yml_parser: YmlParser):
+    """Creates the binaries of all kit option combinations which match the kit pattern."""
+    from .matrix import create_matrix
+    create_matrix(args, yml_parser)
+
+
+def index_binaries(args, _yml_parser=None):
+    """Scans directory trees of binaries into an index and prints a summary as JSON record."""
+    import json
+    from .imageindex import update_index
+    print(json.dumps(update_index(args.index, args.directories, args.jobs)))
+
+
+def query_binaries(args, _yml_parser=None):
+    """Prints every indexed binary matching all conditions as JSON record."""
+    import json
+    from .imageindex import query_index
+    if args.serial is not None:
+        if args.key_value is not None:
+            raise ValueError("Set either -serial or -key-value, not both.")
+        args.key_value = ("serial", args.serial)
+    results = query_index(args.index, args.mac, args.key_value, args.product)
+    for result in results:
+        print(json.dumps(result))
+    if not results:
+        sys.exit("No indexed binary matches.")
+
+
+def list_container(args, _yml_parser=None):
+    """Prints the key, offset and size of every image in a container as JSON record."""
+    import json
+    from .container import open_container
+    try:
+        entries = list(open_container(args.container).entries())
+    except OSError as err:
+        sys.exit(str(err))
+    for key, offset, size in entries:
+        print(json.dumps({"key": key, "offset": offset, "size": size}))
+
+
+def batch_som_config(args, _yml_parser=None):
+    """Creates binaries or flashes EEPROM devices for every unit of a manifest file."""
+    from .batch import run_batch
+    if args.container and args.verify:
+        sys.exit("Images added to a container can not be verified.")
+    failed = run_batch(args, write_clearance)
+    if failed:
+        sys.exit(f"{failed} unit(s) failed!")
+
+
+def run_multi_target(args, yml_parser: YmlParser):
+    """Runs the selected command on all EEPROM devices passed with -bus in parallel."""
+    from .multi import run_on_targets, print_target_results
+    if "always_write" in args and not args.always_write:
+        if not write_clearance():
+            print("Skipped flashing EEPROM!")
+            return None
+        args.always_write = True
+    results, duration = run_on_targets(args, yml_parser, args.targets, args.func, args.jobs)
+    print_target_results(results, duration)
+    failed = sum(1 for result in results if result['status'] != 'ok')
+    if failed:
+        sys.exit(f"{failed} target(s) failed!")
+    return results
 
 
 def add_mandatory_arguments(parser):
@@ -228,7 +449,76 @@ def add_additional_arguments(parser):
 def add_file_argument(parser):
     """Adds the file argument to the parser."""
     parser.add_argument('-file', dest='file', nargs='?', default="", type=str,
-                        help='Binary file to be read')
+                        help='Binary file to be read or CONTAINER#KEY for an image in a ' \
+                        'container')
+    parser.add_argument('-container', dest='container', action='store_true',
+                        help='Write -file CONTAINER#KEY into a new container if CONTAINER ' \
+                        'does not exist yet')
+
+
+def parse_target(target: str):
+    """Converts a BUS[:DEV] string into an EEPROM target."""
+    from .multi import parse_target as parse_eeprom_target
+    return parse_eeprom_target(target)
+
+
+def add_targets_argument(parser):
+    """Adds the -bus and -jobs arguments to run a command on several EEPROM devices."""
+    parser.add_argument('-bus', dest='targets', action='append', type=parse_target,
+                        metavar='BUS[:DEV]', help='I2C bus and optional device address of an ' \
+                        'EEPROM device. Can be passed multiple times to access all devices in ' \
+                        'parallel.')
+    add_jobs_argument(parser)
+
+
+def parse_mac_assignment(assignment: str) -> tuple[int, str]:
+    """Converts an INTERFACE=MAC string into a tuple."""
+    interface, separator, mac = assignment.partition('=')
+    if not separator:
+        raise argparse.ArgumentTypeError(f"'{assignment}' is not in INTERFACE=MAC format.")
+    return int(interface), mac
+
+
+def parse_key_value_assignment(assignment: str) -> tuple[str, str]:
+    """Converts a KEY=VALUE string into a tuple."""
+    key, separator, value = assignment.partition('=')
+    if not separator:
+        raise argparse.ArgumentTypeError(f"'{assignment}' is not in KEY=VALUE format.")
+    return key, value
+
+
+def add_diff_argument(parser):
+    """Adds the -diff argument to only write the changed pages to EEPROM chips."""
+    parser.add_argument('-diff', dest='diff', action='store_true',
+                        help='Only write the pages of the EEPROM chip which differ from the ' \
+                        'current content.')
+
+
+def add_raw_argument(parser):
+    """Adds the -raw argument to decode images without product config."""
+    parser.add_argument('-raw', dest='raw', action='store_true',
+                        help='Decode the image without product config. Use -bus to select the ' \
+                        'EEPROM device.')
+
+
+def add_targeted_argument(parser):
+    """Adds the -targeted argument to only read the block headers and the requested block."""
+    parser.add_argument('-targeted', dest='targeted', action='store_true',
+                        help='Only read the block headers and the requested block instead of ' \
+                        'the whole image and print the number of transferred bytes.')
+
+
+def add_verify_argument(parser):
+    """Adds the -verify argument to read back and check the written image."""
+    parser.add_argument('-verify', dest='verify', action='store_true',
+                        help='Read back the written image and verify its content and all ' \
+                        'checksums.')
+
+
+def add_jobs_argument(parser):
+    """Adds the -jobs argument to set the number of parallel workers."""
+    parser.add_argument('-jobs', dest='jobs', type=int, default=DEFAULT_JOBS,
+                        help=f'Number of parallel workers (default: {DEFAULT_JOBS})')
 
 
 def add_always_write_argument(parser):
@@ -236,87 +526,363 @@ def add_always_write_argument(parser):
     parser.add_argument('-y', dest='always_write', action='store_true',
                         help='Do no ask before flashing a new image to the EEPROM chip.')
 
-def main(args): # pylint: disable=too-many-statements, too-many-locals
-    """ Set up parsing for commandline arguments. """
+def serve_som_config(args, _yml_parser=None):
+    """Runs commands received as JSON requests on a local Unix socket. Write commands never ask
+    for the write clearance."""
+    # Unix domain sockets are not available on all platforms
+    from .serve import run_server
+
+    parser = get_parser()
+
+    def handle(argv: list[str]):
+        command_args = parser.parse_args(argv)
+        if command_args.command == 'serve':
+            raise ValueError("Command 'serve' can not be requested.")
+        if "always_write" in command_args:
+            command_args.always_write = True
+        return run_command(parser, command_args)
+
+    run_server(args.socket, handle)
+
+
+def add_read_command(parser):
+    """Adds all arguments of the 'read' command."""
+    parser.set_defaults(func=read_som_config)
+    add_mandatory_arguments(parser)
+    add_targets_argument(parser)
+    add_file_argument(parser)
+    add_raw_argument(parser)
+    parser.add_argument('-names', dest='names', action='store_true',
+                        help='Look up the kit option names of a -raw image in the compiled ' \
+                        'config cache.')
+
+
+def add_write_command(parser):
+    """Adds all arguments of the 'write' command."""
+    parser.set_defaults(func=write_som_config)
+    add_mandatory_arguments(parser)
+    add_targets_argument(parser)
+    add_always_write_argument(parser)
+    add_diff_argument(parser)
+    add_verify_argument(parser)
+    add_additional_arguments(parser)
+
+
+def add_create_command(parser):
+    """Adds all arguments of the 'create' command."""
+    parser.set_defaults(func=create_binary)
+    add_mandatory_arguments(parser)
+    add_additional_arguments(parser)
+    add_file_argument(parser)
+
+
+def add_display_command(parser):
+    """Adds all arguments of the 'display' command."""
+    parser.set_defaults(func=display_som_config)
+    add_mandatory_arguments(parser)
+    add_additional_arguments(parser)
+
+
+def add_add_mac_command(parser):
+    """Adds all arguments of the 'add-mac' command."""
+    parser.set_defaults(func=write_mac_block)
+    parser.add_argument('interface', type=int, help='Number of the Ethernet interface')
+    parser.add_argument('mac', type=str, help='MAC address in XX:XX:XX:XX:XX:XX format')
+    add_mandatory_arguments(parser)
+    add_always_write_argument(parser)
+    add_diff_argument(parser)
+    add_verify_argument(parser)
+    add_file_argument(parser)
+
+
+def add_read_mac_command(parser):
+    """Adds all arguments of the 'read-mac' command."""
+    parser.set_defaults(func=read_mac_block)
+    parser.add_argument('interface', type=int, help='Number of the Ethernet interface')
+    add_mandatory_arguments(parser)
+    add_targets_argument(parser)
+    add_file_argument(parser)
+    add_raw_argument(parser)
+    add_targeted_argument(parser)
+
+
+def add_add_serial_command(parser):
+    """Adds all arguments of the 'add-serial' command."""
+    parser.set_defaults(func=write_serial_block)
+    parser.add_argument('serial', type=str)
+    add_mandatory_arguments(parser)
+    add_always_write_argument(parser)
+    add_diff_argument(parser)
+    add_verify_argument(parser)
+    add_file_argument(parser)
+
+
+def add_read_serial_command(parser):
+    """Adds all arguments of the 'read-serial' command."""
+    parser.set_defaults(func=read_serial_block)
+    add_mandatory_arguments(parser)
+    add_targets_argument(parser)
+    add_file_argument(parser)
+    add_raw_argument(parser)
+    add_targeted_argument(parser)
+
+
+def add_add_key_value_command(parser):
+    """Adds all arguments of the 'add-key-value' command."""
+    parser.set_defaults(func=write_key_value_block)
+    parser.add_argument('key', type=str, help='Name of the key')
+    parser.add_argument('value', type=str, help='Value to the key')
+    add_mandatory_arguments(parser)
+    add_targets_argument(parser)
+    add_always_write_argument(parser)
+    add_diff_argument(parser)
+    add_verify_argument(parser)
+    add_file_argument(parser)
+
+
+def add_read_key_value_command(parser):
+    """Adds all arguments of the 'read-key-value' command."""
+    parser.set_defaults(func=read_key_value_block)
+    parser.add_argument('key', type=str, help='Name of the key')
+    add_mandatory_arguments(parser)
+    add_targets_argument(parser)
+    add_file_argument(parser)
+    add_raw_argument(parser)
+    add_targeted_argument(parser)
+
+
+def add_edit_command(parser):
+    """Adds all arguments of the 'edit' command."""
+    parser.set_defaults(func=edit_block_config)
+    parser.add_argument('-mac', dest='macs', action='append', default=[],
+                        type=parse_mac_assignment, metavar='INTERFACE=MAC',
+                        help='Adds or replaces the MAC address of an Ethernet interface')
+    parser.add_argument('-serial', dest='serial', help='Adds or replaces the serial')
+    parser.add_argument('-key-value', dest='key_values', action='append', default=[],
+                        type=parse_key_value_assignment, metavar='KEY=VALUE',
+                        help='Adds or replaces a key-value pair')
+    parser.add_argument('-remove-mac', dest='remove_macs', action='append', default=[],
+                        type=int, metavar='INTERFACE',
+                        help='Removes the MAC address of an Ethernet interface')
+    parser.add_argument('-remove-key', dest='remove_keys', action='append', default=[],
+                        metavar='KEY', help='Removes a key-value pair or the serial')
+    add_mandatory_arguments(parser)
+    add_always_write_argument(parser)
+    add_diff_argument(parser)
+    add_verify_argument(parser)
+    add_file_argument(parser)
+
+
+def add_assign_macs_command(parser):
+    """Adds all arguments of the 'assign-macs' command."""
+    parser.set_defaults(func=assign_mac_blocks)
+    parser.add_argument('count', type=int, help='Number of MAC addresses to assign')
+    parser.add_argument('-pool', dest='pool', required=True, help='MAC address pool file')
+    parser.add_argument('-interface', dest='interface', type=int, default=0,
+                        help='Ethernet interface of the first MAC address (default: 0)')
+    add_mandatory_arguments(parser)
+    add_always_write_argument(parser)
+    add_diff_argument(parser)
+    add_verify_argument(parser)
+    add_file_argument(parser)
+
+
+def add_mac_pool_command(parser):
+    """Adds all arguments of the 'mac-pool' command."""
+    parser.set_defaults(func=mac_pool_config, config=False)
+    parser.add_argument('pool', type=str, help='MAC address pool file')
+    parser.add_argument('-init', dest='init', nargs=2, metavar=('FIRST', 'LAST'),
+                        help='Create a new pool with all MAC addresses from FIRST to LAST')
+
+
+def add_assign_serial_command(parser):
+    """Adds all arguments of the 'assign-serial' command."""
+    parser.set_defaults(func=assign_serial_block)
+    parser.add_argument('-pool', dest='pool', required=True, help='Serial journal file')
+    add_mandatory_arguments(parser)
+    add_always_write_argument(parser)
+    add_diff_argument(parser)
+    add_verify_argument(parser)
+    add_file_argument(parser)
+
+
+def add_serial_pool_command(parser):
+    """Adds all arguments of the 'serial-pool' command."""
+    parser.set_defaults(func=serial_pool_config, config=False)
+    parser.add_argument('pool', type=str, help='Serial journal file')
+    parser.add_argument('-init', dest='init', metavar='TEMPLATE', nargs='?',
+                        const='{base_name}-{counter:06d}',
+                        help='Create a new journal. The template can use the fields ' \
+                        '{base_name} and {counter} (default: {base_name}-{counter:06d})')
+    parser.add_argument('-start', dest='start', type=int, default=1,
+                        help='First counter of a new journal (default: 1)')
+    parser.add_argument('-recycle', dest='recycle', metavar='ID',
+                        help='Release the unused serials of the open reservation ID, or of ' \
+                        'all open reservations with "all" while no station is running')
+
+
+def add_create_matrix_command(parser):
+    """Adds all arguments of the 'create-matrix' command."""
+    parser.set_defaults(func=create_binary_matrix)
+    add_mandatory_arguments(parser)
+    add_additional_arguments(parser)
+    parser.set_defaults(kit='*')
+    parser.add_argument('-output', dest='output', help='Directory for all binaries (default: ' \
+                        'output)')
+    parser.add_argument('-archive', dest='archive', help='Stream all binaries into a .tar, ' \
+                        '.tar.gz, .tgz or .zip archive instead, or as tar to stdout for -')
+    parser.add_argument('-limit', dest='limit', type=int, default=10000,
+                        help='Maximum number of binaries (default: 10000)')
+    parser.add_argument('-jobs', dest='jobs', type=int, default=None,
+                        help='Number of worker processes (default: number of CPUs)')
+
+
+def add_index_command(parser):
+    """Adds all arguments of the 'index' command."""
+    parser.set_defaults(func=index_binaries, config=False)
+    parser.add_argument('index', type=str, help='SQLite index file')
+    parser.add_argument('directories', nargs='+', metavar='DIR',
+                        help='Directory tree with binaries')
+    parser.add_argument('-jobs', dest='jobs', type=int, default=None,
+                        help='Number of worker processes (default: number of CPUs)')
+
+
+def add_query_command(parser):
+    """Adds all arguments of the 'query' command."""
+    parser.set_defaults(func=query_binaries, config=False)
+    parser.add_argument('index', type=str, help='SQLite index file')
+    parser.add_argument('-mac', dest='mac', help='MAC address of any Ethernet interface')
+    parser.add_argument('-serial', dest='serial', help='Serial')
+    parser.add_argument('-key-value', dest='key_value', type=parse_key_value_assignment,
+                        metavar='KEY=VALUE', help='Key-value pair')
+    parser.add_argument('-product', dest='product', help='Product base name or full name')
+
+
+def add_container_command(parser):
+    """Adds all arguments of the 'container' command."""
+    parser.set_defaults(func=list_container, config=False)
+    parser.add_argument('container', type=str, help='Container file')
+
+
+def add_batch_command(parser):
+    """Adds all arguments of the 'batch' command."""
+    parser.set_defaults(func=batch_som_config, config=False)
+    parser.add_argument('manifest', type=str, help='Manifest file with one unit per row or - ' \
+        'for stdin')
+    parser.add_argument('-format', dest='format', choices=['csv', 'jsonl'],
+                        help='Manifest format. Derived from the file extension by default.')
+    parser.add_argument('-mac-pool', dest='mac_pool', help='MAC address pool file to allocate ' \
+                        'the MAC addresses of all units without a macs column from')
+    parser.add_argument('-macs-per-unit', dest='macs_per_unit', type=int, default=1,
+                        help='Number of MAC addresses allocated for every unit unless the ' \
+                        'mac_count column is set (default: 1)')
+    parser.add_argument('-serial-pool', dest='serial_pool', help='Serial journal to generate ' \
+                        'the serials of all units without a serial column from')
+    parser.add_argument('-serial-block', dest='serial_block', type=int, default=1000,
+                        help='Number of serials reserved from the journal at once ' \
+                        '(default: 1000)')
+    parser.add_argument('-container', dest='container', help='Container file to append the ' \
+                        'images of all units without a file or i2c_bus column to')
+    add_always_write_argument(parser)
+    add_jobs_argument(parser)
+    add_verify_argument(parser)
+
+
+def add_serve_command(parser):
+    """Adds all arguments of the 'serve' command."""
+    parser.set_defaults(func=serve_som_config, config=False)
+    parser.add_argument('socket', type=str, help='Path of the Unix socket')
+
+
+# All commands with their help text and the function adding their arguments
+COMMANDS = {
+    'read': ("Reads the product configuration from an EEPROM device and dumps it to the " \
+        "console.", add_read_command),
+    'write': ("Writes a product configuration to the EEPROM device.", add_write_command),
+    'create': ("Creates a binary file at the output directory which can then be written to " \
+        "the EEPROM device with dd or via JTAG.", add_create_command),
+    'display': ("Dumps the complete configuration on the console without communicating with " \
+        "a EEPROM device", add_display_command),
+    'add-mac': ("Adds a MAC address block to an existing EEPROM binary or updates the content " \
+        "of an EEPROM device.", add_add_mac_command),
+    'read-mac': ("Reads a MAC address block for an Ethernet interface from either an existing " \
+        "EEPROM binary or an EEPROM device.", add_read_mac_command),
+    'add-serial': ("Adds a serial block to an existing EEPROM binary or updates the content of " \
+        "an EEPROM device.", add_add_serial_command),
+    'read-serial': ("Reads a serial block from either an existing EEPROM binary or an EEPROM " \
+        "device.", add_read_serial_command),
+    'add-key-value': ("Adds a key-value block to an existing EEPROM binary or updates the " \
+        "content of an EEPROM device.", add_add_key_value_command),
+    'read-key-value': ("Reads a key-value block for a key from either an existing EEPROM " \
+        "binary or an EEPROM device.", add_read_key_value_command),
+    'edit': ("Adds, replaces and removes several blocks of an existing EEPROM binary or an " \
+        "EEPROM device with a single read and write.", add_edit_command),
+    'assign-macs': ("Assigns consecutive MAC addresses from a MAC address pool to an existing " \
+        "EEPROM binary or an EEPROM device.", add_assign_macs_command),
+    'mac-pool': ("Creates a MAC address pool or shows how many addresses are left.",
+        add_mac_pool_command),
+    'assign-serial': ("Adds the next serial of a serial journal to an existing EEPROM binary " \
+        "or an EEPROM device.", add_assign_serial_command),
+    'serial-pool': ("Creates a serial journal, shows its state or releases unused " \
+        "reservations.", add_serial_pool_command),
+    'create-matrix': ("Creates binaries for all kit option combinations of a product which " \
+        "match a kit pattern like 5432DE11I-?? or 5432[DE]*.", add_create_matrix_command),
+    'index': ("Decodes all binaries of directory trees into a SQLite index. Only new and " \
+        "changed binaries are decoded again.", add_index_command),
+    'query': ("Finds binaries in a SQLite index by MAC address, serial, key-value pair or " \
+        "product.", add_query_command),
+    'container': ("Lists the keys of all images in a container. Every read command accepts " \
+        "-file CONTAINER#KEY.", add_container_command),
+    'batch': ("Creates binaries or writes EEPROM devices for all units of a CSV or JSONL " \
+        "manifest in a single process.", add_batch_command),
+    'serve': ("Keeps the product configs loaded and runs commands received as JSON requests " \
+        "on a local Unix socket.", add_serve_command),
+}
+
+
+def get_parser(command: str | None = None) -> argparse.ArgumentParser:
+    """ Set up parsing for commandline arguments. If a known command is given, only the
+    subparser of this command is set up."""
     parser = argparse.ArgumentParser(description='PHYTEC SOM EEPROM configuration tool')
 
     subparsers = parser.add_subparsers(help="EEPROM operation commands", dest='command')
     parser.add_argument('-v', '--version', action='version', version=f"Version: {__version__}")
+    parser.add_argument('--timings', dest='timings', action='store_const', const='table',
+                        help='Print the duration, bytes and syscalls of every phase of the ' \
+                        'command as table to stderr.')
+    parser.add_argument('--timings-json', dest='timings', action='store_const', const='json',
+                        help='Print the same measurements as --timings as JSON record.')
+    parser.add_argument('--profile', metavar='FILE', help='Profile the command and write the ' \
+                        'statistics to a pstats file.')
     subparsers.required = True
 
-    parser_read = subparsers.add_parser('read', help="Reads the product configuration from an " \
-        "EEPROM device and dumps it to the console.")
-    parser_read.set_defaults(func=read_som_config)
-    add_mandatory_arguments(parser_read)
-    add_file_argument(parser_read)
-
-    parser_write = subparsers.add_parser('write', help="Writes a product configuration to the " \
-        "EEPROM device.")
-    parser_write.set_defaults(func=write_som_config)
-    add_mandatory_arguments(parser_write)
-    add_always_write_argument(parser_write)
-    add_additional_arguments(parser_write)
-
-    parser_create = subparsers.add_parser('create', help="Creates a binary file at the output " \
-        "directory which can then be written to the EEPROM device with dd or via JTAG.")
-    parser_create.set_defaults(func=create_binary)
-    add_mandatory_arguments(parser_create)
-    add_additional_arguments(parser_create)
-    add_file_argument(parser_create)
-
-    parser_display = subparsers.add_parser('display', help="Dumps the complete configuration on " \
-        "the console without communicating with a EEPROM device")
-    parser_display.set_defaults(func=display_som_config)
-    add_mandatory_arguments(parser_display)
-    add_additional_arguments(parser_display)
-
-    parser_add_mac = subparsers.add_parser('add-mac', help="Adds a MAC address block to an " \
-        "existing EEPROM binary or updates the content of an EEPROM device.")
-    parser_add_mac.set_defaults(func=write_mac_block)
-    parser_add_mac.add_argument('interface', type=int, help='Number of the Ethernet interface')
-    parser_add_mac.add_argument('mac', type=str, help='MAC address in XX:XX:XX:XX:XX:XX format')
-    add_mandatory_arguments(parser_add_mac)
-    add_always_write_argument(parser_add_mac)
-    add_file_argument(parser_add_mac)
-
-    parser_read_mac = subparsers.add_parser('read-mac', help="Reads a MAC address block for an " \
-        "Ethernet interface from either an existing EEPROM binary or an EEPROM device.")
-    parser_read_mac.set_defaults(func=read_mac_block)
-    parser_read_mac.add_argument('interface', type=int, help='Number of the Ethernet interface')
-    add_mandatory_arguments(parser_read_mac)
-    add_file_argument(parser_read_mac)
-
-    parser_add_serial = subparsers.add_parser('add-serial', help="Adds a serial block " \
-        "to an existing EEPROM binary or updates the content of an EEPROM device.")
-    parser_add_serial.set_defaults(func=write_serial_block)
-    parser_add_serial.add_argument('serial', type=str)
-    add_mandatory_arguments(parser_add_serial)
-    add_always_write_argument(parser_add_serial)
-    add_file_argument(parser_add_serial)
-
-    parser_read_serial = subparsers.add_parser('read-serial', help="Reads a serial " \
-        " block from either an existing EEPROM binary or an EEPROM device.")
-    parser_read_serial.set_defaults(func=read_serial_block)
-    add_mandatory_arguments(parser_read_serial)
-    add_file_argument(parser_read_serial)
-
-    parser_add_key_value = subparsers.add_parser('add-key-value', help="Adds a key-value block " \
-        "to an existing EEPROM binary or updates the content of an EEPROM device.")
-    parser_add_key_value.set_defaults(func=write_key_value_block)
-    parser_add_key_value.add_argument('key', type=str, help='Name of the key')
-    parser_add_key_value.add_argument('value', type=str, help='Value to the key')
-    add_mandatory_arguments(parser_add_key_value)
-    add_always_write_argument(parser_add_key_value)
-    add_file_argument(parser_add_key_value)
-
-    parser_read_key_value = subparsers.add_parser('read-key-value', help="Reads a key-value " \
-        " block for a key from either an existing EEPROM binary or an EEPROM device.")
-    parser_read_key_value.set_defaults(func=read_key_value_block)
-    parser_read_key_value.add_argument('key', type=str, help='Name of the key')
-    add_mandatory_arguments(parser_read_key_value)
-    add_file_argument(parser_read_key_value)
-
-    args = parser.parse_args(args)
+    for name, (help_text, add_command) in COMMANDS.items():
+        if command in COMMANDS and name != command:
+            continue
+        add_command(subparsers.add_parser(name, help=help_text))
+    return parser
+
+
+def run_raw_command(parser: argparse.ArgumentParser, args):
+    """Runs a read command without loading any product config."""
+    if args.som or args.ksx:
+        parser.error("Argument -raw can not be combined with -som or -ksx")
+    if args.targets:
+        if args.file:
+            parser.error("Argument -bus can not be combined with -file")
+        return run_multi_target(args, RAW_YML_PARSER)
+    if not args.file:
+        parser.error("Set -file or -bus with -raw.")
+    return args.func(args, RAW_YML_PARSER)
+
+
+def run_command(parser: argparse.ArgumentParser, args): # pylint: disable=too-many-branches
+    """Loads the product config and runs the command of the parsed arguments."""
+    # Commands which load the product configs on their own
+    if not getattr(args, 'config', True):
+        return args.func(args, None)
+    if getattr(args, 'raw', False):
+        return run_raw_command(parser, args)
 
     # try getting target information from the BSP
     result, product_name = get_product_name()
@@ -332,13 +898,15 @@ def main(args): # pylint: disable=too-many-statements, too-many-locals
     yml_parser = get_yml_parser(args)
     if hasattr(args, 'func'):
         # Set default values for all subparser without additional arguments.
-        if not args.func in (write_som_config, create_binary, display_som_config):
+        if not args.func in (write_som_config, create_binary, display_som_config,
+                             create_binary_matrix):
             args.kit = "none"
             args.pcb = "00"
             args.bom = "00"
             args.id = "SP000"
         # Check -kit, -pcb, and -bom are set.
-        if args.func in (write_som_config, create_binary, display_som_config):
+        if args.func in (write_som_config, create_binary, display_som_config,
+                         create_binary_matrix):
             arguments = [(args.kit, '-kit'), (args.pcb, '-pcb'), (args.bom, '-bom')]
             for (arg, arg_str) in arguments:
                 if arg is None:
@@ -347,5 +915,59 @@ def main(args): # pylint: disable=too-many-statements, too-many-locals
             if args.som.startswith('PFL-') and args.id is None:
                 parser.error("Argument -option-id is required for phyFLEX products")
 
-        return args.func(args, yml_parser)
+        if getattr(args, 'targets', None):
+            if "file" in args and args.file:
+                parser.error("Argument -bus can not be combined with -file")
+            return run_multi_target(args, yml_parser)
+        if "file" in args and args.file:
+            return args.func(args, yml_parser)
+        with get_eeprom_lock(yml_parser):
+            return args.func(args, yml_parser)
+    return None
+
+
+def print_timings(timings_format: str):
+    """Prints the measurements of all phases to stderr."""
+    timings = get_timings()
+    if timings is None:
+        return
+    if timings_format == 'json':
+        import json
+        print(json.dumps(timings.to_dict()), file=sys.stderr)
+    else:
+        print(timings.format_table(), file=sys.stderr)
+
+
+def get_command_name(args: list[str]) -> str | None:
+    """Returns the command of the commandline arguments, which is the first argument after
+    the global options, or None if there is none."""
+    arguments = iter(args)
+    for arg in arguments:
+        if arg == '--profile':
+            next(arguments, None)
+        elif not arg.startswith('-'):
+            return arg
     return None
+
+
+def main(args):
+    """Parses the commandline arguments and runs the command. Only the subparser of the
+    requested command is set up."""
+    start = time.monotonic()
+    parser = get_parser(get_command_name(args))
+    args = parser.parse_args(args)
+    if args.timings:
+        enable_timings(start).add('parse_args', time.monotonic() - start)
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        return run_command(parser, args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if args.timings:
+            print_timings(args.timings)
@@ -0,0 +1,277 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Module to generate serials from a template and a counter reserved in a local journal.
+
+The journal is an append-only file with one JSON record per line. The first record defines the
+serial template and the first counter. Stations reserve counters in blocks, so the journal is
+only replayed once per block and most serials only hold the journal lock to append their record.
+Every used serial is recorded and counters which were reserved but never used are released again
+and handed out by later reservations.
+
+Records:
+    {"op": "init", "template": "{base_name}-{counter:06d}", "start": 1}
+    {"op": "reserve", "id": "...", "ranges": [[first, count], ...]}
+    {"op": "use", "id": "...", "counter": 1, "serial": "PCM-071-000001"}
+    {"op": "release", "id": "...", "ranges": [[first, count], ...]}
+"""
+import json
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import IO
+
+from .statefile import locked_file
+from .statefile import append_line
+from .encoding import EepromData
+
+DEFAULT_TEMPLATE = "{base_name}-{counter:06d}"
+DEFAULT_BLOCK_SIZE = 1000
+# The serial is stored in a key-value block with a value of up to 255 characters
+MAX_SERIAL_LENGTH = 255
+
+Ranges = list[tuple[int, int]]
+
+
+def format_serial(template: str, counter: int, base_name: str) -> str:
+    """Returns the serial of a counter. The template can use the fields base_name and
+    counter."""
+    try:
+        serial = template.format(base_name=base_name, counter=counter)
+    except (KeyError, IndexError, ValueError) as err:
+        raise ValueError(f"Invalid serial template '{template}': {err}") from err
+    if not serial or len(serial) > MAX_SERIAL_LENGTH:
+        raise ValueError(f"Serial '{serial}' must have 1 to {MAX_SERIAL_LENGTH} characters.")
+    return serial
+
+
+def take_ranges(free: Ranges, count: int) -> tuple[Ranges, Ranges]:
+    """Takes up to count counters from the lowest free ranges. Returns the taken ranges and the
+    ranges which are still free."""
+    taken: Ranges = []
+    for index, (first, length) in enumerate(free):
+        if count <= 0:
+            return taken, free[index:]
+        if length > count:
+            taken.append((first, count))
+            return taken, [(first + count, length - count)] + free[index + 1:]
+        taken.append((first, length))
+        count -= length
+    return taken, []
+
+
+def remove_ranges(free: Ranges, ranges: Ranges) -> Ranges:
+    """Returns the free ranges without all counters of the given ranges."""
+    for first, count in ranges:
+        end = first + count
+        remaining: Ranges = []
+        for free_first, free_count in free:
+            free_end = free_first + free_count
+            if free_first < first:
+                remaining.append((free_first, min(free_end, first) - free_first))
+            if free_end > end:
+                remaining.append((max(free_first, end), free_end - max(free_first, end)))
+        free = remaining
+    return [free_range for free_range in free if free_range[1] > 0]
+
+
+def unused_ranges(ranges: Ranges, used: set[int]) -> Ranges:
+    """Returns all counters of the ranges which were not used as ranges."""
+    unused: Ranges = []
+    for first, count in ranges:
+        for counter in range(first, first + count):
+            if counter in used:
+                continue
+            if unused and unused[-1][0] + unused[-1][1] == counter:
+                unused[-1] = (unused[-1][0], unused[-1][1] + 1)
+            else:
+                unused.append((counter, 1))
+    return unused
+
+
+class SerialJournal:
+    """State of a serial journal replayed from all its records."""
+    def __init__(self, path: str | Path, lines: list[str]):
+        self.path = path
+        self.template = ""
+        self.next = 0
+        self.reservations: dict[str, Ranges] = {}
+        self.used: dict[str, set[int]] = {}
+        self.free: Ranges = []
+        self.used_total = 0
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                self.replay(json.loads(line))
+            except (ValueError, KeyError, TypeError) as err:
+                # A crash can leave an incomplete last record, which is removed by the next
+                # append. Incomplete records are never followed by other records.
+                if number == len(lines) and not line.endswith('\n'):
+                    break
+                raise ValueError(f"Serial journal {path} is corrupt in line {number}: " \
+                                 f"{err}") from err
+        if not self.template:
+            raise ValueError(f"Serial journal {path} is not initialized.")
+
+    def replay(self, record: dict):
+        """Applies a single journal record."""
+        if record['op'] == 'init':
+            self.template = str(record['template'])
+            self.next = int(record['start'])
+        elif record['op'] == 'reserve':
+            ranges = [(int(first), int(count)) for first, count in record['ranges']]
+            self.reservations[record['id']] = ranges
+            self.used[record['id']] = set()
+            self.free = remove_ranges(self.free, ranges)
+            self.next = max([self.next] + [first + count for first, count in ranges])
+        elif record['op'] == 'use':
+            self.used.setdefault(record['id'], set()).add(int(record['counter']))
+            self.used_total += 1
+        elif record['op'] == 'release':
+            # A reservation which was recycled already is only released once
+            if self.reservations.pop(record['id'], None) is None:
+                return
+            self.used.pop(record['id'], None)
+            released = [(int(first), int(count)) for first, count in record['ranges']]
+            self.free = sorted(self.free + released)
+        else:
+            raise ValueError(f"unknown record {record['op']}")
+
+    def status(self) -> dict:
+        """Returns the template, the next fresh counter, the free counters and all open
+        reservations."""
+        return {
+            'template': self.template,
+            'next': self.next,
+            'used': self.used_total,
+            'free': sum(count for _, count in self.free),
+            'reservations': [{
+                'id': reservation_id,
+                'reserved': sum(count for _, count in ranges),
+                'used': len(self.used.get(reservation_id, ())),
+            } for reservation_id, ranges in self.reservations.items()],
+        }
+
+
+def read_journal(journal_file: IO[str]) -> SerialJournal:
+    """Replays a locked journal file."""
+    journal_file.seek(0)
+    return SerialJournal(journal_file.name, journal_file.readlines())
+
+
+def write_record(journal_file: IO[str], record: dict):
+    """Appends a record to a locked journal file."""
+    append_line(journal_file, json.dumps(record))
+
+
+def append_record(journal_path: str | Path, record: dict):
+    """Appends a record to a journal and holds the journal lock only for this write."""
+    with locked_file(journal_path) as journal_file:
+        write_record(journal_file, record)
+
+
+def create_serial_journal(journal_path: str | Path, template: str = DEFAULT_TEMPLATE,
+                          start: int = 1) -> dict:
+    """Creates a new serial journal. An existing journal is never overwritten."""
+    format_serial(template, start, "PCM-000")
+    if start < 0:
+        raise ValueError("The first counter must not be negative.")
+    with locked_file(journal_path, create=True) as journal_file:
+        if journal_file.read():
+            raise ValueError(f"Serial journal {journal_path} already exists.")
+        write_record(journal_file, {'op': 'init', 'template': template, 'start': start})
+        return read_journal(journal_file).status()
+
+
+def get_serial_journal_status(journal_path: str | Path) -> dict:
+    """Returns the state of a serial journal."""
+    with locked_file(journal_path) as journal_file:
+        return read_journal(journal_file).status()
+
+
+def recycle_serials(journal_path: str | Path, reservation_id: str | None = None) -> int:
+    """Releases all counters of open reservations which were never used, e.g. after a station
+    crashed. Without an ID every open reservation is released, so no station may use the
+    journal at the same time. Returns the number of released counters."""
+    released = 0
+    with locked_file(journal_path) as journal_file:
+        journal = read_journal(journal_file)
+        if reservation_id is not None and reservation_id not in journal.reservations:
+            raise ValueError(f"No open reservation {reservation_id} in {journal_path}")
+        for open_id, ranges in journal.reservations.items():
+            if reservation_id not in (None, open_id):
+                continue
+            unused = unused_ranges(ranges, journal.used.get(open_id, set()))
+            write_record(journal_file, {'op': 'release', 'id': open_id, 'ranges': unused})
+            released += sum(count for _, count in unused)
+    return released
+
+
+class SerialReservation:
+    """Counters reserved by one process. Serials are generated from the reserved counters and a
+    new block is only reserved when all counters are used. Unused counters are released when
+    the reservation is closed."""
+    def __init__(self, journal_path: str | Path, block_size: int = DEFAULT_BLOCK_SIZE):
+        if block_size < 1:
+            raise ValueError("The serial block size must be at least 1.")
+        self.journal_path = journal_path
+        self.block_size = block_size
+        self.template = ""
+        self.ranges: Ranges = []
+        self.reservation_id = ""
+        self.blocks = 0
+        self.lock = threading.Lock()
+
+    def release(self):
+        """Releases the current reservation and all of its counters which were not used."""
+        if not self.reservation_id:
+            return
+        append_record(self.journal_path, {'op': 'release', 'id': self.reservation_id,
+                                          'ranges': self.ranges})
+        self.reservation_id = ""
+        self.ranges = []
+
+    def reserve(self):
+        """Closes the used up reservation and reserves the next block of counters, preferring
+        released ones."""
+        self.release()
+        self.blocks += 1
+        self.reservation_id = f"{socket.gethostname()}:{os.getpid()}:{time.time_ns()}:" \
+            f"{self.blocks}"
+        with locked_file(self.journal_path) as journal_file:
+            journal = read_journal(journal_file)
+            ranges, _ = take_ranges(journal.free, self.block_size)
+            missing = self.block_size - sum(count for _, count in ranges)
+            if missing:
+                ranges.append((journal.next, missing))
+            write_record(journal_file, {'op': 'reserve', 'id': self.reservation_id,
+                                        'ranges': ranges})
+        self.template = journal.template
+        self.ranges = ranges
+
+    def next_serial(self, eeprom_data: EepromData) -> str:
+        """Returns the serial of the next reserved counter and records it as used."""
+        with self.lock:
+            if not self.ranges:
+                self.reserve()
+            first, count = self.ranges[0]
+            self.ranges[0:1] = [(first + 1, count - 1)] if count > 1 else []
+            serial = format_serial(self.template, first, eeprom_data.base_name())
+            append_record(self.journal_path, {'op': 'use', 'id': self.reservation_id,
+                                              'counter': first, 'serial': serial})
+        return serial
+
+    def close(self):
+        """Releases all counters which were reserved but not used."""
+        with self.lock:
+            self.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -0,0 +1,122 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Module to run commands received as JSON requests on a local Unix domain socket.
+
+Every request is a single line with a JSON object which contains the command line arguments of
+one command, e.g. {"id": 1, "argv": ["read-mac", "0", "-som", "PCM-071"]}. The server answers
+every request with a single line JSON result record. The product configs stay loaded between
+requests and every connection is handled by its own thread.
+"""
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import sys
+import threading
+import time
+from typing import Callable
+
+from .encoding import EepromData
+from .multi import ThreadOutput
+
+def run_request(request: dict, handler: Callable[[list[str]], object],
+                stdout: ThreadOutput, stderr: ThreadOutput) -> dict:
+    """Runs the command of a request and returns its result record including everything the
+    command printed."""
+    output = stdout.capture()
+    errors = stderr.capture()
+    result: dict = {"id": request["id"]} if "id" in request else {}
+    start = time.monotonic()
+    try:
+        argv = request.get("argv")
+        if not isinstance(argv, list) or not all(isinstance(arg, str) for arg in argv):
+            raise ValueError("Request needs an argv list of strings.")
+        eeprom_data = handler(argv)
+        result["status"] = "ok"
+        if isinstance(eeprom_data, EepromData):
+            result["product"] = eeprom_data.full_name()
+    except SystemExit as err:
+        if err.code in (None, 0):
+            result["status"] = "ok"
+        else:
+            error = err.code if isinstance(err.code, str) else errors.getvalue().strip()
+            result.update(status="error", error=error.splitlines()[-1] if error else "")
+    except Exception as err: # pylint: disable=broad-exception-caught
+        # A single bad request must never end the session
+        result.update(status="error", error=str(err) or type(err).__name__)
+    result["duration"] = time.monotonic() - start
+    result["output"] = output.getvalue()
+    return result
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Handles all requests of one client connection in order."""
+    server: 'CommandServer'
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("Request is not an object")
+            except ValueError as err:
+                result = {"status": "error", "error": f"Invalid request: {err}"}
+            else:
+                result = run_request(request, self.server.handler, self.server.stdout,
+                                     self.server.stderr)
+            self.wfile.write(json.dumps(result).encode('utf-8') + b"\n")
+
+
+class CommandServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix domain socket server which passes the command line arguments of every request to
+    the handler."""
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, handler: Callable[[list[str]], object]):
+        self.handler = handler
+        self.stdout = ThreadOutput(sys.stdout)
+        self.stderr = ThreadOutput(sys.stderr)
+        super().__init__(socket_path, RequestHandler)
+
+
+def remove_stale_socket(socket_path: str):
+    """Removes the socket file of a server which is no longer running. Other files are never
+    removed."""
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        sys.exit(f"{socket_path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+        except OSError:
+            os.unlink(socket_path)
+            return
+    sys.exit(f"Another server is already listening on {socket_path}")
+
+
+def run_server(socket_path: str, handler: Callable[[list[str]], object]):
+    """Serves requests on the Unix domain socket until the process is interrupted or
+    terminated."""
+    remove_stale_socket(socket_path)
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    with CommandServer(socket_path, handler) as server:
+        print(f"Listening on {socket_path}", flush=True)
+        original_stdout, original_stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = server.stdout, server.stderr
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sys.stdout, sys.stderr = original_stdout, original_stderr
+            os.unlink(socket_path)
@@ -0,0 +1,49 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Module to lock and append local state files shared by several processes."""
+from contextlib import contextmanager
+from pathlib import Path
+import os
+import sys
+from typing import IO, Iterator
+
+
+@contextmanager
+def locked_file(path: str | Path, create: bool = False, binary: bool = False) -> Iterator[IO]:
+    """Opens a local state file for reading and writing and holds an exclusive lock on it, so
+    several processes never change the file at the same time. With create the file is created
+    if it does not exist yet. Binary files are opened in binary mode."""
+    try:
+        # pylint: disable=import-outside-toplevel
+        import fcntl
+    except ImportError:
+        sys.exit("Locking state files is not supported on this platform.")
+    flags = os.O_RDWR | (os.O_CREAT if create else 0)
+    try:
+        # pylint: disable=consider-using-with
+        state_file = open(path, 'r+b' if binary else 'r+', encoding=None if binary else 'UTF-8',
+                          opener=lambda name, _: os.open(name, flags, 0o644))
+    except OSError as err:
+        sys.exit(str(err))
+    with state_file:
+        fcntl.flock(state_file, fcntl.LOCK_EX)
+        try:
+            yield state_file
+        finally:
+            state_file.flush()
+            os.fsync(state_file.fileno())
+            fcntl.flock(state_file, fcntl.LOCK_UN)
+
+
+def append_line(state_file: IO, line: str):
+    """Appends a single line to a state file which is locked by locked_file(). A last line which
+    a crashed process left incomplete is removed first, so the new line is never glued to it
+    and only the last line of a file can ever be incomplete."""
+    descriptor = state_file.fileno()
+    size = os.fstat(descriptor).st_size
+    if size and os.pread(descriptor, 1, size - 1) != b'\n':
+        size = os.pread(descriptor, size, 0).rfind(b'\n') + 1
+        os.ftruncate(descriptor, size)
+    os.pwrite(descriptor, line.encode('utf-8') + b'\n', size)
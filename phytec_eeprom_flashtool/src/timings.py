@@ -0,0 +1,156 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Module to measure the duration, transferred bytes and syscalls of the phases of a command.
+
+Measuring is disabled by default. In this case timing() returns a shared object which does
+nothing, so the instrumented code paths have almost no overhead.
+"""
+import threading
+import time
+
+# Per thread read and write syscall counters of Linux
+THREAD_IO_FILE = '/proc/thread-self/io'
+
+
+class Phase: # pylint: disable=too-few-public-methods
+    """Accumulated measurements of one phase."""
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.duration = 0.0
+        self.bytes = 0
+        self.read_syscalls: int | None = None
+        self.write_syscalls: int | None = None
+
+    def to_dict(self) -> dict:
+        """Returns the measurements as dictionary."""
+        return {
+            "phase": self.name,
+            "calls": self.calls,
+            "duration": self.duration,
+            "bytes": self.bytes,
+            "read_syscalls": self.read_syscalls,
+            "write_syscalls": self.write_syscalls,
+        }
+
+
+class Timings:
+    """Collects the measurements of all phases of a command."""
+    def __init__(self, start: float):
+        self.phases: dict[str, Phase] = {}
+        self.lock = threading.Lock()
+        self.start = start
+        # Syscalls needed to read the syscall counters themselves
+        self.syscall_overhead = (0, 0)
+        first = read_syscall_counters()
+        second = read_syscall_counters()
+        if first and second:
+            self.syscall_overhead = (second[0] - first[0], second[1] - first[1])
+
+    def add(self, name: str, duration: float, count: int = 0,
+            syscalls: tuple[int, int] | None = None):
+        """Adds the measurements of one call of a phase."""
+        with self.lock:
+            phase = self.phases.setdefault(name, Phase(name))
+            phase.calls += 1
+            phase.duration += duration
+            phase.bytes += count
+            if syscalls is not None:
+                phase.read_syscalls = (phase.read_syscalls or 0) + \
+                    max(0, syscalls[0] - self.syscall_overhead[0])
+                phase.write_syscalls = (phase.write_syscalls or 0) + \
+                    max(0, syscalls[1] - self.syscall_overhead[1])
+
+    def to_dict(self) -> dict:
+        """Returns all measurements and the total duration as dictionary."""
+        return {
+            "timings": [phase.to_dict() for phase in self.phases.values()],
+            "total": time.monotonic() - self.start,
+        }
+
+    def format_table(self) -> str:
+        """Returns all measurements as table."""
+        lines = [f"{'Phase':<16} {'Calls':>6} {'Time [ms]':>10} {'Bytes':>8} "
+                 f"{'Syscalls r/w':>13}"]
+        for phase in self.phases.values():
+            syscalls = "-" if phase.read_syscalls is None else \
+                f"{phase.read_syscalls}/{phase.write_syscalls}"
+            lines.append(f"{phase.name:<16} {phase.calls:>6} {phase.duration * 1e3:>10.3f} "
+                         f"{phase.bytes:>8} {syscalls:>13}")
+        lines.append(f"{'total':<16} {'':>6} {(time.monotonic() - self.start) * 1e3:>10.3f}")
+        return "\n".join(lines)
+
+
+class PhaseTimer:
+    """Context manager which measures one call of a phase."""
+    def __init__(self, timings: Timings, name: str):
+        self.timings = timings
+        self.name = name
+        self.count = 0
+        self.start = 0.0
+        self.syscalls: tuple[int, int] | None = None
+
+    def add_bytes(self, count: int):
+        """Adds the number of bytes transferred or processed by the phase."""
+        self.count += count
+
+    def __enter__(self):
+        self.syscalls = read_syscall_counters()
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, *_):
+        duration = time.monotonic() - self.start
+        syscalls = read_syscall_counters()
+        if syscalls and self.syscalls:
+            syscalls = (syscalls[0] - self.syscalls[0], syscalls[1] - self.syscalls[1])
+        self.timings.add(self.name, duration, self.count, syscalls)
+
+
+class NullPhaseTimer:
+    """Context manager which does nothing if measuring is disabled."""
+    def add_bytes(self, count: int):
+        """Ignores the number of bytes."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+
+NULL_PHASE_TIMER = NullPhaseTimer()
+# Measurements of the running command. Empty if measuring is disabled.
+TIMINGS: list[Timings] = []
+
+
+def read_syscall_counters() -> tuple[int, int] | None:
+    """Returns the number of read and write syscalls of the calling thread or None if the
+    counters are not available."""
+    try:
+        with open(THREAD_IO_FILE, 'rb') as io_file:
+            counters = dict(line.split(b': ') for line in io_file.read().splitlines())
+        return int(counters[b'syscr']), int(counters[b'syscw'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def enable_timings(start: float | None = None) -> Timings:
+    """Starts measuring all phases. The total duration is measured from start, which defaults
+    to now."""
+    TIMINGS[:] = [Timings(time.monotonic() if start is None else start)]
+    return TIMINGS[0]
+
+
+def get_timings() -> Timings | None:
+    """Returns the measurements or None if measuring is disabled."""
+    return TIMINGS[0] if TIMINGS else None
+
+
+def timing(name: str) -> PhaseTimer | NullPhaseTimer:
+    """Returns a context manager to measure one call of a phase."""
+    if not TIMINGS:
+        return NULL_PHASE_TIMER
+    return PhaseTimer(TIMINGS[0], name)
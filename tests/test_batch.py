@@ -0,0 +1,121 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Tests for the batch manifest mode"""
+import json
+import os
+import subprocess
+
+TESTDATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata')
+
+
+def run_batch(manifest, *args):
+    command = ['phytec_eeprom_flashtool', 'batch', str(manifest)] + list(args)
+    print(" ".join(command))
+    result = subprocess.run(command, capture_output=True)
+    records = [json.loads(line) for line in result.stdout.decode('utf-8').splitlines()
+               if line.startswith('{')]
+    return result, records
+
+
+def test_batch_csv(tmp_path):
+    manifest = tmp_path / 'manifest.csv'
+    manifest.write_text(
+        "som,ksx,kit,pcb,bom,option-id,serial,macs,key-values,file\n"
+        f"PCL-069,,1011011I-0,3a,A3,,,,,{tmp_path / 'unit1.bin'}\n"
+        f"PCM-071,KSM59,5432DE11I-00,5d,S9,,,,,{tmp_path / 'unit2.bin'}\n"
+        f"PCM-071,,5432DE11I-00,5d,S9,,C0FFEE,00:11:22:33:44:55;00:11:22:33:44:56,"
+        f"foo=bar,{tmp_path / 'unit3.bin'}\n")
+    result, records = run_batch(manifest)
+    assert result.returncode == 0
+    assert [record['status'] for record in records] == ['ok', 'ok', 'ok']
+    assert records[0]['product'] == 'PCL-069-1011011I.A3'
+    for unit, file_name in [(1, 'PCL-069-1011011I-0.A3_3a_0'),
+                            (2, 'PCM-071-KSM59-5432DE11I-00.S9_5d_1')]:
+        with open(tmp_path / f'unit{unit}.bin', 'rb') as binary, \
+                open(os.path.join(TESTDATA_PATH, file_name), 'rb') as expected:
+            assert binary.read() == expected.read()
+
+    command = ['phytec_eeprom_flashtool', 'read-mac', '1', '-file', str(tmp_path / 'unit3.bin')]
+    result = subprocess.run(command, stdout=subprocess.PIPE)
+    assert result.returncode == 0
+    assert "MAC             :  00:11:22:33:44:56" in result.stdout.decode('utf-8')
+
+
+def test_batch_jsonl_errors(tmp_path):
+    manifest = tmp_path / 'manifest.jsonl'
+    rows = [
+        {"som": "PCL-069", "kit": "1011011I-0", "pcb": "3a", "bom": "A3", "serial": "1234",
+         "file": str(tmp_path / 'unit1.bin')},
+        {"som": "PFL-G-03", "kit": "21022110I-1", "pcb": "1a", "bom": "B2",
+         "option_id": "PT005", "macs": {"2": "00:11:22:33:44:57"},
+         "file": str(tmp_path / 'unit2.bin')},
+        {"som": "PCL-069", "kit": "1011011I-0", "pcb": "3a"},
+    ]
+    manifest.write_text("\n".join(json.dumps(row) for row in rows) + "\n")
+    result, records = run_batch(manifest)
+    assert result.returncode == 1
+    assert [record['status'] for record in records] == ['error', 'ok', 'error']
+    assert [record['unit'] for record in records] == [1, 2, 3]
+    assert records[0]['error'] == "Blocks are only supported with API v3"
+    assert not os.path.exists(tmp_path / 'unit1.bin')
+
+
+def test_batch_mac_pool(tmp_path):
+    pool = tmp_path / 'mac.pool'
+    subprocess.run(['phytec_eeprom_flashtool', 'mac-pool', str(pool), '-init',
+                    '00:11:22:33:44:00', '00:11:22:33:44:ff'], check=True)
+    manifest = tmp_path / 'manifest.csv'
+    manifest.write_text(
+        "som,kit,pcb,bom,macs,mac_count,file\n"
+        f"PCM-071,5432DE11I-00,5d,S9,,,{tmp_path / 'unit1.bin'}\n"
+        f"PCM-071,5432DE11I-00,5d,S9,00:11:22:33:55:00,,{tmp_path / 'unit2.bin'}\n"
+        f"PCM-071,5432DE11I-00,5d,S9,,3,{tmp_path / 'unit3.bin'}\n")
+    result, records = run_batch(manifest, '-mac-pool', str(pool), '-macs-per-unit', '2')
+    assert result.returncode == 0
+    assert [record['status'] for record in records] == ['ok', 'ok', 'ok']
+    assert records[0]['macs'] == ['00:11:22:33:44:00', '00:11:22:33:44:01']
+    assert 'macs' not in records[1]
+    assert records[2]['macs'] == ['00:11:22:33:44:02', '00:11:22:33:44:03',
+                                  '00:11:22:33:44:04']
+
+    command = ['phytec_eeprom_flashtool', 'read-mac', '2', '-file', str(tmp_path / 'unit3.bin')]
+    result = subprocess.run(command, stdout=subprocess.PIPE)
+    assert result.returncode == 0
+    assert "MAC             :  00:11:22:33:44:04" in result.stdout.decode('utf-8')
+
+
+def test_batch_serial_pool(tmp_path):
+    journal = tmp_path / 'serials.journal'
+    subprocess.run(['phytec_eeprom_flashtool', 'serial-pool', str(journal), '-init',
+                    'SN{counter:05d}'], check=True)
+    manifest = tmp_path / 'manifest.csv'
+    manifest.write_text(
+        "som,kit,pcb,bom,serial,file\n"
+        f"PCM-071,5432DE11I-00,5d,S9,,{tmp_path / 'unit1.bin'}\n"
+        f"PCM-071,5432DE11I-00,5d,S9,C0FFEE,{tmp_path / 'unit2.bin'}\n"
+        f"PCM-071,5432DE11I-00,5d,S9,,{tmp_path / 'unit3.bin'}\n")
+    result, records = run_batch(manifest, '-serial-pool', str(journal), '-jobs', '1')
+    assert result.returncode == 0
+    assert [record.get('serial') for record in records] == ['SN00001', None, 'SN00002']
+
+    result = subprocess.run(['phytec_eeprom_flashtool', 'serial-pool', str(journal)],
+                            stdout=subprocess.PIPE, check=True)
+    status = json.loads(result.stdout)
+    assert (status['used'], status['free'], status['reservations']) == (2, 998, [])
+
+
+def test_batch_stdin_clearance(tmp_path):
+    manifest = "som,kit,pcb,bom,i2c_bus,i2c_dev\nPCM-071,5432DE11I-00,5d,S9,0,0x50\n"
+    env = {**os.environ, 'PHYTEC_EEPROM_FLASHTOOL_EMULATOR': f"{tmp_path},write_cycle_ms=0"}
+    command = ['phytec_eeprom_flashtool', 'batch', '-']
+    result = subprocess.run(command, input=manifest.encode('utf-8'), capture_output=True,
+                            env=env)
+    assert result.returncode != 0
+    assert "requires -y" in result.stderr.decode('utf-8')
+    assert not os.path.exists(tmp_path / 'i2c-0-0x50.bin')
+    result = subprocess.run(command + ['-y'], input=manifest.encode('utf-8'),
+                            capture_output=True, env=env)
+    assert result.returncode == 0
+    assert json.loads(result.stdout)['target'] == 'i2c-0:0x50'
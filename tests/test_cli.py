@@ -32,3 +32,96 @@ def test_cli_create():
     print(" ".join(command))
     result = subprocess.run(command)
     assert result.returncode == 0
+
+def test_cli_add_serial_verify(tmp_path):
+    bin_file_name = str(tmp_path / "eeprom_data.bin")
+    command = ['phytec_eeprom_flashtool', 'create', '-som', 'PCM-071', '-kit', '5432DE11I-00',
+        '-bom', 'S9', '-pcb', '5d', '-file', bin_file_name]
+    assert subprocess.run(command).returncode == 0
+    command = ['phytec_eeprom_flashtool', 'add-serial', 'C0FFEE', '-file', bin_file_name,
+        '-verify']
+    print(" ".join(command))
+    result = subprocess.run(command, stdout=subprocess.PIPE)
+    assert result.returncode == 0
+    assert '{"verify": "pass", "bytes": 59}' in result.stdout.decode('utf-8').split('\n')
+
+def test_cli_edit(tmp_path):
+    bin_file_name = str(tmp_path / "eeprom_data.bin")
+    command = ['phytec_eeprom_flashtool', 'create', '-som', 'PCM-071', '-kit', '5432DE11I-00',
+        '-bom', 'S9', '-pcb', '5d', '-file', bin_file_name]
+    assert subprocess.run(command).returncode == 0
+    command = ['phytec_eeprom_flashtool', 'edit', '-file', bin_file_name, '-mac',
+        '0=00:11:22:33:44:55', '-mac', '1=00:11:22:33:44:56', '-serial', 'C0FFEE', '-key-value',
+        'foo=bar', '-verify']
+    print(" ".join(command))
+    result = subprocess.run(command, stdout=subprocess.PIPE)
+    assert result.returncode == 0
+    assert '{"verify": "pass", "bytes": 96}' in result.stdout.decode('utf-8').split('\n')
+    command = ['phytec_eeprom_flashtool', 'edit', '-file', bin_file_name, '-remove-mac', '0',
+        '-mac', '1=00:11:22:33:44:55']
+    assert subprocess.run(command).returncode == 0
+    command = ['phytec_eeprom_flashtool', 'read-mac', '1', '-file', bin_file_name]
+    result = subprocess.run(command, stdout=subprocess.PIPE)
+    assert result.returncode == 0
+    assert "MAC             :  00:11:22:33:44:55" in result.stdout.decode('utf-8')
+
+
+def test_cli_read_raw(tmp_path):
+    bin_file_name = str(tmp_path / "eeprom_data.bin")
+    command = ['phytec_eeprom_flashtool', 'create', '-som', 'PCM-071', '-kit', '5432DE11I-00',
+        '-bom', 'S9', '-pcb', '5d', '-file', bin_file_name]
+    assert subprocess.run(command).returncode == 0
+    command = ['phytec_eeprom_flashtool', 'edit', '-file', bin_file_name, '-mac',
+        '0=00:11:22:33:44:55', '-serial', 'C0FFEE']
+    assert subprocess.run(command).returncode == 0
+    command = ['phytec_eeprom_flashtool', 'read-mac', '0', '-raw', '-file', bin_file_name]
+    result = subprocess.run(command, stdout=subprocess.PIPE)
+    assert result.returncode == 0
+    assert "MAC             :  00:11:22:33:44:55" in result.stdout.decode('utf-8')
+    command = ['phytec_eeprom_flashtool', 'read-serial', '-raw', '-file', bin_file_name]
+    result = subprocess.run(command, stdout=subprocess.PIPE)
+    assert "Value           :  C0FFEE" in result.stdout.decode('utf-8')
+    command = ['phytec_eeprom_flashtool', 'read', '-raw', '-names', '-file', bin_file_name]
+    result = subprocess.run(command, stdout=subprocess.PIPE)
+    assert result.returncode == 0
+    assert "Full name        :  PCM-071-5432DE11I.S9" in result.stdout.decode('utf-8')
+    command = ['phytec_eeprom_flashtool', 'read', '-raw', '-som', 'PCM-071', '-file',
+        bin_file_name]
+    assert subprocess.run(command).returncode != 0
+
+
+def test_cli_read_targeted(tmp_path):
+    bin_file_name = str(tmp_path / "eeprom_data.bin")
+    command = ['phytec_eeprom_flashtool', 'create', '-som', 'PCM-071', '-kit', '5432DE11I-00',
+        '-bom', 'S9', '-pcb', '5d', '-file', bin_file_name]
+    assert subprocess.run(command).returncode == 0
+    command = ['phytec_eeprom_flashtool', 'edit', '-file', bin_file_name, '-mac',
+        '0=00:11:22:33:44:55', '-mac', '1=00:11:22:33:44:56', '-key-value', 'foo=bar']
+    assert subprocess.run(command).returncode == 0
+    command = ['phytec_eeprom_flashtool', 'read-mac', '1', '-targeted', '-file', bin_file_name]
+    result = subprocess.run(command, stdout=subprocess.PIPE)
+    assert result.returncode == 0
+    assert "MAC             :  00:11:22:33:44:56" in result.stdout.decode('utf-8')
+    assert "Read 64 of 77 bytes in 6 transfer(s)." in result.stdout.decode('utf-8')
+    command = ['phytec_eeprom_flashtool', 'read-key-value', 'foo', '-raw', '-targeted', '-file',
+        bin_file_name]
+    result = subprocess.run(command, stdout=subprocess.PIPE)
+    assert result.returncode == 0
+    assert "Value           :  bar" in result.stdout.decode('utf-8')
+
+def test_cli_command_name_in_values(tmp_path):
+    bin_file_name = str(tmp_path / "eeprom_data.bin")
+    command = ['phytec_eeprom_flashtool', 'create', '-som', 'PCM-071', '-kit', '5432DE11I-00',
+        '-bom', 'S9', '-pcb', '5d', '-file', bin_file_name]
+    assert subprocess.run(command).returncode == 0
+    # The command is the first argument after the global options, even if the value of an
+    # option or argument is the name of another command
+    command = ['phytec_eeprom_flashtool', '--profile', 'read', 'add-key-value', 'mode', 'create',
+        '-file', bin_file_name]
+    print(" ".join(command))
+    assert subprocess.run(command, cwd=tmp_path).returncode == 0
+    assert (tmp_path / 'read').exists()
+    command = ['phytec_eeprom_flashtool', 'read-key-value', 'mode', '-file', bin_file_name]
+    result = subprocess.run(command, stdout=subprocess.PIPE)
+    assert result.returncode == 0
+    assert 'create' in result.stdout.decode('utf-8')
@@ -6,6 +6,9 @@ import pytest
 from phytec_eeprom_flashtool.src.common import str_to_revision
 from phytec_eeprom_flashtool.src.common import sub_revision_to_str
 from phytec_eeprom_flashtool.src.common import crc8_checksum_calc
+from phytec_eeprom_flashtool.src.common import crc8_checksum_calc_many
+from phytec_eeprom_flashtool.src.common import hw8_checksum_calc
+from phytec_eeprom_flashtool.src.common import hw8_checksum_calc_many
 
 
 @pytest.mark.parametrize("value, expect", [
@@ -46,3 +49,37 @@ def test_crc8_checksum_calc(value, expect):
     crc8 = crc8_checksum_calc(value)
     assert crc8 == expect, f"CRC8 doesn't match. Expected {expect} but calculated {crc8}"
     assert not crc8_checksum_calc(value + bytes(chr(crc8), 'utf-8'))
+
+
+def test_crc8_checksum_calc_buffers():
+    """test crc8_checksum_calc with all supported buffer types and the bulk API"""
+    value = bytes(range(256))
+    expect = crc8_checksum_calc(value)
+    assert crc8_checksum_calc(bytearray(value)) == expect
+    assert crc8_checksum_calc(memoryview(value)) == expect
+    assert crc8_checksum_calc(b"") == 0
+    assert crc8_checksum_calc_many([value, memoryview(value)[:4], b"cafe", b""]) == \
+        [expect, crc8_checksum_calc(value[:4]), 118, 0]
+
+
+def test_crc8_checksum_calc_reference():
+    """test crc8_checksum_calc matches the crc8 module used by previous versions"""
+    crc8 = pytest.importorskip("crc8")
+    for size in range(64):
+        value = bytes((index * 37 + size) & 0xFF for index in range(size))
+        hash_ = crc8.crc8()
+        hash_.update(value)
+        assert crc8_checksum_calc(value) == int(hash_.hexdigest(), 16)
+
+
+@pytest.mark.parametrize("value, expect", [
+    (b"", 0),
+    (b"\x00\x01\x03\x07", 6),
+    (b"\xff" * 31, 248),
+    (bytes("cafe", 'utf-8'), 15),
+])
+def test_hw8_checksum_calc(value, expect):
+    """test hw8_checksum_calc"""
+    assert hw8_checksum_calc(value) == expect
+    assert hw8_checksum_calc(memoryview(value)) == expect
+    assert hw8_checksum_calc_many([value, value]) == [expect, expect]
@@ -0,0 +1,70 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import shutil
+import pytest
+import yaml
+from phytec_eeprom_flashtool.src import config
+
+
+@pytest.fixture()
+def config_dir(tmp_path, monkeypatch):
+    """Copy of the config directory with an empty cache directory."""
+    configs = tmp_path / 'configs'
+    shutil.copytree(config.CONFIG_DIR, configs)
+    monkeypatch.setattr(config, 'CONFIG_DIR', configs)
+    monkeypatch.setenv(config.CACHE_DIR_ENV, str(tmp_path / 'cache'))
+    config.STORE.clear()
+    yield configs
+    config.STORE.clear()
+
+
+def test_config_cache(config_dir):
+    """test the compiled configs match the YML files and are stored in the cache file"""
+    cache_file = config.get_cache_file()
+    assert not cache_file.exists()
+    for product in ['PCL-066', 'PCM-057', 'PCM-071', 'PFL-G-03']:
+        with open(config_dir / f'{product}.yml', encoding='UTF-8') as config_file:
+            assert config.get_product_config(product) == yaml.safe_load(config_file)
+    assert config.get_product_config('PCX-000') is None
+    assert config.get_constants()['MAX_OPTION_COUNT'] == 17
+    assert 'PCL-066' in config.get_product_names()
+    assert cache_file.exists()
+    assert config.load_cache(cache_file, config.get_fingerprint()) is not None
+
+
+def test_config_cache_invalidation(config_dir):
+    """test the cache is rebuilt when a YML file changes"""
+    assert config.get_product_config('PCL-066')['PHYTEC']['i2c_bus'] == 0
+    yml_file = config_dir / 'PCL-066.yml'
+    yml_file.write_text(yml_file.read_text().replace('i2c_bus: 0', 'i2c_bus: 4'))
+    stat = yml_file.stat()
+    os.utime(yml_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    config.STORE.clear()
+    assert config.get_product_config('PCL-066')['PHYTEC']['i2c_bus'] == 4
+    shutil.copy(yml_file, config_dir / 'PCX-000.yml')
+    config.STORE.clear()
+    assert config.get_product_config('PCX-000')['PHYTEC']['i2c_bus'] == 4
+
+
+def test_config_cache_untrusted(config_dir):
+    """test a cache file writable by others is never loaded"""
+    config.get_constants()
+    cache_file = config.get_cache_file()
+    fingerprint = config.get_fingerprint()
+    assert config.load_cache(cache_file, fingerprint) is not None
+    cache_file.chmod(0o666)
+    assert config.load_cache(cache_file, fingerprint) is None
+    # The next process replaces the untrusted cache file
+    config.STORE.clear()
+    config.get_constants()
+    assert config.load_cache(cache_file, fingerprint) is not None
+
+
+def test_save_cache_error(tmp_path):
+    """test a cache which can not be stored leaves no temporary file behind"""
+    cache_file = tmp_path / 'cache' / 'configs.marshal'
+    config.save_cache(cache_file, {'fingerprint': (), 'products': {'PCX-000': object()}})
+    assert os.listdir(tmp_path / 'cache') == []
@@ -0,0 +1,125 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Tests for the multi-image container"""
+import json
+import subprocess
+
+import pytest
+
+from phytec_eeprom_flashtool.src.container import Container
+from phytec_eeprom_flashtool.src.container import ContainerWriter
+from phytec_eeprom_flashtool.src.container import append_images
+from phytec_eeprom_flashtool.src.container import read_container_image
+from phytec_eeprom_flashtool.src.io import split_container_path
+
+
+def run(*args):
+    command = ['phytec_eeprom_flashtool'] + [str(arg) for arg in args]
+    print(" ".join(command))
+    return subprocess.run(command, capture_output=True)
+
+
+def test_container_append_and_find(tmp_path):
+    path = tmp_path / 'images.bin'
+    append_images(path, [(['b', 'serial-b'], b'image b'), (['a'], b'image a')])
+    append_images(path, [(['c'], b'image c')])
+    container = Container(path)
+    assert len(container) == 4
+    assert [key for key, _, _ in container.entries()] == ['a', 'b', 'c', 'serial-b']
+    assert bytes(container.find('serial-b')) == b'image b'
+    assert bytes(container.find('c')) == b'image c'
+    assert container.find('d') is None
+    with pytest.raises(ValueError):
+        read_container_image(path, 'd')
+
+
+def test_container_replace_keys(tmp_path):
+    path = tmp_path / 'images.bin'
+    append_images(path, [(['unit', '00:11:22:33:44:55'], b'old')])
+    append_images(path, [(['unit', '00:11:22:33:44:55'], b'new')])
+    assert bytes(read_container_image(path, 'unit')) == b'new'
+    assert bytes(read_container_image(path, '00:11:22:33:44:55')) == b'new'
+
+
+def test_container_shared_key_keeps_unit_keys(tmp_path):
+    path = tmp_path / 'images.bin'
+    append_images(path, [(['PCM-071-X', 'SN1', '00:11:22:33:44:55'], b'board a')])
+    append_images(path, [(['PCM-071-X'], b'board b')])
+    assert bytes(read_container_image(path, 'PCM-071-X')) == b'board b'
+    assert bytes(read_container_image(path, 'SN1')) == b'board a'
+    assert bytes(read_container_image(path, '00:11:22:33:44:55')) == b'board a'
+
+
+def test_container_writer_chunks(tmp_path):
+    path = tmp_path / 'images.bin'
+    with ContainerWriter(path, chunk_size=2) as writer:
+        for unit in range(5):
+            writer.add([f'unit{unit}'], bytes([unit]) * 4)
+        assert len(Container(path)) == 4
+    assert len(Container(path)) == 5
+    assert bytes(read_container_image(path, 'unit4')) == b'\x04' * 4
+
+
+def test_split_container_path(tmp_path):
+    assert split_container_path(str(tmp_path / 'images.bin')) is None
+    # New containers are only created on request
+    assert split_container_path(f"{tmp_path / 'images.bin'}#key") is None
+    assert split_container_path(f"{tmp_path / 'images.bin'}#key", create=True) == \
+        (str(tmp_path / 'images.bin'), 'key')
+    append_images(tmp_path / 'images.bin', [(['key'], b'image')])
+    assert split_container_path(f"{tmp_path / 'images.bin'}#key") == \
+        (str(tmp_path / 'images.bin'), 'key')
+    # Other files are never containers
+    (tmp_path / 'out').write_bytes(b'binary')
+    assert split_container_path(str(tmp_path / 'out#1.bin')) is None
+    # Existing files with a '#' in their name are read as plain files
+    (tmp_path / 'image#1.bin').write_bytes(b'')
+    assert split_container_path(str(tmp_path / 'image#1.bin')) is None
+
+
+def test_container_cli(tmp_path):
+    path = tmp_path / 'images.bin'
+    name = 'PCM-071-5432DE11I-00.S9_5d_1'
+    product = ['-som', 'PCM-071', '-kit', '5432DE11I-00', '-pcb', '5d', '-bom', 'S9']
+    assert run('create', *product, '-file', f'{path}#', '-container').returncode == 0
+    assert run('create', *product, '-file', tmp_path / name).returncode == 0
+    assert bytes(read_container_image(path, name)) == (tmp_path / name).read_bytes()
+
+    assert run('add-serial', 'C0FFEE', '-file', f'{path}#{name}').returncode == 0
+    assert run('add-mac', '0', '00:11:22:33:44:55', '-file', f'{path}#C0FFEE').returncode == 0
+    result = run('read-serial', '-file', f'{path}#00:11:22:33:44:55')
+    assert result.returncode == 0
+    assert 'C0FFEE' in result.stdout.decode('utf-8')
+
+    result = run('container', path)
+    assert result.returncode == 0
+    records = [json.loads(line) for line in result.stdout.decode('utf-8').splitlines()]
+    assert [record['key'] for record in records] == ['00:11:22:33:44:55', 'C0FFEE', name]
+    # The binary name still points to the image written by add-serial
+    assert records[0]['offset'] == records[1]['offset'] != records[2]['offset']
+
+    result = run('read', '-file', f'{path}#missing')
+    assert result.returncode != 0
+
+    # Paths with a '#' are plain binaries unless they point into a container
+    assert run('create', *product, '-file', tmp_path / 'out#1.bin').returncode == 0
+    assert (tmp_path / 'out#1.bin').read_bytes() == (tmp_path / name).read_bytes()
+    assert not (tmp_path / 'out').exists()
+
+
+def test_batch_container(tmp_path):
+    manifest = tmp_path / 'manifest.csv'
+    path = tmp_path / 'images.bin'
+    manifest.write_text(
+        "som,kit,pcb,bom,serial,macs\n"
+        "PCM-071,5432DE11I-00,5d,S9,SN1,00:11:22:33:44:55\n"
+        "PCM-071,5432DE11I-00,5d,S9,SN2,00:11:22:33:44:56\n")
+    result = run('batch', manifest, '-container', path, '-jobs', '2')
+    assert result.returncode == 0
+    records = [json.loads(line) for line in result.stdout.decode('utf-8').splitlines()]
+    assert [record['target'] for record in records] == [f'{path}#SN1', f'{path}#SN2']
+    result = run('read-mac', '0', '-file', f'{path}#SN2')
+    assert '00:11:22:33:44:56' in result.stdout.decode('utf-8')
+    assert run('batch', manifest, '-container', path, '-verify').returncode != 0
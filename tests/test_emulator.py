@@ -0,0 +1,91 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Tests for the emulated EEPROM devices"""
+import os
+import subprocess
+import time
+
+import pytest
+
+from phytec_eeprom_flashtool.src.common import EMULATOR_ENV
+from phytec_eeprom_flashtool.src.emulator import EmulatedEeprom
+from phytec_eeprom_flashtool.src.emulator import parse_emulator_settings
+from phytec_eeprom_flashtool.src.io import eeprom_read
+from phytec_eeprom_flashtool.src.io import eeprom_write
+
+YML_PARSER = {'PHYTEC': {'i2c_bus': 1, 'i2c_dev': 0x51, 'api': 3, 'page_size': 8}}
+
+
+def test_parse_emulator_settings(tmp_path):
+    settings = parse_emulator_settings(f"{tmp_path},bus_hz=400000,eio_rate=0.5,seed=3")
+    assert settings.directory == tmp_path
+    assert (settings.bus_hz, settings.eio_rate, settings.seed) == (400000, 0.5, 3)
+    assert settings.write_cycle_ms == 5.0
+    with pytest.raises(ValueError):
+        parse_emulator_settings(f"{tmp_path},speed=1")
+
+
+def test_emulated_eeprom(tmp_path, monkeypatch):
+    monkeypatch.setenv(EMULATOR_ENV, f"{tmp_path},size=256,write_cycle_ms=0,bus_hz=10000000")
+    assert eeprom_read(YML_PARSER, 16) == b'\xff' * 16
+    eeprom_write(YML_PARSER, b'\x01' * 20, 4)
+    assert eeprom_read(YML_PARSER, 32) == b'\xff' * 4 + b'\x01' * 20 + b'\xff' * 8
+    assert (tmp_path / 'i2c-1-0x51.bin').stat().st_size == 256
+    # Reads stop at the end of the device
+    assert len(eeprom_read(YML_PARSER, 512)) == 256
+
+
+def test_emulated_eeprom_timing(tmp_path):
+    settings = parse_emulator_settings(f"{tmp_path},write_cycle_ms=10,bus_hz=100000000")
+    with EmulatedEeprom(settings, 0, 0x50, 16) as device:
+        start = time.monotonic()
+        device.seek(8)
+        # One partial and two full pages, each waits for the write cycle
+        device.write(b'\x00' * 40)
+        assert time.monotonic() - start >= 0.03
+
+
+def test_emulated_eeprom_faults(tmp_path):
+    settings = parse_emulator_settings(f"{tmp_path},write_cycle_ms=0,bus_hz=100000000,"
+                                       "eio_rate=1")
+    with EmulatedEeprom(settings, 0, 0x50, 16) as device:
+        with pytest.raises(OSError):
+            device.write(b'\x00' * 16)
+        with pytest.raises(OSError):
+            device.read(16)
+    assert (tmp_path / 'i2c-0-0x50.bin').read_bytes()[:16] == b'\xff' * 16
+
+
+def test_emulated_eeprom_cli(tmp_path):
+    env = {**os.environ, EMULATOR_ENV: f"{tmp_path},write_cycle_ms=0,bus_hz=100000000"}
+    command = ['phytec_eeprom_flashtool', 'write', '-som', 'PCM-071', '-kit', '5432DE11I-00',
+               '-pcb', '5d', '-bom', 'S9', '-y', '-verify', '-bus', '0', '-bus', '1']
+    result = subprocess.run(command, capture_output=True, env=env)
+    assert result.returncode == 0
+    command = ['phytec_eeprom_flashtool', 'read', '-som', 'PCM-071', '-bus', '1']
+    result = subprocess.run(command, capture_output=True, env=env)
+    assert result.returncode == 0
+    assert 'PCM-071-5432DE11I.S9' in result.stdout.decode('utf-8')
+    assert sorted(os.listdir(tmp_path)) == ['i2c-0-0x50.bin', 'i2c-1-0x50.bin']
+
+
+def test_eeprom_write_retries(tmp_path, monkeypatch):
+    monkeypatch.setenv(EMULATOR_ENV, f"{tmp_path},size=256,write_cycle_ms=0,bus_hz=100000000,"
+                       "eio_rate=0.3,seed=7")
+    content = bytes(range(100))
+    stats = eeprom_write(YML_PARSER, content, 4)
+    # A partial first page and twelve full pages
+    assert (stats.bytes, stats.chunks) == (100, 13)
+    assert stats.retries > 0
+    assert len(stats.latencies) == 13
+    monkeypatch.setenv(EMULATOR_ENV, f"{tmp_path},size=256")
+    assert eeprom_read(YML_PARSER, 104, 0) == b'\xff' * 4 + content
+
+
+def test_eeprom_write_retries_exhausted(tmp_path, monkeypatch):
+    monkeypatch.setenv(EMULATOR_ENV, f"{tmp_path},size=256,write_cycle_ms=0,bus_hz=100000000,"
+                       "eio_rate=1")
+    with pytest.raises(SystemExit, match="at offset 0 after 5 retry"):
+        eeprom_write(YML_PARSER, b'\x00' * 16)
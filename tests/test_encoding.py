@@ -0,0 +1,229 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+import argparse
+import os
+import pytest
+from phytec_eeprom_flashtool.src.io import load_yml_config
+from phytec_eeprom_flashtool.src.encoding import get_eeprom_data
+from phytec_eeprom_flashtool.src.encoding import eeprom_data_to_struct
+from phytec_eeprom_flashtool.src.encoding import eeprom_data_to_blocks
+from phytec_eeprom_flashtool.src.encoding import eeprom_data_to_image
+from phytec_eeprom_flashtool.src.encoding import image_to_eeprom_data
+from phytec_eeprom_flashtool.src.encoding import verify_image
+from phytec_eeprom_flashtool.src.encoding import check_v1_checksums
+from phytec_eeprom_flashtool.src.encoding import get_image_size
+from phytec_eeprom_flashtool.src.common import crc8_checksum_calc
+from phytec_eeprom_flashtool.src.blocks import add_mac_block
+from phytec_eeprom_flashtool.src.blocks import add_key_value_block
+from phytec_eeprom_flashtool.src.blocks import edit_blocks
+from phytec_eeprom_flashtool.src.blocks import find_chained_mac_block
+from phytec_eeprom_flashtool.src.blocks import find_chained_key_value_block
+
+TESTDATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata')
+
+
+def create_eeprom_data(som='PCM-071', kit='5432DE11I-00', macs=0, key_values=0):
+    """Returns EEPROM data with the given number of MAC and key value blocks."""
+    args = argparse.Namespace(som=som, ksx=None, kit=kit, pcb='5d', bom='S9', id=None)
+    eeprom_data = get_eeprom_data(args, load_yml_config(som))
+    for interface in range(macs):
+        add_mac_block(eeprom_data, interface,
+                      f"00:11:22:33:{interface >> 8:02x}:{interface & 0xff:02x}")
+    for index in range(key_values):
+        add_key_value_block(eeprom_data, f"key{index}", f"value{index}")
+    return eeprom_data
+
+
+def create_image(eeprom_data):
+    """Returns the packed image of the EEPROM data."""
+    return bytes(eeprom_data_to_image(eeprom_data))
+
+
+@pytest.mark.parametrize("padding", [b"", b"\xff" * 2008])
+def test_image_to_eeprom_data(padding):
+    """test image_to_eeprom_data decodes a whole image with unused space after the content"""
+    eeprom_data = create_eeprom_data(macs=2, key_values=3)
+    image = create_image(eeprom_data)
+    decoded = image_to_eeprom_data(memoryview(image + padding), eeprom_data.yml_parser)
+    assert decoded.full_name() == eeprom_data.full_name()
+    assert decoded.kit_opt == eeprom_data.kit_opt
+    assert [block.mac for block in decoded.blocks[:2]] == \
+        [block.mac for block in eeprom_data.blocks[:2]]
+    assert [block.key for block in decoded.blocks[2:]] == ['key0', 'key1', 'key2']
+    assert create_image(decoded) == image
+
+
+@pytest.mark.parametrize("file_name, full_name", [
+    ('PCM-071-KSM59-5432DE11I-00.S9_5d_1', 'PCM-071-KSM59.S9'),
+    ('PCL-069-1011011I-0.A3_3a_0', 'PCL-069-1011011I0.A3'),
+    ('PCM-057-40201111I.A1_50_0', 'PCM-057-40201111I.A1'),
+])
+def test_image_to_eeprom_data_raw(file_name, full_name):
+    """test image_to_eeprom_data decodes images without product config"""
+    with open(os.path.join(TESTDATA_PATH, file_name), 'rb') as binary:
+        image = binary.read()
+    assert image_to_eeprom_data(image, None).full_name() == full_name
+
+
+def test_image_to_eeprom_data_raw_blocks():
+    """test image_to_eeprom_data decodes all blocks without product config"""
+    eeprom_data = create_eeprom_data(macs=2, key_values=1)
+    image = create_image(eeprom_data)
+    assert get_image_size(image[:40]) == len(image)
+    decoded = image_to_eeprom_data(image + b"\xff" * 64, None)
+    assert decoded.kit_opt == "5432DE11I00"
+    assert decoded.bom_rev == "S9"
+    assert list(decoded.mac_addresses) == ['00:11:22:33:00:00', '00:11:22:33:00:01']
+    assert decoded.get_key_value_block('key0').value == 'value0'
+
+
+def test_find_chained_blocks():
+    """test the block chain is followed and only the requested block payload is read"""
+    eeprom_data = create_eeprom_data(macs=20, key_values=20)
+    payload = create_image(eeprom_data)[40:]
+    reads = []
+
+    def read(size, offset):
+        reads.append((offset, size))
+        return payload[offset:offset + size]
+
+    block_count = len(eeprom_data.blocks)
+    block = find_chained_mac_block(read, len(payload), block_count, 3)
+    assert block.mac == eeprom_data.get_mac_block(3).mac
+    # Four block headers and the payload of four MAC blocks
+    assert sum(size for _, size in reads) == 4 * 4 + 4 * 8
+    reads.clear()
+    block = find_chained_key_value_block(read, len(payload), block_count, 'key19')
+    assert block.value == 'value19'
+    assert sum(size for _, size in reads) < len(payload) / 2
+    assert find_chained_mac_block(read, len(payload), block_count, 20) is None
+    assert find_chained_key_value_block(read, len(payload), block_count, 'key') is None
+
+
+def test_find_chained_blocks_loop():
+    """test a block chain which points back is detected"""
+    eeprom_data = create_eeprom_data(macs=2)
+    payload = bytearray(create_image(eeprom_data)[40:])
+    # Let the second block point back to the first one
+    payload[13:15] = (0).to_bytes(2, 'little')
+    payload[15] = crc8_checksum_calc(payload[12:15])
+    with pytest.raises(AssertionError):
+        find_chained_mac_block(lambda size, offset: payload[offset:offset + size], len(payload),
+                               3, 5)
+
+
+def test_image_to_eeprom_data_truncated():
+    """test image_to_eeprom_data detects images which are shorter than the content"""
+    eeprom_data = create_eeprom_data(macs=2)
+    image = create_image(eeprom_data)
+    with pytest.raises(AssertionError):
+        image_to_eeprom_data(image[:-1], eeprom_data.yml_parser)
+
+
+def test_verify_image():
+    """test verify_image detects content and checksum errors"""
+    eeprom_data = create_eeprom_data(macs=1, key_values=1)
+    image = create_image(eeprom_data)
+    assert verify_image(image, image, eeprom_data.yml_parser) == {"verify": "pass",
+                                                                 "bytes": len(image)}
+    readback = bytearray(image)
+    readback[50] ^= 0x01
+    result = verify_image(image, bytes(readback), eeprom_data.yml_parser)
+    assert result['verify'] == 'fail'
+    assert result['offset'] == 50
+    result = verify_image(image, image[:-3], eeprom_data.yml_parser)
+    assert result['verify'] == 'fail'
+    assert result['offset'] == len(image) - 3
+    # Broken block checksum in both, the written and the read back image
+    result = verify_image(bytes(readback), bytes(readback), eeprom_data.yml_parser)
+    assert result == {"verify": "fail", "bytes": len(image),
+                      "error": "Block payload crc8 mismatch!"}
+
+
+def test_check_v1_checksums():
+    """test check_v1_checksums with an archive of API v1 images"""
+    images = b""
+    for file_name in ['PCM-057-40201111I.A1_50_0', 'PCM-057-KSM123-40301001I.A2_30_0',
+                      'PCM-057-KSP123-40301001I.A2_30_0']:
+        with open(os.path.join(TESTDATA_PATH, file_name), 'rb') as binary:
+            images += binary.read()
+    archive = bytearray(images * 3)
+    archive[32 * 4 + 5] ^= 0x10
+    assert check_v1_checksums(archive) == [True] * 4 + [False] + [True] * 4
+
+
+def test_eeprom_data_to_image():
+    """test eeprom_data_to_image matches the separately packed header and blocks"""
+    eeprom_data = create_eeprom_data(macs=3, key_values=4)
+    image = eeprom_data_to_image(eeprom_data)
+    assert bytes(image) == eeprom_data_to_struct(eeprom_data) + eeprom_data_to_blocks(eeprom_data)
+    offset = 0
+    for block in eeprom_data.blocks:
+        assert block.pack(offset + block.length) == image[40 + offset:40 + offset + block.length]
+        offset += block.length
+    assert 40 + offset == len(image)
+
+
+def test_block_lookup():
+    """test the block indexes of created and decoded EEPROM data"""
+    eeprom_data = create_eeprom_data(macs=3, key_values=2)
+    add_key_value_block(eeprom_data, "serial", "1234")
+    decoded = image_to_eeprom_data(create_image(eeprom_data), eeprom_data.yml_parser)
+    for data in [eeprom_data, decoded]:
+        assert data.get_mac_block(2).mac == ['00', '11', '22', '33', '00', '02']
+        assert data.get_mac_block(3) is None
+        assert data.find_mac_block("00-11-22-33-00-01").interface == 1
+        assert data.find_mac_block("001122330001").interface == 1
+        assert data.find_mac_block("00:11:22:33:00:05") is None
+        assert data.get_key_value_block("serial").value == "1234"
+        assert data.get_key_value_block("key1").value == "value1"
+        assert data.get_key_value_block("key2") is None
+
+
+@pytest.mark.parametrize("interface,mac", [(1, "00:11:22:33:44:55"), (0, "00:11:22:33:44:56"),
+                                           (2, "00-11-22-33-44-55")])
+def test_add_mac_block_duplicate(interface, mac):
+    """test adding a MAC block with an existing interface or MAC address"""
+    eeprom_data = create_eeprom_data()
+    add_mac_block(eeprom_data, 0, "00:11:22:33:44:55")
+    with pytest.raises(ValueError):
+        add_mac_block(eeprom_data, interface, mac)
+    assert len(eeprom_data.blocks) == 1
+
+
+def test_add_key_value_block_duplicate():
+    """test adding a key value block with an existing key"""
+    eeprom_data = create_eeprom_data(key_values=1)
+    with pytest.raises(ValueError):
+        add_key_value_block(eeprom_data, "key0", "other")
+    assert len(eeprom_data.blocks) == 1
+
+
+def test_edit_blocks():
+    """test adding, replacing and removing blocks in one edit"""
+    eeprom_data = create_eeprom_data(macs=3, key_values=2)
+    edit_blocks(eeprom_data, macs=[(1, "00:11:22:33:00:05"), (4, "00:11:22:33:00:00")],
+                key_values=[("key1", "replaced value"), ("serial", "1234")],
+                remove_macs=[0], remove_keys=["key0"])
+    assert eeprom_data.v3_next_block_address == sum(block.length for block in eeprom_data.blocks)
+    decoded = image_to_eeprom_data(create_image(eeprom_data), eeprom_data.yml_parser)
+    for data in [eeprom_data, decoded]:
+        assert [getattr(block, 'interface', None) for block in data.blocks] == \
+            [1, 2, None, 4, None]
+        assert data.get_mac_block(0) is None
+        assert data.get_mac_block(1).mac == ['00', '11', '22', '33', '00', '05']
+        assert data.find_mac_block("00:11:22:33:00:00").interface == 4
+        assert data.get_key_value_block("key0") is None
+        assert data.get_key_value_block("key1").value == "replaced value"
+        assert data.get_key_value_block("serial").value == "1234"
+
+
+@pytest.mark.parametrize("changes", [{"macs": [(1, "00:11:22:33:00:00")]},
+                                     {"remove_macs": [5]}, {"remove_keys": ["serial"]}])
+def test_edit_blocks_errors(changes):
+    """test invalid block edits"""
+    eeprom_data = create_eeprom_data(macs=2, key_values=1)
+    with pytest.raises(ValueError):
+        edit_blocks(eeprom_data, **changes)
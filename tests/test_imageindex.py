@@ -0,0 +1,81 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Tests for the binary index"""
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+from phytec_eeprom_flashtool.src.imageindex import update_index
+from phytec_eeprom_flashtool.src.imageindex import query_index
+
+TESTDATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata')
+
+
+def create_binaries(directory):
+    manifest = directory / 'manifest.jsonl'
+    rows = [{"som": "PCM-071", "kit": "5432DE11I-00", "pcb": "5d", "bom": "S9",
+             "serial": f"SN{unit}", "macs": [f"00:11:22:33:44:{unit:02x}"],
+             "file": str(directory / 'binaries' / f'unit{unit}.bin')} for unit in range(3)]
+    manifest.write_text("\n".join(json.dumps(row) for row in rows) + "\n")
+    os.mkdir(directory / 'binaries')
+    subprocess.run(['phytec_eeprom_flashtool', 'batch', str(manifest)], check=True,
+                   stdout=subprocess.DEVNULL)
+    shutil.copy(os.path.join(TESTDATA_PATH, 'PCL-069-1011011I-0.A3_3a_0'), directory / 'binaries')
+    shutil.copy(os.path.join(TESTDATA_PATH, 'test_data.yaml'), directory / 'binaries')
+
+
+def test_update_index(tmp_path):
+    """test that only new, changed and removed binaries are updated"""
+    create_binaries(tmp_path)
+    index = tmp_path / 'index.sqlite'
+    binaries = str(tmp_path / 'binaries')
+    summary = update_index(index, [binaries], 2)
+    assert (summary['scanned'], summary['updated'], summary['errors']) == (5, 5, 1)
+    assert update_index(index, [binaries], 2)['updated'] == 0
+
+    os.remove(tmp_path / 'binaries' / 'unit0.bin')
+    shutil.copy(tmp_path / 'binaries' / 'unit1.bin', tmp_path / 'binaries' / 'unit2.bin')
+    summary = update_index(index, [binaries], 2)
+    assert (summary['scanned'], summary['updated'], summary['removed']) == (4, 1, 1)
+    assert query_index(index, key_value=("serial", "SN0")) == []
+    assert [result['path'] for result in query_index(index, key_value=("serial", "SN1"))] == [
+        str(tmp_path / 'binaries' / 'unit1.bin'), str(tmp_path / 'binaries' / 'unit2.bin')]
+
+
+def test_query_index(tmp_path):
+    """test queries by MAC address, serial and product"""
+    create_binaries(tmp_path)
+    index = tmp_path / 'index.sqlite'
+    update_index(index, [str(tmp_path / 'binaries')], 2)
+    results = query_index(index, mac="00-11-22-33-44-01")
+    assert results == [{
+        "path": str(tmp_path / 'binaries' / 'unit1.bin'),
+        "product": "PCM-071-5432DE11I.S9",
+        "pcb_revision": "5d",
+        "bom_revision": "S9",
+        "kit_options": "5432DE11I00",
+        "macs": {0: "00:11:22:33:44:01"},
+        "key_values": {"serial": "SN1"},
+    }]
+    assert len(query_index(index, product="PCM-071")) == 3
+    assert len(query_index(index, product="PCL-069-1011011I.A3")) == 1
+    assert query_index(index, mac="00:11:22:33:44:01", key_value=("serial", "SN2")) == []
+    with pytest.raises(ValueError):
+        query_index(tmp_path / 'missing.sqlite', product="PCM-071")
+
+
+def test_cli_index(tmp_path):
+    """test the index and query commands"""
+    create_binaries(tmp_path)
+    index = str(tmp_path / 'index.sqlite')
+    subprocess.run(['phytec_eeprom_flashtool', 'index', index, str(tmp_path / 'binaries')],
+                   check=True)
+    result = subprocess.run(['phytec_eeprom_flashtool', 'query', index, '-serial', 'SN2'],
+                            stdout=subprocess.PIPE, check=True)
+    assert json.loads(result.stdout)['macs'] == {"0": "00:11:22:33:44:02"}
+    result = subprocess.run(['phytec_eeprom_flashtool', 'query', index, '-serial', 'SN9'])
+    assert result.returncode == 1
@@ -0,0 +1,83 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+import argparse
+
+import pytest
+from phytec_eeprom_flashtool.src import io
+from phytec_eeprom_flashtool.src.io import get_dirty_ranges
+from phytec_eeprom_flashtool.src.io import eeprom_write_diff
+from phytec_eeprom_flashtool.src.io import read_image
+from phytec_eeprom_flashtool.src.io import read_raw_image
+from phytec_eeprom_flashtool.src.io import RAW_YML_PARSER
+
+
+@pytest.fixture()
+def eeprom_file(tmp_path, monkeypatch):
+    """EEPROM device emulated by a local file with 256 erased bytes."""
+    eeprom_path = tmp_path / 'eeprom'
+    eeprom_path.write_bytes(b'\xff' * 256)
+    monkeypatch.setattr(io, 'get_eeprom_bus', lambda yml_parser: eeprom_path)
+    return eeprom_path
+
+
+@pytest.mark.parametrize("current, content, expect", [
+    (b"\x00" * 64, b"\x00" * 64, []),
+    (b"\x00" * 64, b"\x00" * 17 + b"\x01" + b"\x00" * 46, [(16, 32)]),
+    (b"\x00" * 64, b"\x01" * 20, [(0, 20)]),
+    (b"\x00" * 64, b"\x01" + b"\x00" * 31 + b"\x01" * 17, [(0, 16), (32, 49)]),
+    (b"\x00" * 32, b"\x00" * 32 + b"\x01" * 8 + b"\x00" * 24, [(32, 64)]),
+    (b"", b"\x00" * 20, [(0, 20)]),
+])
+def test_get_dirty_ranges(current, content, expect):
+    """test get_dirty_ranges"""
+    assert get_dirty_ranges(current, content, 16) == expect
+
+
+def test_eeprom_write_diff(eeprom_file):
+    """test eeprom_write_diff only writes the changed pages"""
+    yml_parser = {'PHYTEC': {'api': 3, 'page_size': 8}}
+    current = eeprom_file.read_bytes()
+    content = b'\xff' * 10 + b'\x00' + b'\xff' * 29 + b'\x01\x02'
+    stats = eeprom_write_diff(yml_parser, content, current)
+    assert (stats.bytes, stats.chunks) == (10, 2)
+    assert eeprom_file.read_bytes() == content + b'\xff' * (256 - len(content))
+    stats = eeprom_write_diff(yml_parser, content, eeprom_file.read_bytes())
+    assert (stats.bytes, stats.chunks) == (0, 0)
+
+
+def test_read_raw_image(eeprom_file):
+    """test read_raw_image only reads the headers and the data payload"""
+    # API v3 headers with a payload of 4 bytes
+    header = bytes([3]) + bytes(31) + bytes([4, 0, 0, 0, 0, 0, 0, 0])
+    eeprom_file.write_bytes(header + b'\x01\x02\x03\x04' + b'\xff' * 212)
+    image = read_raw_image(argparse.Namespace(file=""), RAW_YML_PARSER)
+    assert bytes(image) == header + b'\x01\x02\x03\x04'
+    eeprom_file.write_bytes(bytes([2]) + b'\xff' * 255)
+    assert len(read_raw_image(argparse.Namespace(file=""), RAW_YML_PARSER)) == 32
+
+
+def test_read_image(eeprom_file, monkeypatch):
+    """test read_image only reads the headers and the data payload from a device"""
+    yml_parser = {'PHYTEC': {'api': 3, 'max_image_size': 42}}
+    header = bytes([3]) + bytes(31) + bytes([4, 0, 0, 0, 0, 0, 0, 0])
+    eeprom_file.write_bytes(header + b'\x01\x02\x03\x04' + b'\xff' * 212)
+    reads = []
+    open_eeprom = io.open_eeprom
+
+    def open_counted(*args, **kwargs):
+        reads.append('open')
+        eeprom = open_eeprom(*args, **kwargs)
+        read = eeprom.read
+        eeprom.read = lambda size: reads.append(size) or read(size)
+        return eeprom
+
+    monkeypatch.setattr(io, 'open_eeprom', open_counted)
+    image = read_image(argparse.Namespace(file=""), {'PHYTEC': {'api': 3}})
+    assert bytes(image) == header + b'\x01\x02\x03\x04'
+    # The headers and the payload are read from one handle
+    assert reads == ['open', 40, 4]
+    # The payload is bounded by the maximum image size
+    assert bytes(read_image(argparse.Namespace(file=""), yml_parser)) == header + b'\x01\x02'
+    assert len(read_image(argparse.Namespace(file=""), {'PHYTEC': {'api': 2}})) == 32
@@ -0,0 +1,70 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Tests for the MAC address pool"""
+import json
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from phytec_eeprom_flashtool.src.macpool import create_mac_pool
+from phytec_eeprom_flashtool.src.macpool import allocate_macs
+from phytec_eeprom_flashtool.src.macpool import get_mac_pool_status
+
+
+def test_allocate_macs(tmp_path):
+    """test allocate_macs"""
+    pool = tmp_path / 'mac.pool'
+    create_mac_pool(pool, '00:11:22:33:44:fe', '00-11-22-33-45-02')
+    assert allocate_macs(pool, 3) == ['00:11:22:33:44:fe', '00:11:22:33:44:ff',
+                                      '00:11:22:33:45:00']
+    assert allocate_macs(pool, 1) == ['00:11:22:33:45:01']
+    with pytest.raises(ValueError, match="only 1 address"):
+        allocate_macs(pool, 2)
+    assert allocate_macs(pool, 1) == ['00:11:22:33:45:02']
+    assert get_mac_pool_status(pool) == {
+        "first": "00:11:22:33:44:fe", "last": "00:11:22:33:45:02", "next": None,
+        "allocated": 5, "remaining": 0}
+
+
+def test_create_mac_pool_errors(tmp_path):
+    """test create_mac_pool with invalid ranges"""
+    pool = tmp_path / 'mac.pool'
+    with pytest.raises(ValueError, match="greater"):
+        create_mac_pool(pool, '00:11:22:33:44:02', '00:11:22:33:44:01')
+    with pytest.raises(ValueError, match="multicast"):
+        create_mac_pool(pool, '00:ff:ff:ff:ff:ff', '01:00:00:00:00:00')
+    create_mac_pool(pool, '00:11:22:33:44:00', '00:11:22:33:44:ff')
+    with pytest.raises(ValueError, match="already exists"):
+        create_mac_pool(pool, '00:11:22:33:44:00', '00:11:22:33:44:ff')
+
+
+def test_allocate_macs_concurrent(tmp_path):
+    """test that parallel processes never get the same MAC addresses"""
+    pool = tmp_path / 'mac.pool'
+    create_mac_pool(pool, '00:11:22:00:00:00', '00:11:22:00:ff:ff')
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        allocations = list(executor.map(allocate_macs, [pool] * 40, [3] * 40))
+    macs = [mac for allocation in allocations for mac in allocation]
+    assert len(set(macs)) == 120
+    assert get_mac_pool_status(pool)['allocated'] == 120
+
+
+def test_cli_assign_macs(tmp_path):
+    """test the mac-pool and assign-macs commands"""
+    pool = tmp_path / 'mac.pool'
+    binary = tmp_path / 'eeprom.bin'
+    subprocess.run(['phytec_eeprom_flashtool', 'mac-pool', str(pool), '-init',
+                    '00:11:22:33:44:00', '00:11:22:33:44:ff'], check=True)
+    subprocess.run(['phytec_eeprom_flashtool', 'create', '-som', 'PCM-071', '-kit',
+                    '5432DE11I-00', '-pcb', '5d', '-bom', 'S9', '-file', str(binary)],
+                   check=True)
+    subprocess.run(['phytec_eeprom_flashtool', 'assign-macs', '2', '-pool', str(pool),
+                    '-interface', '1', '-som', 'PCM-071', '-file', str(binary)], check=True)
+    result = subprocess.run(['phytec_eeprom_flashtool', 'read-mac', '2', '-som', 'PCM-071',
+                             '-file', str(binary)], stdout=subprocess.PIPE, check=True)
+    assert "MAC             :  00:11:22:33:44:01" in result.stdout.decode('utf-8')
+    result = subprocess.run(['phytec_eeprom_flashtool', 'mac-pool', str(pool)],
+                            stdout=subprocess.PIPE, check=True)
+    assert json.loads(result.stdout)['next'] == '00:11:22:33:44:02'
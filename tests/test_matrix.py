@@ -0,0 +1,61 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Tests for the create-matrix command"""
+import os
+import subprocess
+import tarfile
+
+import pytest
+from phytec_eeprom_flashtool.src.io import load_yml_config
+from phytec_eeprom_flashtool.src.matrix import parse_kit_pattern
+from phytec_eeprom_flashtool.src.matrix import get_option_choices
+from phytec_eeprom_flashtool.src.matrix import iter_kits
+
+TESTDATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata')
+
+
+@pytest.mark.parametrize("pattern, expect", [
+    ("12-3", ['1', '2', '3']),
+    ("*", ['?', '?', '?']),
+    ("1*", ['1', '?', '?']),
+    ("[12]?3", ['[12]', '?', '3']),
+    ("12[34]*", ['1', '2', '[34]']),
+])
+def test_parse_kit_pattern(pattern, expect):
+    """test parse_kit_pattern"""
+    assert parse_kit_pattern(pattern, 3) == expect
+
+
+@pytest.mark.parametrize("pattern", ["1234", "**", "1[]2"])
+def test_parse_kit_pattern_errors(pattern):
+    """test parse_kit_pattern with invalid patterns"""
+    with pytest.raises(ValueError):
+        parse_kit_pattern(pattern, 3)
+
+
+def test_iter_kits():
+    """test that the combinations are enumerated in config order"""
+    yml_parser = load_yml_config('PCM-071')
+    choices = get_option_choices(yml_parser, '[35]432DE11I-0[12]')
+    assert list(iter_kits(yml_parser, choices)) == [
+        '3432DE11I-01', '3432DE11I-02', '5432DE11I-01', '5432DE11I-02']
+    with pytest.raises(ValueError, match="matches no value"):
+        get_option_choices(yml_parser, 'Z*')
+
+
+def test_cli_create_matrix(tmp_path):
+    """test that create-matrix creates the same binaries as create"""
+    command = ['phytec_eeprom_flashtool', 'create-matrix', '-som', 'PCL-069', '-kit',
+               '1011011I-?', '-pcb', '3a', '-bom', 'A3', '-jobs', '2']
+    subprocess.run(command + ['-output', str(tmp_path / 'matrix')], check=True)
+    files = sorted(os.listdir(tmp_path / 'matrix'))
+    assert len(files) == 2
+    with open(tmp_path / 'matrix' / 'PCL-069-1011011I-0.A3_3a_0', 'rb') as binary, \
+            open(os.path.join(TESTDATA_PATH, 'PCL-069-1011011I-0.A3_3a_0'), 'rb') as expected:
+        assert binary.read() == expected.read()
+
+    subprocess.run(command + ['-archive', str(tmp_path / 'matrix.tar.gz')], check=True)
+    with tarfile.open(tmp_path / 'matrix.tar.gz') as archive:
+        assert archive.getnames() == files
@@ -0,0 +1,49 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+import argparse
+import time
+import pytest
+from phytec_eeprom_flashtool.src.io import get_eeprom_bus
+from phytec_eeprom_flashtool.src.multi import EepromTarget
+from phytec_eeprom_flashtool.src.multi import parse_target
+from phytec_eeprom_flashtool.src.multi import run_on_targets
+
+YML_PARSER = {'PHYTEC': {'i2c_bus': 0, 'i2c_dev': 0x50}, 'Kit': {}}
+
+
+@pytest.mark.parametrize("value, expect", [
+    ("1", EepromTarget(1, None)),
+    ("2:0x51", EepromTarget(2, 0x51)),
+    ("0x3:80", EepromTarget(3, 80)),
+])
+def test_parse_target(value, expect):
+    """test parse_target"""
+    assert parse_target(value) == expect
+
+
+def test_parse_target_failure():
+    """test parse_target"""
+    with pytest.raises(ValueError):
+        parse_target("i2c-1")
+
+
+def test_run_on_targets():
+    """test run_on_targets runs all targets in parallel and keeps the output per target"""
+    def operation(args, yml_parser):
+        time.sleep(0.2)
+        if yml_parser['PHYTEC']['i2c_bus'] == 3:
+            raise ValueError("broken fixture")
+        print(f"{args.value} {get_eeprom_bus(yml_parser)}")
+
+    targets = [EepromTarget(bus, 0x51 if bus % 2 else None) for bus in range(8)]
+    results, duration = run_on_targets(argparse.Namespace(value="unit"), YML_PARSER, targets,
+                                       operation)
+    assert duration < 8 * 0.2
+    assert [result['target'] for result in results] == [str(target) for target in targets]
+    assert [result['status'] for result in results] == ['ok'] * 3 + ['error'] + ['ok'] * 4
+    assert results[3]['error'] == "broken fixture"
+    assert results[1]['output'] == "unit /sys/class/i2c-dev/i2c-1/device/1-0051/eeprom\n"
+    assert results[2]['output'] == "unit /sys/class/i2c-dev/i2c-2/device/2-0050/eeprom\n"
+    assert YML_PARSER['PHYTEC'] == {'i2c_bus': 0, 'i2c_dev': 0x50}
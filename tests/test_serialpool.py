@@ -0,0 +1,119 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Tests for the serial journal"""
+import argparse
+import json
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from phytec_eeprom_flashtool.src.io import load_yml_config
+from phytec_eeprom_flashtool.src.encoding import get_eeprom_data
+from phytec_eeprom_flashtool.src.serialpool import SerialReservation
+from phytec_eeprom_flashtool.src.serialpool import create_serial_journal
+from phytec_eeprom_flashtool.src.serialpool import get_serial_journal_status
+from phytec_eeprom_flashtool.src.serialpool import recycle_serials
+
+
+def create_eeprom_data():
+    args = argparse.Namespace(som='PCM-071', ksx=None, kit='5432DE11I-00', pcb='5d', bom='S9',
+                              id=None)
+    return get_eeprom_data(args, load_yml_config('PCM-071'))
+
+
+def generate_serials(journal, count, block_size):
+    eeprom_data = create_eeprom_data()
+    with SerialReservation(journal, block_size) as serials:
+        return [serials.next_serial(eeprom_data) for _ in range(count)]
+
+
+def test_serial_reservation(tmp_path):
+    """test that reserved but unused serials are handed out again"""
+    journal = tmp_path / 'serials.journal'
+    create_serial_journal(journal, "SN{counter:04d}", 10)
+    assert generate_serials(journal, 3, 5) == ['SN0010', 'SN0011', 'SN0012']
+    status = get_serial_journal_status(journal)
+    assert (status['next'], status['used'], status['free']) == (15, 3, 2)
+    assert generate_serials(journal, 4, 3) == ['SN0013', 'SN0014', 'SN0015', 'SN0016']
+    assert generate_serials(journal, 1, 1) == ['SN0017']
+    assert get_serial_journal_status(journal)['reservations'] == []
+
+
+def test_recycle_serials(tmp_path):
+    """test recycling the reservation of a station which did not close it"""
+    journal = tmp_path / 'serials.journal'
+    create_serial_journal(journal)
+    serials = SerialReservation(journal, 100)
+    assert serials.next_serial(create_eeprom_data()) == 'PCM-071-000001'
+    reservations = get_serial_journal_status(journal)['reservations']
+    assert [(item['reserved'], item['used']) for item in reservations] == [(100, 1)]
+    with pytest.raises(ValueError, match="No open reservation"):
+        recycle_serials(journal, 'unknown')
+    assert recycle_serials(journal, reservations[0]['id']) == 99
+    # Closing a recycled reservation does not release its serials twice
+    serials.close()
+    assert get_serial_journal_status(journal)['free'] == 99
+    assert generate_serials(journal, 1, 10) == ['PCM-071-000002']
+
+
+def test_serial_journal_torn_record(tmp_path):
+    """test that records written after a record torn by a crash are still replayed"""
+    journal = tmp_path / 'serials.journal'
+    create_serial_journal(journal, "SN{counter:04d}", 1)
+    assert generate_serials(journal, 1, 5) == ['SN0001']
+    with open(journal, 'a', encoding='UTF-8') as journal_file:
+        journal_file.write('{"op": "use", "id"')
+    assert generate_serials(journal, 2, 5) == ['SN0002', 'SN0003']
+    assert generate_serials(journal, 1, 5) == ['SN0004']
+    status = get_serial_journal_status(journal)
+    assert (status['next'], status['used'], status['free']) == (9, 4, 4)
+
+    # The incomplete record was removed before the next record was appended
+    assert all(json.loads(line) for line in journal.read_text().splitlines())
+
+
+def test_serial_journal_corrupt_record(tmp_path):
+    """test that a corrupt record followed by other records is never skipped"""
+    journal = tmp_path / 'serials.journal'
+    create_serial_journal(journal, "SN{counter:04d}", 1)
+    assert generate_serials(journal, 1, 5) == ['SN0001']
+    lines = journal.read_text().splitlines(keepends=True)
+    lines[2] = lines[2][:20] + '\n'
+    journal.write_text("".join(lines))
+    with pytest.raises(ValueError, match="corrupt in line 3"):
+        get_serial_journal_status(journal)
+    with pytest.raises(ValueError, match="corrupt in line 3"):
+        generate_serials(journal, 1, 5)
+
+
+def test_serial_reservation_concurrent(tmp_path):
+    """test that parallel processes never get the same serials"""
+    journal = tmp_path / 'serials.journal'
+    create_serial_journal(journal)
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(generate_serials, [journal] * 8, [25] * 8, [10] * 8))
+    serials = [serial for result in results for serial in result]
+    assert len(set(serials)) == 200
+    assert get_serial_journal_status(journal)['used'] == 200
+
+
+def test_cli_assign_serial(tmp_path):
+    """test the serial-pool and assign-serial commands"""
+    journal = tmp_path / 'serials.journal'
+    binary = tmp_path / 'eeprom.bin'
+    subprocess.run(['phytec_eeprom_flashtool', 'serial-pool', str(journal), '-init',
+                    '{base_name}-X{counter:03d}', '-start', '7'], check=True)
+    subprocess.run(['phytec_eeprom_flashtool', 'create', '-som', 'PCM-071', '-kit',
+                    '5432DE11I-00', '-pcb', '5d', '-bom', 'S9', '-file', str(binary)],
+                   check=True)
+    subprocess.run(['phytec_eeprom_flashtool', 'assign-serial', '-pool', str(journal), '-som',
+                    'PCM-071', '-file', str(binary)], check=True)
+    result = subprocess.run(['phytec_eeprom_flashtool', 'read-serial', '-som', 'PCM-071',
+                             '-file', str(binary)], stdout=subprocess.PIPE, check=True)
+    assert "Value           :  PCM-071-X007" in result.stdout.decode('utf-8')
+    result = subprocess.run(['phytec_eeprom_flashtool', 'assign-serial', '-pool', str(journal),
+                             '-som', 'PCM-071', '-file', str(binary)], capture_output=True)
+    assert result.returncode != 0
+    assert get_serial_journal_status(journal)['used'] == 1
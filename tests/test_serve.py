@@ -0,0 +1,95 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Tests for the serve mode"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from phytec_eeprom_flashtool.src.multi import ThreadOutput
+from phytec_eeprom_flashtool.src.serve import remove_stale_socket
+from phytec_eeprom_flashtool.src.serve import run_request
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'),
+                                reason="Unix domain sockets are not available")
+
+
+@pytest.fixture(name="server")
+def fixture_server(tmp_path):
+    socket_path = str(tmp_path / 'flashtool.sock')
+    process = subprocess.Popen(['phytec_eeprom_flashtool', 'serve', socket_path],
+                               stdout=subprocess.PIPE)
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.1)
+    yield socket_path
+    process.terminate()
+    process.wait(timeout=10)
+    assert process.returncode == 0
+    assert not os.path.exists(socket_path)
+
+
+def send_requests(socket_path, requests):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        stream = client.makefile('rw')
+        results = []
+        for request in requests:
+            stream.write(json.dumps(request) + "\n")
+            stream.flush()
+            results.append(json.loads(stream.readline()))
+    return results
+
+
+def test_serve(server, tmp_path):
+    binary = str(tmp_path / 'unit.bin')
+    results = send_requests(server, [
+        {"id": 1, "argv": ["create", "-som", "PCM-071", "-kit", "5432DE11I-00", "-pcb", "5d",
+                           "-bom", "S9", "-file", binary]},
+        {"id": 2, "argv": ["add-mac", "0", "00:11:22:33:44:55", "-file", binary]},
+        {"id": 3, "argv": ["read-mac", "0", "-file", binary]},
+        {"id": 4, "argv": ["read-mac", "1", "-file", binary]},
+        {"id": 5, "argv": ["read-mac", "-file", binary]},
+        {"id": 6, "argv": "read"},
+    ])
+    assert [result['id'] for result in results] == [1, 2, 3, 4, 5, 6]
+    assert [result['status'] for result in results] == ['ok', 'ok', 'ok', 'error', 'error',
+                                                        'error']
+    assert results[0]['product'] == 'PCM-071-5432DE11I.S9'
+    assert "00:11:22:33:44:55" in results[2]['output']
+    assert results[3]['error'] == "No MAC found for Ethernet interface 1"
+    assert "the following arguments are required: interface" in results[4]['error']
+
+    results = send_requests(server, [{"argv": ["read", "-file", binary]}])
+    assert results[0]['status'] == 'ok'
+    assert "00:11:22:33:44:55" in results[0]['output']
+
+
+def test_remove_stale_socket(tmp_path):
+    socket_path = tmp_path / 'flashtool.sock'
+    socket_path.write_text("no socket")
+    with pytest.raises(SystemExit, match="is not a socket"):
+        remove_stale_socket(str(socket_path))
+    assert socket_path.exists()
+    socket_path.unlink()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+        stale.bind(str(socket_path))
+    remove_stale_socket(str(socket_path))
+    assert not socket_path.exists()
+
+
+def test_run_request_unexpected_error():
+    def handler(argv):
+        return argv[0].missing
+
+    result = run_request({"id": 1, "argv": ["read"]}, handler, ThreadOutput(sys.stdout),
+                         ThreadOutput(sys.stderr))
+    assert (result['id'], result['status']) == (1, 'error')
+    assert "has no attribute 'missing'" in result['error']
@@ -0,0 +1,55 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Tests for the startup time of the cli"""
+import subprocess
+import sys
+
+from phytec_eeprom_flashtool.src.config import CACHE_DIR_ENV
+
+# Import time budget of the tool in microseconds. It is about four times the import time on a
+# development machine to avoid false alarms on slow or busy machines.
+IMPORT_TIME_BUDGET = 100000
+# Modules which are only required by some commands
+LAZY_MODULES = [
+    'yaml',
+    'dataclasses',
+    'json',
+    'csv',
+    'tempfile',
+    'concurrent.futures',
+    'socketserver',
+    'phytec_eeprom_flashtool.src.batch',
+    'phytec_eeprom_flashtool.src.multi',
+    'phytec_eeprom_flashtool.src.serve',
+]
+
+
+def run_importtime(*args):
+    command = [sys.executable, '-X', 'importtime', '-m', 'phytec_eeprom_flashtool'] + list(args)
+    print(" ".join(command))
+    result = subprocess.run(command, capture_output=True)
+    assert result.returncode == 0
+    import_times = {}
+    for line in result.stderr.decode('utf-8').splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line.split('|')
+        import_times[module.strip()] = int(cumulative)
+    return import_times
+
+
+def test_startup_read_mac(tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_DIR_ENV, str(tmp_path / 'cache'))
+    binary = str(tmp_path / 'unit.bin')
+    for command in [['create', '-som', 'PCM-071', '-kit', '5432DE11I-00', '-pcb', '5d', '-bom',
+                     'S9', '-file', binary],
+                    ['add-mac', '0', '00:11:22:33:44:55', '-file', binary]]:
+        subprocess.run(['phytec_eeprom_flashtool'] + command, check=True)
+
+    import_times = run_importtime('read-mac', '0', '-file', binary)
+    for module in LAZY_MODULES:
+        assert module not in import_times
+    assert import_times['phytec_eeprom_flashtool.src.phytec_eeprom_flashtool'] < \
+        IMPORT_TIME_BUDGET
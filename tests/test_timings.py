@@ -0,0 +1,51 @@
+# SPDX-FileCopyrightText: 2025 PHYTEC
+#
+# SPDX-License-Identifier: MIT
+
+"""Tests for the timing and profiling instrumentation"""
+import json
+import pstats
+import subprocess
+
+from phytec_eeprom_flashtool.src import timings
+from phytec_eeprom_flashtool.src.timings import enable_timings
+from phytec_eeprom_flashtool.src.timings import get_timings
+from phytec_eeprom_flashtool.src.timings import timing
+
+
+def test_timing(monkeypatch):
+    monkeypatch.setattr(timings, 'TIMINGS', [])
+    with timing('disabled') as phase:
+        phase.add_bytes(8)
+    assert get_timings() is None
+
+    enable_timings()
+    for _ in range(2):
+        with timing('eeprom_read') as phase:
+            phase.add_bytes(32)
+    result = get_timings().to_dict()
+    assert [phase['phase'] for phase in result['timings']] == ['eeprom_read']
+    assert result['timings'][0]['calls'] == 2
+    assert result['timings'][0]['bytes'] == 64
+    assert result['total'] >= result['timings'][0]['duration']
+
+
+def test_cli_timings_profile(tmp_path):
+    binary = str(tmp_path / 'unit.bin')
+    profile = str(tmp_path / 'create.prof')
+    command = ['phytec_eeprom_flashtool', '--timings-json', '--profile', profile, 'create',
+               '-som', 'PCM-071', '-kit', '5432DE11I-00', '-pcb', '5d', '-bom', 'S9', '-file',
+               binary]
+    print(" ".join(command))
+    result = subprocess.run(command, capture_output=True)
+    assert result.returncode == 0
+    record = json.loads(result.stderr.decode('utf-8').splitlines()[-1])
+    phases = {phase['phase']: phase for phase in record['timings']}
+    assert {'parse_args', 'config', 'encode', 'binary_write'} <= set(phases)
+    assert phases['binary_write']['bytes'] == 40
+    assert pstats.Stats(profile).total_calls > 0
+
+    command = ['phytec_eeprom_flashtool', '--timings', 'read', '-file', binary]
+    result = subprocess.run(command, capture_output=True)
+    assert result.returncode == 0
+    assert "decode" in result.stderr.decode('utf-8')